@@ -5,12 +5,26 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Run it with uvicorn workers under gunicorn:
+
+    gunicorn charity_website.asgi -k uvicorn_worker.UvicornWorker
+
+The live campaign progress streams (donations.live) are answered in front of
+Django, so an open one costs no thread.
 """
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'charity_website.settings')
+os.environ.setdefault('ASGI', 'True')
 
 application = get_asgi_application()
+
+if settings.LIVE_UPDATES:
+    from donations.live import LiveUpdatesApp
+
+    application = LiveUpdatesApp(application)
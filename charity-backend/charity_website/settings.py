@@ -50,9 +50,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'donations.metrics.MetricsMiddleware',  # first, so it times everything below it
+    'donations.routers.ReplicaMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files
+    'donations.staticfiles.WhiteNoiseMiddleware',  # whitenoise for static files, without a thread hop per ASGI request
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,7 +74,7 @@ CORS_ALLOW_CREDENTIALS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'donations.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -83,8 +85,31 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 9,
+    # Proxies in front of the app that append to X-Forwarded-For (Railway's
+    # edge is one). Throttles key on the address the last of them saw, with 0
+    # on REMOTE_ADDR; left unset, DRF would trust whatever header the client sent.
+    'NUM_PROXIES': config('NUM_PROXIES', default=1 if 'RAILWAY_STATIC_URL' in os.environ else 0, cast=int),
 }
 
+# Admin roles are cached per process (see donations/roles.py)
+ADMIN_ROLE_CACHE_SIZE = config('ADMIN_ROLE_CACHE_SIZE', default=1024, cast=int)
+ADMIN_ROLE_CACHE_TTL = config('ADMIN_ROLE_CACHE_TTL', default=60, cast=int)  # seconds
+
+# So are the users and donors behind access tokens (see donations/authentication.py)
+IDENTITY_CACHE_SIZE = config('IDENTITY_CACHE_SIZE', default=4096, cast=int)
+IDENTITY_CACHE_TTL = config('IDENTITY_CACHE_TTL', default=60, cast=int)  # seconds
+
+# Login attempts let through to the password check per sliding window (see
+# donations/login_throttle.py); the counts need a shared cache across workers
+LOGIN_THROTTLE_WINDOW = config('LOGIN_THROTTLE_WINDOW', default=300, cast=int)  # seconds
+LOGIN_THROTTLE_USERNAME_LIMIT = config('LOGIN_THROTTLE_USERNAME_LIMIT', default=10, cast=int)
+LOGIN_THROTTLE_IP_LIMIT = config('LOGIN_THROTTLE_IP_LIMIT', default=50, cast=int)
+
+# Request metrics (see donations/metrics.py). Point METRICS_DIR at a directory
+# shared by the gunicorn workers to aggregate across them.
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=float)  # seconds
+
 # Static files configuration
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
@@ -96,6 +121,19 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Campaign images are resized by `manage.py process_campaign_images` (see donations/images.py)
+CAMPAIGN_IMAGE_MAX_UPLOAD_SIZE = config('CAMPAIGN_IMAGE_MAX_UPLOAD_SIZE', default=10 * 1024 * 1024, cast=int)  # bytes
+CAMPAIGN_IMAGE_WORKERS = config('CAMPAIGN_IMAGE_WORKERS', default=2, cast=int)  # resizing processes
+CAMPAIGN_IMAGE_BATCH_SIZE = config('CAMPAIGN_IMAGE_BATCH_SIZE', default=10, cast=int)
+CAMPAIGN_IMAGE_MAX_ATTEMPTS = config('CAMPAIGN_IMAGE_MAX_ATTEMPTS', default=3, cast=int)
+CAMPAIGN_IMAGE_LEASE = config('CAMPAIGN_IMAGE_LEASE', default=300, cast=int)  # seconds a claimed image is hidden from other workers
+
+# Trending campaigns (see donations/trending.py); keep `manage.py expire_trending --loop` running
+TRENDING_BUCKET_SECONDS = config('TRENDING_BUCKET_SECONDS', default=300, cast=int)  # rebuild with --rebuild after changing it
+
+# Bulk donor onboarding (see donations/onboarding.py)
+DONOR_ONBOARDING_WORKERS = config('DONOR_ONBOARDING_WORKERS', default=0, cast=int)  # password hashing processes, 0 = one per CPU
+
 # Static files serving with whitenoise
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
@@ -138,14 +176,114 @@ DATABASES = {
     }
 }
 
+# Set by charity_website.asgi. Under ASGI, async views run their queries in
+# a thread per request, so persistent connections would pile up.
+ASGI = config('ASGI', default=False, cast=bool)
+# Async campaign/comment/my-donations reads (see donations/async_views.py)
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=ASGI, cast=bool)
+# Live campaign progress over server-sent events (see donations/live.py),
+# served by charity_website.asgi only: under WSGI a stream would hold a worker
+LIVE_UPDATES = config('LIVE_UPDATES', default=True, cast=bool)
+LIVE_UPDATE_INTERVAL = config('LIVE_UPDATE_INTERVAL', default=1.0, cast=float)  # seconds between reads of changed campaigns
+LIVE_HEARTBEAT_SECONDS = config('LIVE_HEARTBEAT_SECONDS', default=15, cast=int)  # seconds of silence before a keepalive comment
+LIVE_RESYNC_SECONDS = config('LIVE_RESYNC_SECONDS', default=60, cast=int)  # seconds between re-reads of every watched campaign
+LIVE_MAX_CAMPAIGNS = config('LIVE_MAX_CAMPAIGNS', default=50, cast=int)  # campaigns per stream
+# host:port of `manage.py run_live_broker`, needed with more than one worker
+LIVE_BROKER_ADDRESS = config('LIVE_BROKER_ADDRESS', default='')
+CONN_MAX_AGE = config('CONN_MAX_AGE', default=0 if ASGI else 600, cast=int)
+
 # Use PostgreSQL in production if available
 if 'DATABASE_URL' in os.environ:
     import dj_database_url
     DATABASES['default'] = dj_database_url.config(
-        conn_max_age=600,
+        conn_max_age=CONN_MAX_AGE,
         conn_health_checks=True,
     )
 
+# SQLite tuned for concurrent writers: WAL so readers never block the writer,
+# pragmas on every connection, and a busy timeout so a writer waits for the
+# lock instead of failing with "database is locked". Donation and comment
+# writes also take the write lock up front (donations.db.write_atomic).
+SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=20, cast=float)  # seconds
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),  # durable with WAL except on power loss
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-65536, cast=int),  # negative = KiB, so 64 MiB
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),  # bytes
+    'temp_store': 'MEMORY',
+}
+
+# Read replicas, as a comma-separated list of database URLs. Safe (GET/HEAD)
+# requests read from a random replica, everything else uses the primary
+# (donations.routers). A client that just wrote is pinned to the primary for
+# REPLICA_STICKY_SECONDS, which must cover the replication lag. Locally, two
+# SQLite files work: DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3
+# and `manage.py sync_sqlite_replicas --loop` to copy the primary over.
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+
+if DATABASE_REPLICA_URLS:
+    import dj_database_url
+    for number, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+        DATABASES[f'replica_{number}'] = dict(
+            dj_database_url.parse(url, conn_max_age=CONN_MAX_AGE, conn_health_checks=True),
+            # Tests and benchmarks read the primary's test database through it
+            TEST={'MIRROR': 'default'},
+        )
+
+for database in DATABASES.values():
+    if database['ENGINE'].endswith('sqlite3'):
+        database.setdefault('OPTIONS', {}).update({
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        })
+
+if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    # Tests get a file as well: the default shared-cache memory database locks
+    # per table and ignores the busy timeout, and forked processes cannot open
+    # it, so the concurrency tests would not see SQLite as deployed
+    DATABASES['default'].setdefault('TEST', {}).setdefault('NAME', str(BASE_DIR / 'test_db.sqlite3'))
+
+DATABASE_ROUTERS = ['donations.routers.ReplicaRouter']
+
+
+# Cache
+# locmem is per process; use the file-based backend (CACHE_BACKEND=
+# django.core.cache.backends.filebased.FileBasedCache, CACHE_LOCATION=<dir>)
+# to share entries between gunicorn workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='charity-connect'),
+    }
+}
+
+CAMPAIGN_LIST_CACHE = 'default'
+CAMPAIGN_LIST_CACHE_TIMEOUT = config('CAMPAIGN_LIST_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+
+
+# Email
+# Messages are queued in the OutboundEmail outbox and delivered by
+# `python manage.py send_queued_emails`. Use the locmem or filebased backend in
+# development and tests.
+
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='webmaster@localhost')
+
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=100, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_BACKOFF = config('EMAIL_OUTBOX_RETRY_BACKOFF', default=30, cast=int)  # seconds, doubled per attempt
+EMAIL_OUTBOX_MAX_BACKOFF = config('EMAIL_OUTBOX_MAX_BACKOFF', default=3600, cast=int)
+EMAIL_OUTBOX_LEASE = config('EMAIL_OUTBOX_LEASE', default=300, cast=int)  # seconds a claimed batch is hidden from other workers
+BROADCAST_LEASE = config('BROADCAST_LEASE', default=300, cast=int)  # seconds a claimed broadcast is hidden from other workers, renewed per batch
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -195,6 +333,6 @@ if not DEBUG:
     SECURE_HSTS_INCLUDE_SUBDOMAINS = True
     SECURE_HSTS_SECONDS = 31536000
     SECURE_REDIRECT_EXEMPT = []
-    SECURE_SSL_REDIRECT = True
+    SECURE_SSL_REDIRECT = config('SECURE_SSL_REDIRECT', default=True, cast=bool)
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
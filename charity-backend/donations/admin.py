@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Campaign
+from django.utils import timezone
+
+from .broadcasts import queue_broadcast
+from .models import Campaign, CampaignBroadcast, CampaignImage, OutboundEmail
 
 
 # Register your models here.
@@ -7,4 +10,58 @@ from .models import Campaign
 class CampaignAdmin(admin.ModelAdmin):
     list_display = ('title', 'category', 'location', 'goal', 'amount_raised')
     search_fields = ('title', 'category', 'location')
-    fields = ('title', 'category', 'location', 'description', 'goal', 'amount_raised')  # 👈 include description
+    fields = ('title', 'category', 'location', 'description', 'goal', 'total_amount_raised', 'counter_shards')  # 👈 include description
+    # Kept by donations.counters, a form would write back what it read
+    readonly_fields = ('total_amount_raised',)
+    actions = ['broadcast_update', 'broadcast_goal_reached']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.save()
+        elif form.changed_data:
+            # Only the edited columns, so donations made since the form was loaded are kept
+            obj.save(update_fields=[*form.changed_data, 'updated_at'])
+
+    @admin.action(description='Email a campaign update to all past donors')
+    def broadcast_update(self, request, queryset):
+        for campaign in queryset:
+            queue_broadcast(campaign, 'update', created_by=request.user)
+        self.message_user(request, f"Queued {queryset.count()} broadcast(s)")
+
+    @admin.action(description='Email a goal reached message to all past donors')
+    def broadcast_goal_reached(self, request, queryset):
+        for campaign in queryset:
+            queue_broadcast(campaign, 'goal_reached', created_by=request.user)
+        self.message_user(request, f"Queued {queryset.count()} broadcast(s)")
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'last_error')
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected emails')
+    def requeue(self, request, queryset):
+        queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+
+
+@admin.register(CampaignBroadcast)
+class CampaignBroadcastAdmin(admin.ModelAdmin):
+    list_display = ('campaign', 'kind', 'status', 'sent_count', 'failed_count', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('status', 'last_donor_id', 'sent_count', 'failed_count', 'leased_until', 'created_by', 'finished_at')
+
+
+@admin.register(CampaignImage)
+class CampaignImageAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'status', 'width', 'height', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('sha256', 'last_error')
+    readonly_fields = ('sha256', 'original', 'width', 'height', 'processed_at')
+    actions = ['reprocess']
+
+    @admin.action(description='Regenerate the variants of selected images')
+    def reprocess(self, request, queryset):
+        queryset.update(status='pending', attempts=0, next_attempt_at=timezone.now())
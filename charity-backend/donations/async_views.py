@@ -0,0 +1,211 @@
+"""
+Async versions of the busiest read endpoints, for ASGI deployments.
+
+With ASYNC_READ_VIEWS on (the default under charity_website.asgi) the
+campaign list and detail, comment list and my-donations routes are served by
+with_async_reads(): JSON GET/HEAD requests go to the handlers below, which
+fetch through Django's async ORM, so a slow query or a slow client waits on
+the event loop instead of holding a worker thread. Everything else (writes,
+the browsable API, ?format=api) still goes to the DRF view, which Django runs
+in a thread as it would any sync view.
+
+The handlers reuse the DRF views' querysets, filter backends, pagination and
+serializers, and the conditional/cached responses of donations.conditional,
+so both paths return the same bodies, ETags and query counts.
+"""
+from calendar import timegm
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework.views import exception_handler
+
+from . import response_cache
+from .authentication import CachedJWTAuthentication
+from .conditional import finalize, make_etag
+from .models import Campaign, Donation, Donor
+from .pagination import AsyncPageNumberPagination, OptionalKeysetPagination
+from .search import asearch_available
+from .serializers import DonationSerializer, DonorSummarySerializer
+from .statistics import aget_catalog_version
+from .summaries import get_summary
+from .views import CampaignViewSet, CommentViewSet, MyDonationsView, _profile_data
+
+READ_METHODS = ('GET', 'HEAD')
+# What django-filter answers for a campaign that does not exist
+INVALID_CAMPAIGN = ['Select a valid choice. That choice is not one of the available choices.']
+
+renderer = JSONRenderer()
+
+
+def wants_json(request, format_suffix=None):
+    # Same choice as DRF's content negotiation between its JSON and browsable renderers
+    requested = format_suffix or request.GET.get(drf_settings.URL_FORMAT_OVERRIDE)
+    if requested:
+        return requested == 'json'
+    return 'text/html' not in request.headers.get('Accept', '')
+
+
+def json_response(data, status=200, headers=None):
+    response = HttpResponse(renderer.render(data), status=status, content_type='application/json', headers=headers)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def error_response(exc):
+    response = exception_handler(exc, {})
+    # Retry-After for throttling and the like
+    headers = {key: value for key, value in response.items() if key.lower() != 'content-type'}
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        # DRF turns these into 401s with a challenge when the view has an authenticator
+        response.status_code = 401
+        headers['WWW-Authenticate'] = CachedJWTAuthentication().authenticate_header(None)
+    return json_response(response.data, response.status_code, headers)
+
+
+def with_async_reads(sync_view, handler):
+    """
+    A view that answers JSON reads with the async `handler` and hands
+    every other request to the DRF `sync_view`
+    """
+    run_sync = sync_to_async(sync_view)
+
+    # wraps() keeps the DRF view's attributes: csrf_exempt, and the actions the metrics label requests with
+    @wraps(sync_view)
+    async def view(request, *args, **kwargs):
+        if request.method not in READ_METHODS or not wants_json(request, kwargs.get('format')):
+            return await run_sync(request, *args, **kwargs)
+        kwargs.pop('format', None)
+        try:
+            return await handler(Request(request), *args, **kwargs)
+        except exceptions.APIException as exc:
+            return error_response(exc)
+
+    return view
+
+
+def viewset_for(viewset_class, request, action, **kwargs):
+    """
+    An instance of a DRF viewset set up as for `action`, for its querysets,
+    filters and serializers
+    """
+    return viewset_class(request=request, action=action, args=(), kwargs=kwargs, format_kwarg=None)
+
+
+async def filtered_queryset(view):
+    if view.request.query_params.get(drf_settings.SEARCH_PARAM):
+        # The search filter checks for the full-text index with a query the first time
+        for alias in connections:
+            await asearch_available(alias)
+    return view.filter_queryset(view.get_queryset())
+
+
+async def paginated_data(paginator, view, queryset, serializer_class):
+    page = await paginator.apaginate_queryset(queryset, view.request, view=view)
+    data = serializer_class(page, many=True, context=view.get_serializer_context()).data
+    return paginator.get_paginated_response(data).data
+
+
+async def campaign_list(request):
+    view = viewset_for(CampaignViewSet, request, 'list')
+    version = await aget_catalog_version()
+    params = response_cache.normalized_params(request)
+    etag = make_etag('campaigns', version, 'json', params)
+    if version is not None:
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return finalize(not_modified, etag)
+
+        cache_params = (request.build_absolute_uri(request.path), params)
+        data = await response_cache.aget_page(version, cache_params)
+        if data is not None:
+            response = json_response(data)
+            response['X-Cache'] = 'HIT'
+            return finalize(response, etag)
+
+    queryset = await filtered_queryset(view)
+    data = await paginated_data(AsyncPageNumberPagination(), view, queryset, view.get_serializer_class())
+    response = json_response(data)
+    if version is None:
+        return response
+    await response_cache.aset_page(version, cache_params, data)
+    response['X-Cache'] = 'MISS'
+    return finalize(response, etag)
+
+
+async def campaign_detail(request, pk):
+    view = viewset_for(CampaignViewSet, request, 'retrieve', pk=pk)
+    queryset = await filtered_queryset(view)
+    try:
+        instance = await queryset.aget(pk=pk)
+    except (Campaign.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+        raise exceptions.NotFound()
+
+    etag = make_etag('campaign', instance.pk, instance.version, instance.total_amount_raised, instance.total_donation_count, 'json')
+    # Sharded donations do not touch the campaign row, so updated_at would lie
+    last_modified = None if instance.counter_shards else timegm(instance.updated_at.utctimetuple())
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return finalize(not_modified, etag, last_modified)
+    serializer = view.get_serializer(instance)
+    return finalize(json_response(serializer.data), etag, last_modified)
+
+
+async def comment_list(request):
+    view = viewset_for(CommentViewSet, request, 'list')
+    campaign = request.query_params.get('campaign')
+    if campaign:
+        # django-filter's check that the campaign exists, which would query synchronously
+        if not campaign.isdigit() or not await Campaign.objects.filter(pk=campaign).aexists():
+            raise exceptions.ValidationError({'campaign': INVALID_CAMPAIGN})
+    queryset = view.get_queryset()
+    return json_response(await paginated_data(OptionalKeysetPagination(), view, queryset, view.get_serializer_class()))
+
+
+async def my_donations(request):
+    authenticated = await CachedJWTAuthentication().aauthenticate(request)
+    if authenticated is None:
+        raise exceptions.NotAuthenticated()
+    user = authenticated[0]
+
+    donor = await Donor.objects.select_related('summary').filter(user=user).afirst()
+    if donor is None:
+        return json_response({'error': 'Donor profile not found'}, status=404)
+
+    view = MyDonationsView(request=request, args=(), kwargs={}, format_kwarg=None)
+    paginator = OptionalKeysetPagination()
+    donations = Donation.objects.filter(donor=donor).order_by('-donated_at', '-id')
+    page = await paginator.apaginate_queryset(donations, request, view=view)
+    data = paginator.get_paginated_response(DonationSerializer(page, many=True).data).data
+    data['summary'] = DonorSummarySerializer(get_summary(donor)).data
+    data['profile'] = _profile_data(user, donor)
+    return json_response(data)
+
+
+ASYNC_ROUTES = {
+    'campaign-list': campaign_list,
+    'campaign-detail': campaign_detail,
+    'comment-list': comment_list,
+    'my-donations': my_donations,
+}
+
+
+def async_routes(patterns):
+    """
+    `patterns` with the ones named in ASYNC_ROUTES swapped for their
+    async-reads versions. The order is kept, so e.g. campaigns/trending/ still
+    matches before the campaign detail pattern would take it for a pk.
+    """
+    return [
+        URLPattern(pattern.pattern, with_async_reads(pattern.callback, ASYNC_ROUTES[pattern.name]), pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in ASYNC_ROUTES else pattern
+        for pattern in patterns
+    ]
@@ -0,0 +1,155 @@
+"""
+JWT authentication that needs no query for a user it has seen recently.
+
+simplejwt's JWTAuthentication loads the User on every request, and the
+views then looked the Donor up again. CachedJWTAuthentication validates the
+signed token the same way, then resolves its user id to an Identity: the
+user's non-secret fields, their donor id and name. Identities are kept in a
+per-process LRU cache with a TTL (roles.TTLCache) and loaded with one query
+that also joins the Admin row, which fills the role cache, so get_admin()
+needs no query either.
+
+request.user is a User built from the cached fields; the others (password,
+last_login, date_joined) are deferred and load on first access.
+get_donor(request) builds the Donor from the same identity.
+
+Entries are dropped when the user or their donor is saved or deleted
+(donations.signals). Other worker processes only see such a change, e.g. a
+deactivated account, once their entry expires, so IDENTITY_CACHE_TTL bounds
+it, as ADMIN_ROLE_CACHE_TTL does for roles.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .models import Admin, Donor
+from .roles import _MISSING, TTLCache, role_cache
+
+# In the models' field order, which from_db() expects
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+)
+DONOR_FIELDS = tuple(field.attname for field in Donor._meta.concrete_fields)
+
+
+class Identity:
+    __slots__ = ('user_values', 'donor_id', 'donor_name')
+
+    def __init__(self, user_values, donor_id, donor_name):
+        self.user_values = user_values
+        self.donor_id = donor_id
+        self.donor_name = donor_name
+
+    @property
+    def is_active(self):
+        return self.user_values[USER_FIELDS.index('is_active')]
+
+    def user(self):
+        # A fresh instance per request, as simplejwt's would be
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, self.user_values)
+        user._identity = self
+        return user
+
+
+identity_cache = TTLCache(settings.IDENTITY_CACHE_SIZE, settings.IDENTITY_CACHE_TTL)
+
+
+def load_identity(user_id):
+    """
+    Identity for a user id (None if there is no such user), with one query,
+    stored in the identity cache and the user's role in the role cache
+    """
+    row = (
+        User.objects.filter(pk=user_id)
+        .values_list(*USER_FIELDS, 'donor__id', 'donor__name', 'admin__id', 'admin__role', 'admin__is_active')
+        .first()
+    )
+    if row is None:
+        identity = None
+    else:
+        fields = len(USER_FIELDS)
+        donor_id, donor_name, admin_id, admin_role, admin_active = row[fields:]
+        identity = Identity(row[:fields], donor_id, donor_name)
+        pk = row[USER_FIELDS.index('id')]
+        admin = Admin(id=admin_id, user_id=pk, role=admin_role, is_active=True) if admin_id and admin_active else None
+        role_cache.set(pk, admin)
+    identity_cache.set(user_id, identity)
+    return identity
+
+
+def get_identity(user_id):
+    identity = identity_cache.get(user_id)
+    if identity is _MISSING:
+        identity = load_identity(user_id)
+    return identity
+
+
+async def aget_identity(user_id):
+    identity = identity_cache.get(user_id)
+    if identity is _MISSING:
+        identity = await sync_to_async(load_identity)(user_id)
+    return identity
+
+
+def get_donor(request):
+    """
+    The Donor of the request's user, or None. No query when the user came
+    from CachedJWTAuthentication.
+    """
+    user = request.user
+    if not user or not user.is_authenticated:
+        return None
+    identity = getattr(user, '_identity', None)
+    if identity is None:
+        # Authenticated some other way (session, tests)
+        return Donor.objects.filter(user=user).first()
+    if identity.donor_id is None:
+        return None
+    values = {'id': identity.donor_id, 'user_id': user.id, 'name': identity.donor_name}
+    donor = Donor.from_db(DEFAULT_DB_ALIAS, DONOR_FIELDS, [values[field] for field in DONOR_FIELDS])
+    donor.user = user
+    return donor
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            # Compares the token with the password hash, which is not cached
+            return super().get_user(validated_token)
+        return self.check_identity(get_identity(user_id))
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views, only querying in a thread on a cache miss
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            return await sync_to_async(super().get_user)(validated_token), validated_token
+        return self.check_identity(await aget_identity(user_id)), validated_token
+
+    def check_identity(self, identity):
+        if identity is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not identity.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return identity.user()
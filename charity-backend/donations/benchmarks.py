@@ -0,0 +1,505 @@
+"""
+HTTP benchmarks for the main API endpoints.
+
+`manage.py benchmark_api` seeds a throwaway database (donations.seeding) and
+drives every scenario below twice: in-process through the test client, where
+the SQL queries per request are counted too, and over real HTTP against a
+local gunicorn serving the same database. Each run records p50/p95/p99
+latency and throughput, can be saved as JSON, and can be compared with an
+earlier run used as the baseline.
+
+`manage.py benchmark_concurrency` instead serves the async-capable read
+endpoints from the same number of sync gunicorn workers and of uvicorn
+(ASGI) workers, at increasing client concurrency and optionally with slow
+clients tying up connections, to compare how each holds up.
+
+`manage.py benchmark_live_updates` holds thousands of idle campaign progress
+streams (donations.live) open against uvicorn workers and the live update
+broker, and measures their memory and how fast a donation reaches them.
+"""
+import asyncio
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from urllib.parse import quote
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Campaign
+
+# (name, url, who is asking). {campaign} is filled in when the benchmark runs.
+SCENARIOS = [
+    ('campaigns list', '/api/campaigns/?page_size=9', None),
+    ('campaign search', '/api/campaigns/?search=water&page_size=9', None),
+    ('campaign detail', '/api/campaigns/{campaign}/', None),
+    ('comments', '/api/comments/?campaign={campaign}', None),
+    ('donations', '/api/donations/?page_size=9', 'donor'),
+    ('admin dashboard', '/api/admin/dashboard/', 'admin'),
+    ('my donations', '/api/my-donations/?page_size=9', 'donor'),
+]
+# Served by donations.async_views under ASGI
+ASYNC_SCENARIOS = ['campaigns list', 'campaign search', 'campaign detail', 'comments', 'my donations']
+# (application, gunicorn worker class)
+SERVERS = {
+    'wsgi': ('charity_website.wsgi', 'sync'),
+    'asgi': ('charity_website.asgi', 'uvicorn_worker.UvicornWorker'),
+}
+
+
+def api_client(user):
+    client = APIClient()
+    if user is not None:
+        # A real token, so the numbers include what authentication costs
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+    return client
+
+
+class CaptureAllQueries(ExitStack):
+    """
+    CaptureQueriesContext over every database, so reads routed to a replica
+    (donations.routers) are counted too
+    """
+
+    def __enter__(self):
+        super().__enter__()
+        self.captured = [self.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        return self
+
+    def __len__(self):
+        return sum(len(captured) for captured in self.captured)
+
+
+@contextmanager
+def throwaway_database():
+    """
+    A freshly migrated test database for the length of the block. For
+    SQLite it is a file rather than the default in-memory database, so
+    gunicorn can open it.
+    """
+    workdir = tempfile.TemporaryDirectory(prefix='benchmark-api-')
+    if connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir.name, 'benchmark.sqlite3')
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        workdir.cleanup()
+
+
+def summarize(latencies, elapsed, statuses):
+    """
+    Latency percentiles (ms) and throughput for one scenario
+    """
+    ms = sorted(latency * 1000 for latency in latencies)
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    return {
+        'requests': len(ms),
+        'p50_ms': round(cuts[49], 3),
+        'p95_ms': round(cuts[94], 3),
+        'p99_ms': round(cuts[98], 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'throughput_rps': round(len(ms) / elapsed, 1) if elapsed else None,
+        'errors': sum(1 for status in statuses if status >= 400),
+    }
+
+
+def scenario_urls(names=None):
+    campaign = Campaign.objects.values_list('pk', flat=True).first()
+    return [
+        (name, url.format(campaign=campaign), who) for name, url, who in SCENARIOS
+        if names is None or name in names
+    ]
+
+
+def run_in_process(donor_user, admin_user, requests=200, warmup=10):
+    """
+    Request every scenario sequentially through DRF's test client
+    """
+    clients = {None: api_client(None), 'donor': api_client(donor_user), 'admin': api_client(admin_user)}
+    results = {}
+    for name, url, who in scenario_urls():
+        client = clients[who]
+        for _ in range(warmup):
+            client.get(url, secure=True)
+        latencies, statuses, queries = [], [], []
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureAllQueries() as captured:
+                request_started = time.perf_counter()
+                response = client.get(url, secure=True)
+                latencies.append(time.perf_counter() - request_started)
+            statuses.append(response.status_code)
+            queries.append(len(captured))
+        result = summarize(latencies, time.perf_counter() - started, statuses)
+        result['queries'] = max(queries)
+        results[name] = result
+    return results
+
+
+def database_url(settings_dict):
+    """
+    DATABASE_URL pointing a child process at the (test) database in use
+    """
+    if settings_dict['ENGINE'].endswith('sqlite3'):
+        return f"sqlite:///{settings_dict['NAME']}"
+    if settings_dict['ENGINE'].endswith(('postgresql', 'postgis')):
+        user = quote(settings_dict.get('USER') or '')
+        password = quote(settings_dict.get('PASSWORD') or '')
+        credentials = f"{user}:{password}@" if user else ''
+        host = settings_dict.get('HOST') or 'localhost'
+        port = settings_dict.get('PORT') or 5432
+        return f"postgres://{credentials}{host}:{port}/{settings_dict['NAME']}"
+    raise ValueError(f"Cannot hand a {settings_dict['ENGINE']} database to gunicorn")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class GunicornServer:
+    """
+    gunicorn serving this project on a free local port, against the given
+    database; server is a key of SERVERS
+    """
+
+    def __init__(self, db_url, workers=2, threads=1, server='wsgi', env=None):
+        self.port = free_port()
+        # No replicas, they would point at the real databases rather than the test one
+        env = dict(os.environ, DATABASE_URL=db_url, DATABASE_REPLICA_URLS='', SECURE_SSL_REDIRECT='False', DEBUG='False', **(env or {}))
+        env.setdefault('ALLOWED_HOSTS', '127.0.0.1,localhost')
+        application, worker_class = SERVERS[server]
+        self.process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', application,
+                '--worker-class', worker_class,
+                '--bind', f'127.0.0.1:{self.port}',
+                '--workers', str(workers),
+                '--threads', str(threads),
+                '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+
+    def wait(self, timeout=30):
+        wait_listening(self.process, self.port, 'gunicorn', timeout)
+
+    def stop(self):
+        stop_process(self.process)
+
+    def worker_rss(self):
+        """
+        Resident memory of each worker in KiB, None where /proc is missing
+        """
+        try:
+            with open(f'/proc/{self.process.pid}/task/{self.process.pid}/children') as f:
+                workers = [int(pid) for pid in f.read().split()]
+            return {pid: _rss(pid) for pid in workers}
+        except OSError:
+            return None
+
+    def __enter__(self):
+        self.wait()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def wait_listening(process, port, name, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{name} did not start listening within {timeout}s")
+
+
+def stop_process(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _rss(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return None
+
+
+class LiveBroker:
+    """
+    `manage.py run_live_broker` on a free local port, for as long as the
+    context is open
+    """
+
+    def __init__(self):
+        self.port = free_port()
+        self.address = f'127.0.0.1:{self.port}'
+        self.process = subprocess.Popen(
+            [sys.executable, 'manage.py', 'run_live_broker', '--bind', self.address],
+            cwd=settings.BASE_DIR,
+            stdout=subprocess.DEVNULL,
+        )
+
+    def __enter__(self):
+        wait_listening(self.process, self.port, 'the live update broker')
+        return self
+
+    def __exit__(self, *exc_info):
+        stop_process(self.process)
+
+
+class LiveStreams:
+    """
+    Idle campaign progress streams, spread round robin over `campaign_ids`,
+    noting when each campaign's events arrive
+    """
+
+    def __init__(self, port, campaign_ids, count, timeout=30):
+        self.port = port
+        self.campaign_ids = campaign_ids
+        self.count = count
+        self.timeout = timeout
+        self.watchers = defaultdict(int)
+        self.arrivals = defaultdict(list)
+        self.tasks = []
+        self.streaming = 0
+        self.errors = 0
+        self.all_streaming = asyncio.Event()
+
+    async def _stream(self, campaign_id):
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', self.port), self.timeout)
+            writer.write(
+                f'GET /api/campaigns/progress/?campaigns={campaign_id} HTTP/1.1\r\n'
+                f'Host: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n'.encode()
+            )
+            status = await asyncio.wait_for(reader.readline(), self.timeout)
+            if b' 200 ' not in status:
+                raise OSError(f"HTTP {status.decode().strip()}")
+            first = True
+            while line := await reader.readline():
+                # Chunked, but every event line still arrives whole
+                if not line.startswith(b'data:'):
+                    continue
+                if first:
+                    # The current progress, sent on connecting
+                    first = False
+                    self.streaming += 1
+                    if self.streaming + self.errors >= self.count:
+                        self.all_streaming.set()
+                    continue
+                self.arrivals[json.loads(line[5:])['campaign']].append(time.perf_counter())
+        except (OSError, asyncio.TimeoutError, ValueError):
+            self.errors += 1
+            if self.streaming + self.errors >= self.count:
+                self.all_streaming.set()
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def open(self, batch=250):
+        """
+        Connect every stream, `batch` at a time, and wait until each has had
+        its first event. Returns the seconds it took.
+        """
+        started = time.perf_counter()
+        for start in range(0, self.count, batch):
+            for index in range(start, min(start + batch, self.count)):
+                campaign_id = self.campaign_ids[index % len(self.campaign_ids)]
+                self.watchers[campaign_id] += 1
+                self.tasks.append(asyncio.ensure_future(self._stream(campaign_id)))
+            # Let the batch through the listen backlog before the next
+            await asyncio.sleep(0.05)
+        await asyncio.wait_for(self.all_streaming.wait(), self.timeout)
+        return time.perf_counter() - started
+
+    async def delivery(self, campaign_id, since, timeout):
+        """
+        Seconds from `since` to each of the campaign's watchers getting an
+        event, waiting at most `timeout`; watchers missing out are left out
+        """
+        deadline = time.perf_counter() + timeout
+        while len(self.arrivals[campaign_id]) < self.watchers[campaign_id] and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        return [arrived - since for arrived in self.arrivals.pop(campaign_id, [])]
+
+    def close(self):
+        for task in self.tasks:
+            task.cancel()
+
+
+def post_donation(port, token, campaign_id, amount=5):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request(
+            'POST', '/api/donations/', json.dumps({'campaign': campaign_id, 'amount': amount}),
+            {'Host': '127.0.0.1', 'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'},
+        )
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+# Recorded for requests that timed out or lost their connection
+NETWORK_ERROR = 599
+
+
+def _drive(port, url, headers, count, latencies, statuses, lock, timeout=30):
+    # One keep-alive connection per client thread
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            try:
+                conn.request('GET', url, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                status = NETWORK_ERROR
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+    finally:
+        conn.close()
+
+
+def run_http(port, donor_user, admin_user, requests=200, concurrency=4, warmup=10, scenarios=None, timeout=30):
+    """
+    Request every scenario (or the named ones) over HTTP from `concurrency`
+    client threads
+    """
+    tokens = {
+        who: str(RefreshToken.for_user(user).access_token)
+        for who, user in (('donor', donor_user), ('admin', admin_user))
+    }
+    results = {}
+    for name, url, who in scenario_urls(scenarios):
+        headers = {'Host': '127.0.0.1', 'Accept': 'application/json'}
+        if who is not None:
+            headers['Authorization'] = f'Bearer {tokens[who]}'
+        _drive(port, url, headers, warmup, [], [], threading.Lock(), timeout)
+
+        latencies, statuses, lock = [], [], threading.Lock()
+        per_thread = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+        threads = [
+            threading.Thread(target=_drive, args=(port, url, headers, count, latencies, statuses, lock, timeout))
+            for count in per_thread if count
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[name] = summarize(latencies, time.perf_counter() - started, statuses)
+    return results
+
+
+class SlowClients:
+    """
+    Connections that send their request a byte at a time, like clients on a
+    bad mobile network, for as long as the context is open
+    """
+
+    def __init__(self, port, count, interval=0.5):
+        self.port = port
+        self.count = count
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.threads = [threading.Thread(target=self._trickle, daemon=True) for _ in range(count)]
+
+    def _trickle(self):
+        request = b'GET /api/campaigns/ HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: application/json\r\n\r\n'
+        while not self.stopped.is_set():
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=30) as sock:
+                    for byte in request:
+                        if self.stopped.wait(self.interval):
+                            return
+                        sock.sendall(bytes([byte]))
+                    sock.recv(65536)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        for thread in self.threads:
+            thread.start()
+        # Let them connect before the measured clients do
+        time.sleep(self.interval * 2)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+
+def environment(scale):
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'scale': scale,
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(current, baseline, tolerance=0.25):
+    """
+    Regressions of `current` against `baseline` (both benchmark results):
+    p95 latency more than `tolerance` slower, throughput more than
+    `tolerance` lower, or more queries per request. Scenarios missing from
+    either run are skipped. Returns a list of messages.
+    """
+    regressions = []
+    for mode, scenarios in current['results'].items():
+        for name, result in scenarios.items():
+            before = baseline.get('results', {}).get(mode, {}).get(name)
+            if before is None:
+                continue
+            label = f"{mode} / {name}"
+            if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{label}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+            if before.get('throughput_rps') and result['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+                regressions.append(f"{label}: throughput {before['throughput_rps']} -> {result['throughput_rps']} req/s")
+            if 'queries' in before and result.get('queries', 0) > before['queries']:
+                regressions.append(f"{label}: queries {before['queries']} -> {result['queries']}")
+    return regressions
@@ -0,0 +1,179 @@
+"""
+Campaign progress broadcasts to every past donor.
+
+Donors are walked in primary key order in fixed-size batches (keyset, not
+OFFSET), so memory stays flat no matter how many donors a campaign has. Each
+batch renders the email once, sends it to each donor in turn over one shared
+connection and then saves the last donor id as a checkpoint, so an
+interrupted run resumes from the next batch. A donor whose email fails is
+not retried with the batch: the email goes to the outbox, which retries it
+with backoff and dead-letters it, and the checkpoint moves on regardless.
+
+A worker claims a broadcast with a lease (claim_broadcast), renewed with
+every checkpoint, so two workers never send the same one. A worker that dies
+leaves it to be picked up again once the lease runs out, and one that lost
+its lease stops at its next checkpoint.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .counters import with_amount_raised
+from .db import write_atomic
+from .models import Campaign, CampaignBroadcast, Donation, Donor, OutboundEmail
+from .outbox import retry_delay
+
+
+def queue_broadcast(campaign, kind, message='', created_by=None):
+    """
+    Create a pending broadcast, delivered by `manage.py send_campaign_broadcasts`
+    """
+    if kind == 'goal_reached':
+        subject = f'{campaign.title} has reached its goal!'
+    else:
+        subject = f'An update on {campaign.title}'
+    return CampaignBroadcast.objects.create(
+        campaign=campaign, kind=kind, subject=subject, message=message, created_by=created_by,
+    )
+
+
+def iter_donor_batches(campaign_id, after_id=0, batch_size=500):
+    """
+    Yield lists of (donor_id, email) for everyone who donated to the campaign,
+    in donor id order, starting after `after_id`
+    """
+    donor_ids = Donation.objects.filter(campaign_id=campaign_id).values('donor_id')
+    while True:
+        batch = list(
+            Donor.objects.filter(pk__in=donor_ids, pk__gt=after_id)
+            .exclude(user__email='')
+            .order_by('pk')
+            .values_list('pk', 'user__email')[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1][0]
+
+
+def render_broadcast(broadcast):
+    campaign = with_amount_raised(Campaign.objects.filter(pk=broadcast.campaign_id)).get()
+    context = {
+        'heading': 'Goal Reached!' if broadcast.kind == 'goal_reached' else 'Campaign Update',
+        'message': broadcast.message,
+        'campaign_title': campaign.title,
+        'amount_raised': f"KES {campaign.total_amount_raised:,.2f}",
+        'goal': f"KES {campaign.goal:,.2f}",
+    }
+    html_message = render_to_string('donations/emails/campaign_update.html', context)
+    return html_message, strip_tags(html_message)
+
+
+def claim_broadcast():
+    """
+    Lease the oldest broadcast that is not done and no other worker holds,
+    or return None
+    """
+    now = timezone.now()
+    with write_atomic():
+        broadcast = (
+            CampaignBroadcast.objects.select_for_update(skip_locked=True)
+            .filter(status__in=['pending', 'sending'], leased_until__lte=now)
+            .select_related('campaign')
+            .order_by('id')
+            .first()
+        )
+        if broadcast is not None:
+            broadcast.status = 'sending'
+            broadcast.leased_until = now + timedelta(seconds=settings.BROADCAST_LEASE)
+            broadcast.save(update_fields=['status', 'leased_until'])
+    return broadcast
+
+
+def _retry_later(message, error):
+    # The outbox's first attempt failed here, it takes it from the second
+    OutboundEmail.objects.create(
+        subject=message.subject,
+        body=message.body,
+        html_body=message.alternatives[0][0] if message.alternatives else '',
+        from_email=message.from_email,
+        to=message.to,
+        attempts=1,
+        last_error=str(error),
+        next_attempt_at=timezone.now() + retry_delay(1),
+    )
+
+
+def _checkpoint(broadcast, last_donor_id, sent, failed):
+    """
+    Save progress and renew the lease, as long as this worker still holds
+    it. Returns False if it does not.
+    """
+    leased_until = timezone.now() + timedelta(seconds=settings.BROADCAST_LEASE)
+    updated = CampaignBroadcast.objects.filter(pk=broadcast.pk, leased_until=broadcast.leased_until).update(
+        last_donor_id=last_donor_id,
+        sent_count=F('sent_count') + sent,
+        failed_count=F('failed_count') + failed,
+        leased_until=leased_until,
+    )
+    if not updated:
+        return False
+    broadcast.last_donor_id = last_donor_id
+    broadcast.sent_count += sent
+    broadcast.failed_count += failed
+    broadcast.leased_until = leased_until
+    return True
+
+
+def send_broadcast(broadcast, batch_size=500):
+    """
+    Send (or resume sending) a broadcast claimed with claim_broadcast().
+    Returns the number of emails sent by this run.
+    """
+    sent_total = 0
+    connection = get_connection(fail_silently=False)
+    connection.open()
+    try:
+        for batch in iter_donor_batches(broadcast.campaign_id, broadcast.last_donor_id, batch_size):
+            # Rendered once per batch so long broadcasts pick up fresh progress figures
+            html_message, plain_message = render_broadcast(broadcast)
+            sent = failed = 0
+            for donor_id, email in batch:
+                message = EmailMultiAlternatives(
+                    subject=broadcast.subject,
+                    body=plain_message,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[email],
+                    connection=connection,
+                )
+                message.attach_alternative(html_message, 'text/html')
+                try:
+                    message.send()
+                except Exception as e:
+                    _retry_later(message, e)
+                    failed += 1
+                    # The connection may be broken, start the next message on a fresh one
+                    try:
+                        connection.close()
+                        connection.open()
+                    except Exception:
+                        pass
+                else:
+                    sent += 1
+
+            if not _checkpoint(broadcast, batch[-1][0], sent, failed):
+                # Another worker took over after our lease ran out
+                return sent_total + sent
+            sent_total += sent
+    finally:
+        connection.close()
+
+    finished = CampaignBroadcast.objects.filter(pk=broadcast.pk, leased_until=broadcast.leased_until)
+    if finished.update(status='done', finished_at=timezone.now()):
+        broadcast.status = 'done'
+    return sent_total
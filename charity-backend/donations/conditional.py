@@ -0,0 +1,76 @@
+"""
+HTTP conditional requests (ETag / Last-Modified) for the public campaign
+endpoints.
+
+A campaign's validators come from its `version` column (bumped in the
+database on every edit and unsharded donation) plus its exact amount raised,
+so sharded donations change the ETag too. The list uses
+PlatformStatistics.catalog_version, bumped after any campaign or donation
+write, together with the normalized query string. A matching If-None-Match
+gets a 304 before anything is serialized: the list then costs one primary
+key read, and detail only the row lookup. List pages that do need a body are
+served from donations.response_cache when possible.
+"""
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from . import response_cache
+from .statistics import get_catalog_version
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def finalize(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Caches may keep the response but must revalidate it before reuse
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+class ConditionalCampaignMixin:
+    def list(self, request, *args, **kwargs):
+        # Read the version before any data, so a page is never stored under a
+        # version newer than the rows it was built from
+        version = get_catalog_version()
+        if version is None:
+            return super().list(request, *args, **kwargs)
+
+        params = response_cache.normalized_params(request)
+        etag = make_etag('campaigns', version, request.accepted_renderer.format, params)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return finalize(not_modified, etag)
+
+        # Pagination links are absolute, so the host and scheme are part of the key
+        cache_params = (request.build_absolute_uri(request.path), params)
+        data = response_cache.get_page(version, cache_params)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+        else:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code == 200:
+                response_cache.set_page(version, cache_params, response.data)
+            response['X-Cache'] = 'MISS'
+        return finalize(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = make_etag('campaign', instance.pk, instance.version, instance.total_amount_raised, instance.total_donation_count, request.accepted_renderer.format)
+        # Sharded donations do not touch the campaign row, so updated_at would lie
+        last_modified = None if instance.counter_shards else timegm(instance.updated_at.utctimetuple())
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return finalize(not_modified, etag, last_modified)
+        serializer = self.get_serializer(instance)
+        return finalize(Response(serializer.data), etag, last_modified)
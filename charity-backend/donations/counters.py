@@ -0,0 +1,190 @@
+"""
+Contention-safe counters for Campaign.amount_raised, donation_count,
+unique_donor_count and comment_count.
+
+Donations never read-modify-write the campaign row. The change is applied in
+the database with an F() expression, either directly on the campaign or, for
+campaigns with counter_shards > 0, on one of N shard rows picked at random so
+concurrent donors do not all queue behind the same row lock. Shards are summed
+when reading and can be folded back into the campaign with
+`manage.py fold_counter_shards`.
+
+A donation counts towards unique_donor_count when it is its donor's only one
+to the campaign. To decide that, donations take a lock on their donor's row
+first (SQLite's write lock already serializes them), so two first donations
+by the same donor at once cannot both count them. Comments are rare enough
+to go straight to comment_count, and bump the campaign's version like an
+edit.
+
+Writes outside the views and the donation import (the Django admin, deleted
+donors' cascades) are not counted; `manage.py rebuild_campaign_counts`
+recounts everything from the tables.
+"""
+import random
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import statistics
+from .db import write_atomic
+from .models import Campaign, CampaignCounterShard, Comment, Donation, Donor
+
+
+def add_to_amount_raised(campaign, amount, donations=0, donors=0):
+    """
+    Atomically add `amount` (negative to subtract) to a campaign's total,
+    and `donations` and `donors` to its counts
+    """
+    if campaign.counter_shards:
+        _add_to_shard(campaign.pk, random.randrange(campaign.counter_shards), amount, donations, donors)
+    else:
+        Campaign.objects.filter(pk=campaign.pk).update(
+            amount_raised=F('amount_raised') + amount,
+            donation_count=F('donation_count') + donations,
+            unique_donor_count=F('unique_donor_count') + donors,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+    statistics.bump(total_amount_raised=amount, catalog_version=1)
+
+
+def _add_to_shard(campaign_id, shard, amount, donations, donors):
+    shards = CampaignCounterShard.objects.filter(campaign_id=campaign_id, shard=shard)
+    changes = {'amount': F('amount') + amount, 'donations': F('donations') + donations, 'donors': F('donors') + donors}
+    if shards.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            CampaignCounterShard.objects.create(
+                campaign_id=campaign_id, shard=shard, amount=amount, donations=donations, donors=donors,
+            )
+    except IntegrityError:
+        # Another donation created this shard first, add to it instead
+        shards.update(**changes)
+
+
+def lock_donors(donor_ids):
+    """
+    Make donations by these donors wait for each other until the transaction
+    ends. Outside a transaction there is nothing to hold the lock, so it does
+    nothing.
+    """
+    if connection.features.has_select_for_update and connection.in_atomic_block:
+        list(Donor.objects.select_for_update().filter(pk__in=donor_ids).values_list('pk', flat=True))
+
+
+def count_donation(donation, sign=1):
+    """
+    Add a donation that was just saved to its campaign's amount and counts,
+    or take one that was just deleted (sign=-1) off them. Call it inside the
+    write's transaction. Returns whether it is (or was) the donor's only
+    donation to the campaign.
+    """
+    lock_donors([donation.donor_id])
+    # Whether it is (or was) the donor's only donation to the campaign
+    only = not (
+        Donation.objects.filter(campaign_id=donation.campaign_id, donor_id=donation.donor_id)
+        .exclude(pk=donation.pk)
+        .exists()
+    )
+    add_to_amount_raised(donation.campaign, sign * donation.amount, donations=sign, donors=sign * int(only))
+    return only
+
+
+def add_to_comment_count(campaign_id, count):
+    Campaign.objects.filter(pk=campaign_id).update(
+        comment_count=F('comment_count') + count,
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+    statistics.bump(catalog_version=1)
+
+
+def _shard_sum(field, output_field):
+    total = (
+        CampaignCounterShard.objects.filter(campaign=OuterRef('pk'))
+        .values('campaign')
+        .annotate(total=Sum(field))
+        .values('total')
+    )
+    zero = Decimal('0') if isinstance(output_field, DecimalField) else 0
+    return Coalesce(Subquery(total, output_field=output_field), Value(zero), output_field=output_field)
+
+
+def with_amount_raised(queryset):
+    """
+    Annotate a Campaign queryset with the shards' sums (`shard_total`,
+    `shard_donations`, `shard_donors`) so total_amount_raised and the total
+    counts need no extra query per campaign
+    """
+    return queryset.annotate(
+        shard_total=_shard_sum('amount', DecimalField(max_digits=12, decimal_places=2)),
+        shard_donations=_shard_sum('donations', IntegerField()),
+        shard_donors=_shard_sum('donors', IntegerField()),
+    )
+
+
+def fold_counter_shards(campaign_id):
+    """
+    Move everything accumulated in a campaign's shards into amount_raised and
+    its counts. Returns the amount that was folded.
+    """
+    with transaction.atomic():
+        shards = list(CampaignCounterShard.objects.select_for_update().filter(campaign_id=campaign_id))
+        total = sum((shard.amount for shard in shards), Decimal('0'))
+        donations = sum(shard.donations for shard in shards)
+        donors = sum(shard.donors for shard in shards)
+        if total or donations or donors:
+            Campaign.objects.filter(pk=campaign_id).update(
+                amount_raised=F('amount_raised') + total,
+                donation_count=F('donation_count') + donations,
+                unique_donor_count=F('unique_donor_count') + donors,
+            )
+        CampaignCounterShard.objects.filter(pk__in=[shard.pk for shard in shards]).delete()
+    return total
+
+
+def _count(model, field, distinct=False):
+    counts = (
+        model.objects.filter(campaign=OuterRef('pk')).order_by().values('campaign')
+        .annotate(count=Count(field, distinct=distinct)).values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+COUNT_FIELDS = ('comment_count', 'donation_count', 'unique_donor_count')
+
+
+def rebuild_campaign_counts(check=False):
+    """
+    Recount every campaign's comments, donations and donors from the tables,
+    taking the counts out of its shards. Returns {campaign id: (stored,
+    actual)} for the campaigns whose counts were wrong, and with check=True
+    only that.
+    """
+    with write_atomic():
+        campaigns = with_amount_raised(Campaign.objects.only(*COUNT_FIELDS)).annotate(
+            actual_comments=_count(Comment, 'id'),
+            actual_donations=_count(Donation, 'id'),
+            actual_donors=_count(Donation, 'donor', distinct=True),
+        )
+        drifted = {}
+        for campaign in campaigns.iterator():
+            stored = (campaign.comment_count, campaign.total_donation_count, campaign.total_unique_donor_count)
+            actual = (campaign.actual_comments, campaign.actual_donations, campaign.actual_donors)
+            if stored != actual:
+                drifted[campaign.pk] = (stored, actual)
+            elif not (campaign.shard_donations or campaign.shard_donors):
+                continue
+            if not check:
+                Campaign.objects.filter(pk=campaign.pk).update(
+                    version=F('version') + 1, **dict(zip(COUNT_FIELDS, actual)),
+                )
+        if not check:
+            CampaignCounterShard.objects.exclude(donations=0, donors=0).update(donations=0, donors=0)
+            if drifted:
+                statistics.bump(catalog_version=1)
+    return drifted
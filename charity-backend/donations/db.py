@@ -0,0 +1,39 @@
+"""
+Write transactions that behave under concurrency on SQLite.
+
+SQLite starts a plain BEGIN (DEFERRED) transaction as a reader and upgrades
+it to a writer on the first write. If another connection is writing at that
+point the upgrade fails straight away with "database is locked", the busy
+timeout does not help. write_atomic() starts the outermost transaction with
+BEGIN IMMEDIATE instead, so it waits (up to the busy timeout) for the write
+lock before doing anything. On other databases, and nested inside an
+existing transaction, it is plain transaction.atomic().
+"""
+from django.db import transaction
+from django.db.transaction import Atomic
+
+
+class WriteAtomic(Atomic):
+    def __enter__(self):
+        connection = transaction.get_connection(self.using)
+        if connection.vendor != 'sqlite' or connection.in_atomic_block:
+            return super().__enter__()
+        # Connecting resets transaction_mode from OPTIONS, so connect first;
+        # it is only read when the outermost block starts its transaction
+        connection.ensure_connection()
+        previous = connection.transaction_mode
+        connection.transaction_mode = 'IMMEDIATE'
+        try:
+            return super().__enter__()
+        finally:
+            connection.transaction_mode = previous
+
+
+def write_atomic(using=None, savepoint=True, durable=False):
+    """
+    transaction.atomic() for blocks that write, usable as a context manager
+    or decorator
+    """
+    if callable(using):
+        return WriteAtomic(None, savepoint, durable)(using)
+    return WriteAtomic(using, savepoint, durable)
@@ -0,0 +1,204 @@
+"""
+Campaign image storage and resizing.
+
+An upload is hashed and stored once under its SHA-256 (store_upload()), so
+the same picture uploaded twice shares one CampaignImage and one set of
+files. The request only does that; the thumbnail/card/hero variants are
+rendered by `manage.py process_campaign_images`, which leases pending images
+like the email outbox does and resizes them with Pillow in a process pool.
+
+Variant names are derived from the original's hash and the variant's size,
+so a URL always points at the same bytes and can be cached forever; changing
+a size in VARIANTS produces new names instead of overwriting old files.
+"""
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import statistics
+from .models import Campaign, CampaignImage
+
+IMAGE_DIR = 'campaign-images'
+# name: (width, height, crop). Cropped variants are filled to exactly that
+# size, the others are shrunk to fit inside it.
+VARIANTS = {
+    'thumbnail': (320, 180, True),
+    'card': (640, 360, True),
+    'hero': (1600, 900, False),
+}
+JPEG_QUALITY = 82
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
+def original_name(sha256, extension):
+    return f'{IMAGE_DIR}/originals/{sha256}{extension}'
+
+
+def variant_name(sha256, variant):
+    width, height, _ = VARIANTS[variant]
+    return f'{IMAGE_DIR}/{sha256[:2]}/{sha256}-{variant}-{width}x{height}.jpg'
+
+
+def variant_url(image, variant):
+    """
+    URL of one variant, or None until the image has been processed
+    """
+    if image is None or image.status != 'ready':
+        return None
+    return default_storage.url(variant_name(image.sha256, variant))
+
+
+def store_upload(upload):
+    """
+    Store an uploaded (already validated) image under its content hash and
+    return its CampaignImage, reusing the existing one for a duplicate
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    sha256 = digest.hexdigest()
+
+    existing = CampaignImage.objects.filter(sha256=sha256).first()
+    if existing is not None:
+        return existing
+
+    # DRF's ImageField leaves the Pillow image it verified on the upload
+    image_format = getattr(getattr(upload, 'image', None), 'format', None)
+    name = original_name(sha256, EXTENSIONS.get(image_format, '.img'))
+    if not default_storage.exists(name):
+        upload.seek(0)
+        name = default_storage.save(name, upload)
+    try:
+        with transaction.atomic():
+            return CampaignImage.objects.create(sha256=sha256, original=name)
+    except IntegrityError:
+        # The same file was uploaded concurrently
+        return CampaignImage.objects.get(sha256=sha256)
+
+
+def render_variants(data):
+    """
+    Resize an original into every variant. Runs in the worker processes, so
+    it only deals in bytes. Returns ((width, height), {variant: jpeg bytes}).
+    """
+    with Image.open(BytesIO(data)) as original:
+        size = original.size
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    rendered = {}
+    for variant, (width, height, crop) in VARIANTS.items():
+        if crop:
+            resized = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        resized.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        rendered[variant] = buffer.getvalue()
+    return size, rendered
+
+
+def claim_batch(batch_size):
+    """
+    Lease up to batch_size due images so other workers skip them while they
+    are being resized
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            CampaignImage.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            CampaignImage.objects.filter(pk__in=[image.pk for image in batch]).update(
+                next_attempt_at=now + timedelta(seconds=settings.CAMPAIGN_IMAGE_LEASE)
+            )
+    return batch
+
+
+def _read(image):
+    with default_storage.open(image.original, 'rb') as f:
+        return f.read()
+
+
+def _failed(image, error):
+    image.attempts += 1
+    image.last_error = str(error)
+    if image.attempts >= settings.CAMPAIGN_IMAGE_MAX_ATTEMPTS:
+        image.status = 'failed'
+    else:
+        image.next_attempt_at = timezone.now() + timedelta(seconds=30 * 2 ** (image.attempts - 1))
+
+
+def process_batch(batch, executor):
+    """
+    Render a claimed batch in the executor's worker processes and store the
+    results. Returns (ready, failed) counts, failed including images that
+    will be retried.
+    """
+    futures = {}
+    for image in batch:
+        try:
+            futures[image.pk] = executor.submit(render_variants, _read(image))
+        except Exception as e:
+            _failed(image, e)
+
+    ready = []
+    for image in batch:
+        future = futures.get(image.pk)
+        if future is None:
+            continue
+        try:
+            (image.width, image.height), rendered = future.result()
+            for variant, data in rendered.items():
+                name = variant_name(image.sha256, variant)
+                if not default_storage.exists(name):
+                    default_storage.save(name, ContentFile(data))
+        except Exception as e:
+            _failed(image, e)
+        else:
+            image.status = 'ready'
+            image.attempts += 1
+            image.processed_at = timezone.now()
+            ready.append(image)
+
+    CampaignImage.objects.bulk_update(batch, ['status', 'width', 'height', 'attempts', 'last_error', 'next_attempt_at', 'processed_at'])
+    if ready:
+        # The new URLs change the campaigns' representations
+        Campaign.objects.filter(image__in=ready).update(version=F('version') + 1, updated_at=timezone.now())
+        statistics.bump(catalog_version=1)
+    return len(ready), len(batch) - len(ready)
+
+
+def process_pending(executor=None, batch_size=None, max_batches=None):
+    """
+    Process due images until none are left (or max_batches is reached).
+    Returns (ready, failed).
+    """
+    batch_size = batch_size or settings.CAMPAIGN_IMAGE_BATCH_SIZE
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ProcessPoolExecutor(max_workers=settings.CAMPAIGN_IMAGE_WORKERS)
+    totals = [0, 0]
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            for i, count in enumerate(process_batch(batch, executor)):
+                totals[i] += count
+            batches += 1
+    finally:
+        if owns_executor:
+            executor.shutdown()
+    return tuple(totals)
@@ -0,0 +1,305 @@
+"""
+Bulk import of offline donations (M-Pesa batches, bank transfers).
+
+A file is CSV with a header row, or NDJSON (one object per line), with the
+columns the export writes: campaign_id, donor_id or donor_email, amount and
+optionally donated_at. The whole file is validated first with set-based
+lookups, and nothing is written if any row is bad. Valid files are written in
+one transaction:
+
+- donations go in with bulk_create, chunk_size rows at a time
+- each affected campaign gets its imported total, summed per campaign while
+  validating, and its donation and new donor counts in a single UPDATE (one
+  per 500 campaigns)
+- confirmation emails are bulk inserted into the outbox
+- the platform statistics get one bump, the donors' summaries are
+  recomputed, the campaigns' trends get the donations and their live
+  progress streams are told, since bulk_create skips the signals
+"""
+import csv
+import json
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, live, statistics, summaries, trending
+from .db import write_atomic
+from .models import Campaign, Donation, Donor
+from .outbox import queue_emails
+from .utils import build_donation_confirmation_email
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 100
+# Keep IN (...) lists well under SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+MAX_AMOUNT = Decimal('99999999.99')
+
+
+class DonationImportError(Exception):
+    """
+    The file did not validate, `errors` says which lines and why
+    """
+
+    def __init__(self, errors, count=None):
+        super().__init__(f"{count or len(errors)} invalid row(s)")
+        self.errors = errors
+
+
+class ImportRow:
+    __slots__ = ('line', 'campaign', 'donor', 'amount', 'donated_at')
+
+    def __init__(self, line, campaign, donor, amount, donated_at):
+        self.line = line
+        self.campaign = campaign
+        self.donor = donor
+        self.amount = amount
+        self.donated_at = donated_at
+
+
+def guess_format(filename):
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def read_records(stream, file_format):
+    """
+    Yield (line number, dict) for every record in a text stream
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _clean(value):
+    return '' if value is None else str(value).strip()
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(_clean(value))
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount <= 0 or amount > MAX_AMOUNT or amount != amount.quantize(Decimal('0.01')):
+        return None
+    return amount.quantize(Decimal('0.01'))
+
+
+def _parse_donated_at(value, now):
+    value = _clean(value)
+    if not value:
+        return None, None
+    try:
+        donated_at = parse_datetime(value)
+    except ValueError:
+        donated_at = None
+    if donated_at is None:
+        return None, f"invalid donated_at {value!r}"
+    if timezone.is_naive(donated_at):
+        donated_at = timezone.make_aware(donated_at)
+    if donated_at > now:
+        return None, "donated_at is in the future"
+    return donated_at, None
+
+
+def validate(records):
+    """
+    Check every record and resolve campaigns and donors in bulk. Returns
+    (rows, errors, error count); rows is only usable when there are no errors.
+    """
+    now = timezone.now()
+    parsed = []
+    errors = []
+    error_count = 0
+    campaign_ids, donor_ids, donor_emails = set(), set(), set()
+
+    def error(line, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append(f"line {line}: {message}")
+
+    for line, record in records:
+        if record is None:
+            error(line, "not a JSON object")
+            continue
+        campaign_id = _clean(record.get('campaign_id') or record.get('campaign'))
+        donor_id = _clean(record.get('donor_id') or record.get('donor'))
+        donor_email = _clean(record.get('donor_email')).lower()
+        amount = _parse_amount(record.get('amount'))
+        donated_at, date_error = _parse_donated_at(record.get('donated_at'), now)
+
+        if not campaign_id.isdigit():
+            error(line, f"invalid campaign_id {campaign_id!r}")
+        elif donor_id and not donor_id.isdigit():
+            error(line, f"invalid donor_id {donor_id!r}")
+        elif not donor_id and not donor_email:
+            error(line, "donor_id or donor_email is required")
+        elif amount is None:
+            error(line, f"invalid amount {_clean(record.get('amount'))!r}")
+        elif date_error:
+            error(line, date_error)
+        else:
+            campaign_ids.add(int(campaign_id))
+            if donor_id:
+                donor_ids.add(int(donor_id))
+            else:
+                donor_emails.add(donor_email)
+            parsed.append((line, int(campaign_id), int(donor_id) if donor_id else donor_email, amount, donated_at))
+
+    campaigns = {}
+    for chunk in _chunks(campaign_ids, LOOKUP_CHUNK_SIZE):
+        campaigns.update(Campaign.objects.in_bulk(chunk))
+    donors = {}
+    for chunk in _chunks(donor_ids, LOOKUP_CHUNK_SIZE):
+        donors.update(Donor.objects.select_related('user').in_bulk(chunk))
+    donors_by_email = {}
+    for chunk in _chunks(donor_emails, LOOKUP_CHUNK_SIZE):
+        matches = Donor.objects.select_related('user').annotate(email=Lower('user__email')).filter(email__in=chunk)
+        for donor in matches:
+            # Two accounts with one address cannot be told apart
+            donors_by_email[donor.email] = None if donor.email in donors_by_email else donor
+
+    rows = []
+    for line, campaign_id, donor_key, amount, donated_at in parsed:
+        campaign = campaigns.get(campaign_id)
+        donor = donors.get(donor_key) if isinstance(donor_key, int) else donors_by_email.get(donor_key)
+        if campaign is None:
+            error(line, f"campaign {campaign_id} does not exist")
+        elif donor is None:
+            if isinstance(donor_key, str) and donor_key in donors_by_email:
+                error(line, f"more than one donor has the email {donor_key}")
+            else:
+                error(line, f"donor {donor_key} does not exist")
+        else:
+            rows.append(ImportRow(line, campaign, donor, amount, donated_at))
+    if error_count > len(errors):
+        errors.append(f"... and {error_count - len(errors)} more")
+    return rows, errors, error_count
+
+
+def count_new_donors(rows):
+    """
+    How many of the rows' donors give to each campaign for the first time.
+    Call it inside the import's transaction, before the donations are
+    written.
+    """
+    pairs = {(row.campaign.pk, row.donor.pk) for row in rows}
+    for donor_ids in _chunks(sorted({donor_id for _, donor_id in pairs}), LOOKUP_CHUNK_SIZE):
+        counters.lock_donors(donor_ids)
+        pairs -= set(
+            Donation.objects.filter(donor_id__in=donor_ids)
+            .values_list('campaign_id', 'donor_id').distinct().order_by()
+        )
+    new_donors = defaultdict(int)
+    for campaign_id, _ in pairs:
+        new_donors[campaign_id] += 1
+    return new_donors
+
+
+def apply_campaign_totals(totals, donation_counts, new_donors):
+    """
+    Add each campaign's imported amount to amount_raised, and its imported
+    donations and new donors to its counts, one UPDATE per LOOKUP_CHUNK_SIZE
+    campaigns
+    """
+    updated = 0
+    now = timezone.now()
+    for chunk in _chunks(totals.items(), LOOKUP_CHUNK_SIZE):
+        added = Case(
+            *[When(pk=pk, then=Value(total)) for pk, total in chunk],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        donations = Case(*[When(pk=pk, then=Value(donation_counts[pk])) for pk, _ in chunk], output_field=IntegerField())
+        donors = Case(*[When(pk=pk, then=Value(new_donors.get(pk, 0))) for pk, _ in chunk], output_field=IntegerField())
+        updated += Campaign.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+            amount_raised=F('amount_raised') + added,
+            donation_count=F('donation_count') + donations,
+            unique_donor_count=F('unique_donor_count') + donors,
+            version=F('version') + 1,
+            updated_at=now,
+        )
+    return updated
+
+
+def import_donations(stream, file_format='csv', chunk_size=1000, send_emails=True, dry_run=False):
+    """
+    Validate and import a file of donations. Raises DonationImportError if
+    any row is invalid, otherwise returns a report dict with the counts and
+    timings.
+    """
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format {file_format!r}")
+    started = time.perf_counter()
+    rows, errors, error_count = validate(read_records(stream, file_format))
+    if errors:
+        raise DonationImportError(errors, error_count)
+    validated = time.perf_counter()
+
+    totals = defaultdict(Decimal)
+    donation_counts = defaultdict(int)
+    for row in rows:
+        totals[row.campaign.pk] += row.amount
+        donation_counts[row.campaign.pk] += 1
+
+    emails_queued = 0
+    if not dry_run and rows:
+        created = []
+        with write_atomic():
+            new_donors = count_new_donors(rows)
+            for chunk in _chunks(rows, chunk_size):
+                donations = Donation.objects.bulk_create([
+                    Donation(donor=row.donor, campaign=row.campaign, amount=row.amount) for row in chunk
+                ])
+                created += donations
+                # donated_at is auto_now_add, so dates from the file are written afterwards
+                dated = []
+                for donation, row in zip(donations, chunk):
+                    if row.donated_at is not None:
+                        donation.donated_at = row.donated_at
+                        dated.append(donation)
+                if dated:
+                    Donation.objects.bulk_update(dated, ['donated_at'])
+                if send_emails:
+                    emails_queued += queue_emails(
+                        build_donation_confirmation_email(donation, row.donor, row.campaign)
+                        for donation, row in zip(donations, chunk)
+                    )
+            apply_campaign_totals(totals, donation_counts, new_donors)
+            summaries.refresh({row.donor.pk for row in rows})
+            trending.record_many((row.campaign.pk, donation.donated_at, 1, row.amount) for donation, row in zip(created, rows))
+            statistics.bump(total_donations=len(rows), total_amount_raised=sum(totals.values(), Decimal('0')), catalog_version=1)
+            live.publish(totals)
+    finished = time.perf_counter()
+
+    write_seconds = finished - validated
+    return {
+        'dry_run': dry_run,
+        'donations': len(rows),
+        'campaigns': len(totals),
+        'amount': str(sum(totals.values(), Decimal('0'))),
+        'emails_queued': emails_queued,
+        'validate_seconds': round(validated - started, 3),
+        'write_seconds': round(write_seconds, 3),
+        'total_seconds': round(finished - started, 3),
+        'rows_per_second': round(len(rows) / (finished - started), 1) if rows and finished > started else None,
+    }
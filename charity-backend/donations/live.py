@@ -0,0 +1,513 @@
+"""
+Live campaign progress over server-sent events, for ASGI deployments.
+
+GET /api/campaigns/progress/?campaigns=1,2,3 is an event stream: the current
+progress of each campaign straight away, then a `progress` event whenever
+one of them changes, and a comment line every LIVE_HEARTBEAT_SECONDS so idle
+connections stay open through proxies. EventSource reconnects on its own.
+charity_website.asgi serves it with LiveUpdatesApp, in front of Django.
+
+Donation saves and deletes, imports and campaign edits publish the campaign
+ids once their transaction commits (publish()). Each worker has one Hub on
+its event loop that:
+
+- keeps, per campaign, the set of open streams watching it; an idle stream is
+  a Subscription (a dict of pending events and an asyncio.Event) and the task
+  waiting on it, not a thread or a Django request, so a worker holds
+  thousands of them
+- coalesces: changed ids are collected and read in one query at
+  most every LIVE_UPDATE_INTERVAL seconds, however many donations come in and
+  however many clients watch, and only changed progress is sent. Each event
+  is serialized once and the same bytes go to every stream.
+- answers new streams from the progress it already has, and reads the rest
+  once for everybody connecting at the same time
+- re-reads every watched campaign every LIVE_RESYNC_SECONDS, which catches
+  changes made without publishing (raw updates, shard folds) or missed
+  while the broker was unreachable
+
+With more than one worker, a donation handled by one worker has to reach the
+streams of the others. Set LIVE_BROKER_ADDRESS and run
+`manage.py run_live_broker`, a small PUB/SUB relay standing in for e.g. Redis
+pub/sub: publishers write lines of ids to it, and it forwards them to every
+worker's hub, the publishing one included. Without it ids only reach the
+hub of the process that published them.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from corsheaders.conf import conf as cors_conf
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.http.request import split_domain_port, validate_host
+
+from .counters import with_amount_raised
+from .models import Campaign
+
+logger = logging.getLogger(__name__)
+
+PATH = '/api/campaigns/progress/'
+# Campaign ids per query, and per line to the broker
+CHUNK_SIZE = 500
+# Milliseconds EventSource waits before reconnecting
+RETRY_MS = 5000
+# Seconds between attempts to reach the broker
+BROKER_RETRY = 2
+BROKER_TIMEOUT = 0.5
+# Bytes the broker buffers for a worker that stopped reading before dropping it
+BROKER_MAX_BUFFER = 1024 * 1024
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parse_ids(text):
+    """
+    Campaign ids from a comma-separated list, ValueError if it is not one
+    """
+    ids = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part.isdigit():
+            raise ValueError(f"invalid campaign id {part!r}")
+        ids.append(int(part))
+    return ids
+
+
+def fetch_progress(campaign_ids):
+    """
+    {campaign id: progress dict} for the campaigns that exist
+    """
+    close_old_connections()
+    try:
+        progress = {}
+        for chunk in _chunks(campaign_ids, CHUNK_SIZE):
+            campaigns = with_amount_raised(
+                Campaign.objects.filter(pk__in=chunk)
+                .only('id', 'goal', 'amount_raised', 'unique_donor_count', 'is_active')
+            )
+            for campaign in campaigns:
+                progress[campaign.pk] = {
+                    'campaign': campaign.pk,
+                    'amount_raised': str(campaign.total_amount_raised),
+                    'goal': str(campaign.goal),
+                    'donors': campaign.total_unique_donor_count,
+                    'is_active': campaign.is_active,
+                }
+        return progress
+    finally:
+        close_old_connections()
+
+
+def event(progress):
+    return f"event: progress\ndata: {json.dumps(progress, separators=(',', ':'))}\n\n".encode()
+
+
+class Subscription:
+    """
+    One open stream: the campaigns it watches and the events not yet sent,
+    only the latest per campaign
+    """
+    __slots__ = ('campaign_ids', 'pending', 'ready', 'closed')
+
+    def __init__(self, campaign_ids):
+        self.campaign_ids = campaign_ids
+        self.pending = {}
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def push(self, campaign_id, data):
+        self.pending[campaign_id] = data
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    async def wait(self, timeout):
+        """
+        The events pending after at most `timeout` seconds, maybe none;
+        None once the client has gone
+        """
+        if not self.pending and not self.closed:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self.closed:
+            return None
+        self.ready.clear()
+        pending, self.pending = self.pending, {}
+        return list(pending.values())
+
+
+class Hub:
+    """
+    The streams of this process and the latest event of every campaign they
+    watch. Lives on one event loop; changed() may be called from any thread.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.subscriptions = defaultdict(set)
+        self.latest = {}
+        self.loading = {}
+        self.dirty = set()
+        self.wakeup = None
+        self.tasks = []
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+        # First stream in this process, or a new loop (tests)
+        self.loop = loop
+        self.subscriptions.clear()
+        self.latest.clear()
+        self.loading.clear()
+        self.dirty = set()
+        self.wakeup = asyncio.Event()
+        # Outside the first stream's context, which ends long before these do
+        context = contextvars.Context()
+        self.tasks = [context.run(loop.create_task, self._flush_forever())]
+        if settings.LIVE_BROKER_ADDRESS:
+            self.tasks.append(context.run(loop.create_task, self._listen_forever(settings.LIVE_BROKER_ADDRESS)))
+
+    def subscribe(self, campaign_ids):
+        self._start()
+        subscription = Subscription(campaign_ids)
+        for campaign_id in campaign_ids:
+            self.subscriptions[campaign_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for campaign_id in subscription.campaign_ids:
+            subscriptions = self.subscriptions.get(campaign_id)
+            if subscriptions is None:
+                continue
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                # Nobody to keep it current for
+                del self.subscriptions[campaign_id]
+                self.latest.pop(campaign_id, None)
+
+    async def snapshot(self, campaign_ids):
+        """
+        The latest event of each campaign (that exists), reading the ones
+        not known yet, once for all streams asking at the same time
+        """
+        to_load = [pk for pk in campaign_ids if pk not in self.latest and pk not in self.loading]
+        if to_load:
+            future = asyncio.ensure_future(sync_to_async(fetch_progress)(to_load))
+            for pk in to_load:
+                self.loading[pk] = future
+            future.add_done_callback(lambda done: self._loaded(to_load, done))
+        waiting = {self.loading[pk] for pk in campaign_ids if pk in self.loading}
+        if waiting:
+            # Shielded: a client leaving must not cancel the read for the others
+            for result in await asyncio.gather(*(asyncio.shield(f) for f in waiting), return_exceptions=True):
+                if isinstance(result, Exception):
+                    logger.warning("Could not read campaign progress: %s", result)
+        return [self.latest[pk] for pk in campaign_ids if pk in self.latest]
+
+    def _loaded(self, campaign_ids, future):
+        for pk in campaign_ids:
+            self.loading.pop(pk, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        for pk, progress in future.result().items():
+            if pk in self.subscriptions:
+                # A flush may have got there first with something newer
+                self.latest.setdefault(pk, event(progress))
+
+    def changed(self, campaign_ids):
+        """
+        Note that these campaigns changed; safe from any thread
+        """
+        loop = self.loop
+        if loop is None:
+            # No stream was ever opened in this process
+            return
+        try:
+            loop.call_soon_threadsafe(self._mark, campaign_ids)
+        except RuntimeError:
+            # The loop is closed
+            pass
+
+    def _mark(self, campaign_ids):
+        watched = [pk for pk in campaign_ids if pk in self.subscriptions]
+        if watched:
+            self.dirty.update(watched)
+            self.wakeup.set()
+
+    async def _flush_forever(self):
+        resync_at = time.monotonic() + settings.LIVE_RESYNC_SECONDS
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), max(0, resync_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            if time.monotonic() >= resync_at:
+                self.dirty.update(self.subscriptions)
+                resync_at = time.monotonic() + settings.LIVE_RESYNC_SECONDS
+            campaign_ids = [pk for pk in self.dirty if pk in self.subscriptions]
+            self.dirty = set()
+            if campaign_ids:
+                try:
+                    progress = await sync_to_async(fetch_progress)(campaign_ids)
+                except Exception:
+                    logger.exception("Could not read campaign progress")
+                    self._mark(campaign_ids)
+                else:
+                    self._deliver(progress)
+            # At most one read per interval; changes meanwhile wait for the next
+            await asyncio.sleep(settings.LIVE_UPDATE_INTERVAL)
+
+    def _deliver(self, progress):
+        for campaign_id, values in progress.items():
+            subscriptions = self.subscriptions.get(campaign_id)
+            if not subscriptions:
+                continue
+            data = event(values)
+            if self.latest.get(campaign_id) == data:
+                continue
+            self.latest[campaign_id] = data
+            for subscription in subscriptions:
+                subscription.push(campaign_id, data)
+
+    async def _listen_forever(self, address):
+        host, port = split_address(address)
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+                writer.write(b'SUB\n')
+                await writer.drain()
+                # Whatever was published while disconnected is lost, so read everything again
+                self._mark(list(self.subscriptions))
+                while line := await reader.readline():
+                    try:
+                        self._mark(parse_ids(line.decode()))
+                    except ValueError:
+                        pass
+            except (OSError, ValueError) as e:
+                logger.warning("Live update broker at %s: %s", address, e)
+            finally:
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(BROKER_RETRY)
+
+
+hub = Hub()
+
+
+def split_address(address):
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+class BrokerPublisher:
+    """
+    This process's connection to the broker for publishing, shared by its
+    threads
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sock = None
+        self.pid = None
+        self.retry_at = 0
+
+    def publish(self, campaign_ids):
+        """
+        Send the ids to the broker, False if it could not be reached
+        """
+        lines = b''.join(f"{','.join(map(str, chunk))}\n".encode() for chunk in _chunks(campaign_ids, CHUNK_SIZE))
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked: the parent's socket is not ours
+                self.sock, self.pid = None, os.getpid()
+            try:
+                if self.sock is None:
+                    if time.monotonic() < self.retry_at:
+                        return False
+                    self.sock = socket.create_connection(split_address(settings.LIVE_BROKER_ADDRESS), timeout=BROKER_TIMEOUT)
+                    self.sock.sendall(b'PUB\n')
+                self.sock.sendall(lines)
+                return True
+            except OSError as e:
+                logger.warning("Live update broker at %s: %s", settings.LIVE_BROKER_ADDRESS, e)
+                if self.sock is not None:
+                    self.sock.close()
+                self.sock = None
+                self.retry_at = time.monotonic() + BROKER_RETRY
+                return False
+
+
+publisher = BrokerPublisher()
+
+
+def publish(campaign_ids):
+    """
+    Tell the live streams that these campaigns' progress changed, once the
+    current transaction commits
+    """
+    campaign_ids = sorted(set(campaign_ids))
+    if campaign_ids:
+        transaction.on_commit(lambda: _send(campaign_ids))
+
+
+def _send(campaign_ids):
+    # The broker hands them back to this process's hub too
+    if settings.LIVE_BROKER_ADDRESS and publisher.publish(campaign_ids):
+        return
+    hub.changed(campaign_ids)
+
+
+async def serve_broker(host, port, ready=None):
+    """
+    Relay every line a PUB connection sends to all SUB connections
+    """
+    subscribers = set()
+
+    async def handle(reader, writer):
+        try:
+            role = (await reader.readline()).strip()
+            if role == b'SUB':
+                subscribers.add(writer)
+                # Nothing is expected from a worker, this just waits for it to leave
+                while await reader.read(4096):
+                    pass
+            elif role == b'PUB':
+                while line := await reader.readline():
+                    if not line.endswith(b'\n'):
+                        break
+                    for subscriber in list(subscribers):
+                        if subscriber.transport.get_write_buffer_size() > BROKER_MAX_BUFFER:
+                            # Stuck; it reads everything again when it reconnects
+                            subscribers.discard(subscriber)
+                            subscriber.close()
+                        else:
+                            subscriber.write(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            subscribers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def _allowed_origin(origin):
+    # The same lists as corsheaders, which does not see these requests
+    return (
+        cors_conf.CORS_ALLOW_ALL_ORIGINS
+        or origin in cors_conf.CORS_ALLOWED_ORIGINS
+        or any(re.match(pattern, origin) for pattern in cors_conf.CORS_ALLOWED_ORIGIN_REGEXES)
+    )
+
+
+def _valid_host(host):
+    allowed = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed:
+        allowed = ['.localhost', '127.0.0.1', '[::1]']
+    domain, _ = split_domain_port(host)
+    return bool(domain) and validate_host(domain, allowed)
+
+
+async def _respond(send, status, data, headers=()):
+    body = json.dumps(data).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _until_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_progress(scope, receive, send):
+    """
+    GET /api/campaigns/progress/?campaigns=1,2,3: the progress of those
+    campaigns as server-sent events
+    """
+    headers = dict(scope['headers'])
+    if not _valid_host(headers.get(b'host', b'').decode('latin-1')):
+        return await _respond(send, 400, {'error': 'Invalid host'})
+    if scope['method'] != 'GET':
+        return await _respond(send, 405, {'error': 'Method not allowed'}, [(b'allow', b'GET')])
+    query = parse_qs(scope['query_string'].decode('latin-1'))
+    try:
+        campaign_ids = list(dict.fromkeys(parse_ids(query.get('campaigns', [''])[-1])))
+    except ValueError:
+        return await _respond(send, 400, {'error': 'campaigns must be a comma-separated list of campaign ids'})
+    if len(campaign_ids) > settings.LIVE_MAX_CAMPAIGNS:
+        return await _respond(send, 400, {'error': f'at most {settings.LIVE_MAX_CAMPAIGNS} campaigns per stream'})
+
+    response_headers = [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        # Or nginx holds the events back until its buffer fills
+        (b'x-accel-buffering', b'no'),
+    ]
+    origin = headers.get(b'origin', b'').decode('latin-1')
+    if origin and _allowed_origin(origin):
+        response_headers += [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'origin')]
+        if cors_conf.CORS_ALLOW_CREDENTIALS:
+            response_headers.append((b'access-control-allow-credentials', b'true'))
+
+    subscription = hub.subscribe(campaign_ids)
+    listener = asyncio.ensure_future(_until_disconnect(receive))
+    listener.add_done_callback(lambda _: subscription.close())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+        chunks = [f"retry: {RETRY_MS}\n\n".encode(), *await hub.snapshot(campaign_ids)]
+        await send({'type': 'http.response.body', 'body': b''.join(chunks), 'more_body': True})
+        while (events := await subscription.wait(settings.LIVE_HEARTBEAT_SECONDS)) is not None:
+            body = b''.join(events) if events else b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    except OSError:
+        # Gone while we were writing
+        pass
+    finally:
+        hub.unsubscribe(subscription)
+        listener.cancel()
+
+
+class LiveUpdatesApp:
+    """
+    ASGI app answering PATH itself and handing everything else to Django.
+    A stream served by a Django view would keep its request's thread (and
+    request, middleware and response) for as long as it is open; here an
+    idle stream is only its task and its Subscription.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == PATH:
+            await stream_progress(scope, receive, send)
+        else:
+            await self.application(scope, receive, send)
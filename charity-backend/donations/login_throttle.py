@@ -0,0 +1,132 @@
+"""
+Login throttling that rejects before the password is checked.
+
+Checking a password is deliberately slow (PBKDF2 with many iterations), so a
+credential-stuffing burst against the login views would keep every core
+busy hashing. LoginThrottle runs in DRF's throttle step, before the view
+touches the database or the hasher, and allows at most
+LOGIN_THROTTLE_USERNAME_LIMIT attempts per username and
+LOGIN_THROTTLE_IP_LIMIT per client address in any LOGIN_THROTTLE_WINDOW
+seconds. Anything over answers 429 with Retry-After straight away. The client
+address is DRF's get_ident(), which only reads X-Forwarded-For as far as
+REST_FRAMEWORK['NUM_PROXIES'] trusted proxies appended to it.
+
+The window slides by weighing the previous fixed window's count by how much
+of it still overlaps: two cache keys per limit and an incr, instead of a
+list of timestamps read and rewritten on every attempt (DRF's
+SimpleRateThrottle), which would also lose attempts made at the same time.
+Attempts are counted when they are let through, and a successful login
+clears its username's count. The counts live in the cache, so they only
+hold across workers with a shared one (see CACHES).
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+KEY_PREFIX = 'login-throttle'
+
+
+class SlidingWindow:
+    def __init__(self, scope, limit, window):
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+
+    def keys(self, ident, now):
+        bucket = int(now // self.window)
+        return f'{KEY_PREFIX}:{self.scope}:{ident}:{bucket}', f'{KEY_PREFIX}:{self.scope}:{ident}:{bucket - 1}'
+
+    def count(self, current, previous, now):
+        overlap = 1 - (now % self.window) / self.window
+        return current + previous * overlap
+
+    def wait(self, current, previous, now):
+        """
+        Seconds until the count drops back under the limit, if no more
+        attempts are let through
+        """
+        elapsed = now % self.window
+        if current >= self.limit or not previous:
+            # Only the next window's overlap with this one decays it
+            return self.window - elapsed + self.window * (1 - (self.limit - 1) / max(current, 1))
+        return max(0, self.window * (1 - (self.limit - 1 - current) / previous) - elapsed)
+
+
+def _incr(key, timeout):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+
+def hit(limits, now=None):
+    """
+    Count an attempt against every (SlidingWindow, ident) in `limits`, unless
+    that would put one of them over its limit. Returns None when counted, else
+    (the window that refused, seconds to wait).
+    """
+    now = time.time() if now is None else now
+    counted = []
+    for window, ident in limits:
+        current_key, previous_key = window.keys(ident, now)
+        current = _incr(current_key, window.window * 2)
+        counted.append(current_key)
+        previous = cache.get(previous_key, 0)
+        if window.count(current, previous, now) > window.limit:
+            # Give the attempt back: refused attempts don't lengthen the block
+            for key in counted:
+                cache.decr(key)
+            return window, window.wait(current - 1, previous, now)
+    return None
+
+
+def username_ident(username):
+    # Case-folded so that variants of one name share a count; hashed to keep keys short and safe
+    return hashlib.sha1(str(username).strip().casefold().encode()).hexdigest()
+
+
+def username_window():
+    return SlidingWindow('username', settings.LOGIN_THROTTLE_USERNAME_LIMIT, settings.LOGIN_THROTTLE_WINDOW)
+
+
+def ip_window():
+    return SlidingWindow('ip', settings.LOGIN_THROTTLE_IP_LIMIT, settings.LOGIN_THROTTLE_WINDOW)
+
+
+def reset(username):
+    """
+    Forget the attempts against `username`, after it logged in
+    """
+    window = username_window()
+    cache.delete_many(window.keys(username_ident(username), time.time()))
+
+
+class LoginThrottle(BaseThrottle):
+    """
+    For views that check a username and password from the request body
+    """
+    username_field = 'username'
+
+    def allow_request(self, request, view):
+        limits = [(ip_window(), self.get_ident(request))]
+        username = request.data.get(self.username_field)
+        if username:
+            limits.insert(0, (username_window(), username_ident(username)))
+        refused = hit(limits)
+        if refused is None:
+            return True
+        window, self.retry_after = refused
+        view_name, _ = metrics.endpoint_labels(request)
+        metrics.registry.increment('charity_login_attempts_throttled_total', view=view_name, limit=window.scope)
+        return False
+
+    def wait(self):
+        return math.ceil(self.retry_after)
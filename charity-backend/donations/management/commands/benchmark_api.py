@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from donations import benchmarks, seeding
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main API endpoints in-process and against a local gunicorn, on a seeded "
+        "throwaway database. Optionally saves the results as JSON and fails on regressions against a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaigns', type=int, default=500)
+        parser.add_argument('--donors', type=int, default=2000)
+        parser.add_argument('--donations', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario first')
+        parser.add_argument('--concurrency', type=int, default=4, help='Client threads for the gunicorn run')
+        parser.add_argument('--gunicorn-workers', type=int, default=2)
+        parser.add_argument('--skip-gunicorn', action='store_true', help='Only run the in-process benchmark')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before failing (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        scale = {key: options[key] for key in ('campaigns', 'donors', 'donations', 'comments')}
+        with benchmarks.throwaway_database():
+            self.stdout.write(f"Seeding {scale}")
+            donor_user, admin_user = seeding.seed(random_seed=42, **scale)
+            report = {'environment': benchmarks.environment(scale), 'results': {}}
+
+            self.stdout.write("In-process")
+            report['results']['in-process'] = benchmarks.run_in_process(
+                donor_user, admin_user, requests=options['requests'], warmup=options['warmup'],
+            )
+            self.print_results(report['results']['in-process'])
+
+            if not options['skip_gunicorn']:
+                self.stdout.write(f"gunicorn ({options['gunicorn_workers']} workers, {options['concurrency']} clients)")
+                server = benchmarks.GunicornServer(
+                    benchmarks.database_url(connection.settings_dict), workers=options['gunicorn_workers'],
+                )
+                with server:
+                    report['results']['gunicorn'] = benchmarks.run_http(
+                        server.port, donor_user, admin_user,
+                        requests=options['requests'], concurrency=options['concurrency'], warmup=options['warmup'],
+                    )
+                self.print_results(report['results']['gunicorn'])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = benchmarks.compare(report, baseline, options['tolerance'])
+            for message in regressions:
+                self.stdout.write(self.style.ERROR(message))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    def print_results(self, results):
+        self.stdout.write(f"  {'scenario':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}{'errors':>8}")
+        for name, result in results.items():
+            line = (
+                f"  {name:<20}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{result['throughput_rps']:>9.1f}{result.get('queries', '-'):>9}{result['errors']:>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
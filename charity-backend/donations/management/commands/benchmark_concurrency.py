@@ -0,0 +1,76 @@
+import contextlib
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from donations import benchmarks, seeding
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sync gunicorn workers with uvicorn (ASGI) workers at the same worker count: the async-capable "
+        "read endpoints at increasing client concurrency, then again with slow clients holding connections open."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaigns', type=int, default=200)
+        parser.add_argument('--donors', type=int, default=500)
+        parser.add_argument('--donations', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers for both servers')
+        parser.add_argument('--concurrency', default='1,8,32', help='Comma-separated client thread counts')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario and concurrency')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--slow-clients', type=int,
+            help='Connections trickling their request during an extra run at the highest concurrency (default: --workers, 0 to skip)',
+        )
+        parser.add_argument('--timeout', type=float, default=5, help='Seconds before a measured request counts as failed')
+        parser.add_argument('--servers', default='wsgi,asgi', help=f"Comma-separated, from {', '.join(benchmarks.SERVERS)}")
+        parser.add_argument('--output', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        slow_clients = options['workers'] if options['slow_clients'] is None else options['slow_clients']
+        runs = [(level, 0) for level in levels]
+        if slow_clients:
+            runs.append((max(levels), slow_clients))
+
+        scale = {key: options[key] for key in ('campaigns', 'donors', 'donations', 'comments')}
+        report = {'workers': options['workers'], 'results': {}}
+        with benchmarks.throwaway_database():
+            self.stdout.write(f"Seeding {scale}")
+            donor_user, admin_user = seeding.seed(random_seed=42, **scale)
+            report['environment'] = benchmarks.environment(scale)
+
+            for server_name in options['servers'].split(','):
+                server = benchmarks.GunicornServer(
+                    benchmarks.database_url(connection.settings_dict), workers=options['workers'], server=server_name,
+                )
+                with server:
+                    for level, slow in runs:
+                        label = f"{server_name}, {level} clients" + (f", {slow} slow clients" if slow else '')
+                        self.stdout.write(label)
+                        slow_context = benchmarks.SlowClients(server.port, slow) if slow else contextlib.nullcontext()
+                        with slow_context:
+                            results = benchmarks.run_http(
+                                server.port, donor_user, admin_user, requests=options['requests'], concurrency=level,
+                                warmup=options['warmup'], scenarios=benchmarks.ASYNC_SCENARIOS, timeout=options['timeout'],
+                            )
+                        report['results'][label] = results
+                        self.print_results(results)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def print_results(self, results):
+        self.stdout.write(f"  {'scenario':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'errors':>8}")
+        for name, result in results.items():
+            line = (
+                f"  {name:<20}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{result['throughput_rps']:>9.1f}{result['errors']:>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
@@ -0,0 +1,133 @@
+import asyncio
+import contextlib
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from donations import benchmarks, seeding
+from donations.models import Campaign
+
+
+class Command(BaseCommand):
+    help = (
+        "Hold idle campaign progress streams (server-sent events) open against uvicorn workers, measure the "
+        "workers' memory per stream, then post donations and time how long each takes to reach every stream "
+        "watching its campaign. With more than one worker the streams are fed through the live update broker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaigns', type=int, default=50)
+        parser.add_argument('--donors', type=int, default=200)
+        parser.add_argument('--donations', type=int, default=2000)
+        parser.add_argument('--connections', type=int, default=2000, help='Idle streams to hold open')
+        parser.add_argument('--watched', type=int, default=10, help='Campaigns the streams are spread over')
+        parser.add_argument('--workers', type=int, default=1, help='uvicorn workers')
+        parser.add_argument('--rounds', type=int, default=20, help='Donations posted while the streams are open')
+        parser.add_argument('--update-interval', type=float, default=1.0, help='LIVE_UPDATE_INTERVAL for the server')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        self.raise_file_limit(options['connections'])
+        scale = {key: options[key] for key in ('campaigns', 'donors', 'donations')}
+        report = {'workers': options['workers'], 'connections': options['connections']}
+        with benchmarks.throwaway_database():
+            self.stdout.write(f"Seeding {scale}")
+            donor_user, _ = seeding.seed(random_seed=42, comments=0, **scale)
+            report['environment'] = benchmarks.environment(scale)
+            campaign_ids = list(
+                Campaign.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True)[:options['watched']]
+            )
+            token = str(RefreshToken.for_user(donor_user).access_token)
+
+            env = {'LIVE_UPDATE_INTERVAL': str(options['update_interval'])}
+            broker = benchmarks.LiveBroker() if options['workers'] > 1 else contextlib.nullcontext()
+            with broker:
+                if options['workers'] > 1:
+                    env['LIVE_BROKER_ADDRESS'] = broker.address
+                server = benchmarks.GunicornServer(
+                    benchmarks.database_url(connection.settings_dict), workers=options['workers'], server='asgi', env=env,
+                )
+                with server:
+                    report['results'] = asyncio.run(self.measure(server, campaign_ids, token, options))
+        self.print_results(report['results'])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def raise_file_limit(self, connections):
+        # Every stream is a socket here and one in the server, which inherits the limit
+        try:
+            import resource
+        except ImportError:
+            return
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = connections * 2 + 1024
+        if soft < wanted:
+            if hard != resource.RLIM_INFINITY and hard < wanted:
+                raise CommandError(f"--connections {connections} needs {wanted} open files, the limit is {hard}")
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    async def measure(self, server, campaign_ids, token, options):
+        rss_before = server.worker_rss()
+        streams = benchmarks.LiveStreams(server.port, campaign_ids, options['connections'])
+        try:
+            self.stdout.write(f"Opening {options['connections']} streams")
+            connect_seconds = await streams.open()
+            # Let the workers settle before reading their memory
+            await asyncio.sleep(1)
+            rss_after = server.worker_rss()
+
+            self.stdout.write(f"Posting {options['rounds']} donations")
+            latencies, missed, failed = [], 0, 0
+            for round_number in range(options['rounds']):
+                campaign_id = campaign_ids[round_number % len(campaign_ids)]
+                sent = time.perf_counter()
+                status = await asyncio.to_thread(benchmarks.post_donation, server.port, token, campaign_id)
+                if status != 201:
+                    failed += 1
+                    continue
+                arrived = await streams.delivery(campaign_id, sent, timeout=options['update_interval'] * 2 + 5)
+                latencies += arrived
+                missed += streams.watchers[campaign_id] - len(arrived)
+                # Past the interval, so the next donation is not coalesced with this one
+                await asyncio.sleep(options['update_interval'])
+        finally:
+            streams.close()
+
+        results = {
+            'streams': streams.streaming,
+            'stream_errors': streams.errors,
+            'connect_seconds': round(connect_seconds, 3),
+            'worker_rss_kib_before': rss_before,
+            'worker_rss_kib_after': rss_after,
+            'kib_per_stream': None,
+            'donations_failed': failed,
+            'deliveries': len(latencies),
+            'deliveries_missed': missed,
+        }
+        if rss_before and rss_after and streams.streaming:
+            grown = sum(rss_after.values()) - sum(rss_before.values())
+            results['kib_per_stream'] = round(grown / streams.streaming, 2)
+        if latencies:
+            delivery = benchmarks.summarize(latencies, 0, [])
+            results.update({key: delivery[key] for key in ('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms')})
+            results['max_ms'] = round(max(latencies) * 1000, 3)
+        return results
+
+    def print_results(self, results):
+        self.stdout.write(f"  streams open          {results['streams']} ({results['stream_errors']} failed)")
+        self.stdout.write(f"  connect time          {results['connect_seconds']}s")
+        self.stdout.write(f"  worker memory/stream  {results['kib_per_stream']} KiB")
+        self.stdout.write(f"  deliveries            {results['deliveries']} ({results['deliveries_missed']} missed)")
+        if results['deliveries']:
+            self.stdout.write(
+                f"  donation to event     p50 {results['p50_ms']:.1f}ms, p95 {results['p95_ms']:.1f}ms, "
+                f"max {results['max_ms']:.1f}ms"
+            )
+        if results['stream_errors'] or results['deliveries_missed'] or results['donations_failed']:
+            self.stdout.write(self.style.ERROR("  some streams or donations failed"))
@@ -0,0 +1,76 @@
+import random
+import statistics
+import time
+from functools import reduce
+from operator import and_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import setup_databases, teardown_databases
+
+from donations.models import Campaign
+from donations.search import search_available, search_campaigns
+from donations.seeding import WORDS
+
+QUERIES = ['water', 'clean water', 'school meals', 'vacc', 'emergency flood relief', 'zzzz']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare full-text campaign search with the icontains SearchFilter it replaced. "
+        "Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaigns', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=6)
+
+    def handle(self, *args, **options):
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            if not search_available(connection):
+                raise CommandError(f"No full-text index on this {connection.vendor} database")
+            self.seed(options['campaigns'])
+            self.stdout.write(f"{options['campaigns']} campaigns on {connection.vendor}, median of {options['repeat']} runs")
+            self.stdout.write(f"{'query':<24}{'icontains ms':>14}{'full-text ms':>14}{'matches':>10}")
+            for query in QUERIES:
+                terms = query.split()
+                old_ms, old_count = self.time(lambda: self.icontains(terms), options)
+                new_ms, new_count = self.time(lambda: search_campaigns(Campaign.objects.all(), terms), options)
+                self.stdout.write(f"{query:<24}{old_ms:>14.2f}{new_ms:>14.2f}{new_count:>10}")
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def seed(self, count):
+        rng = random.Random(42)
+        # A few topic words per campaign in a sea of filler, so queries are selective
+        filler = [''.join(rng.choices('abcdefghijklmnoprstuvwy', k=rng.randint(3, 9))) for _ in range(5000)]
+        batch = []
+        for i in range(count):
+            batch.append(Campaign(
+                title=' '.join(rng.sample(WORDS, 3)).title(),
+                description=' '.join(rng.sample(WORDS, 4) + rng.choices(filler, k=60)),
+            ))
+            if len(batch) == 5000:
+                Campaign.objects.bulk_create(batch)
+                batch = []
+        Campaign.objects.bulk_create(batch)
+
+    def icontains(self, terms):
+        # What DRF's SearchFilter builds for search_fields = ['title', 'description']
+        queryset = Campaign.objects.all()
+        conditions = [Q(title__icontains=term) | Q(description__icontains=term) for term in terms]
+        return queryset.filter(reduce(and_, conditions)).order_by('-created_at')
+
+    def time(self, build, options):
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            queryset = build()
+            # Same work as a paginated list request: a count and one page
+            count = queryset.count()
+            list(queryset[:options['page_size']])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), count
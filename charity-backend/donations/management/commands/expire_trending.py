@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from donations import trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Take donations that slid out of the 1h/24h/7d trending windows off the campaigns' trend totals. "
+        "Run one instance, with --loop, next to the web workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep expiring instead of exiting after one pass')
+        parser.add_argument('--interval', type=float, help='Seconds between passes with --loop (default TRENDING_BUCKET_SECONDS / 5)')
+        parser.add_argument('--rebuild', action='store_true', help='Recompute the trends from the donations first')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            campaigns = trending.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt the trends of {campaigns} campaigns"))
+
+        interval = options['interval'] or settings.TRENDING_BUCKET_SECONDS / 5
+        while True:
+            try:
+                changed = trending.expire()
+            except Exception as e:
+                if not options['loop']:
+                    raise
+                self.stderr.write(f"Failed to expire trends: {e}")
+                changed = 0
+
+            if changed:
+                self.stdout.write(f"Expired old buckets from {changed} campaign windows")
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(interval)
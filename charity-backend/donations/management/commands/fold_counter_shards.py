@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from donations.counters import fold_counter_shards
+from donations.models import CampaignCounterShard
+
+
+class Command(BaseCommand):
+    help = "Fold sharded donation counters back into Campaign.amount_raised"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, help='Only fold shards for this campaign id')
+
+    def handle(self, *args, **options):
+        if options['campaign']:
+            campaign_ids = [options['campaign']]
+        else:
+            campaign_ids = CampaignCounterShard.objects.values_list('campaign_id', flat=True).distinct()
+
+        for campaign_id in list(campaign_ids):
+            folded = fold_counter_shards(campaign_id)
+            self.stdout.write(f"Campaign {campaign_id}: folded {folded}")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from donations.imports import IMPORT_FORMATS, DonationImportError, guess_format, import_donations
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a CSV or NDJSON file of offline donations (campaign_id, donor_id or "
+        "donor_email, amount, optional donated_at). Nothing is written unless every row is valid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', dest='file_format', choices=IMPORT_FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Donations per bulk insert')
+        parser.add_argument('--no-emails', action='store_true', help='Do not queue confirmation emails')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the file')
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                report = import_donations(
+                    stream,
+                    file_format=file_format,
+                    chunk_size=options['chunk_size'],
+                    send_emails=not options['no_emails'],
+                    dry_run=options['dry_run'],
+                )
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+        except DonationImportError as e:
+            for message in e.errors:
+                self.stderr.write(message)
+            raise CommandError(f"Import aborted, nothing was written: {e}")
+
+        verb = 'Validated' if report['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['donations']} donations (KES {report['amount']}) across {report['campaigns']} campaigns, "
+            f"{report['emails_queued']} emails queued"
+        ))
+        self.stdout.write(
+            f"validate {report['validate_seconds']}s, write {report['write_seconds']}s, "
+            f"total {report['total_seconds']}s, {report['rows_per_second']} rows/s"
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from donations.imports import guess_format
+from donations.onboarding import ONBOARDING_FORMATS, DonorOnboardingError, onboard_donors
+
+
+class Command(BaseCommand):
+    help = (
+        "Create donor accounts from a CSV or NDJSON file (username, email, name, optional password). "
+        "Usernames and emails that are taken are skipped; nothing is written unless every row is valid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to onboard')
+        parser.add_argument('--format', dest='file_format', choices=ONBOARDING_FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Accounts per bulk insert')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default DONOR_ONBOARDING_WORKERS, else one per CPU)')
+        parser.add_argument('--no-emails', action='store_true', help='Do not queue welcome emails')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate and deduplicate the file')
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                report = onboard_donors(
+                    stream,
+                    file_format=file_format,
+                    chunk_size=options['chunk_size'],
+                    send_emails=not options['no_emails'],
+                    dry_run=options['dry_run'],
+                    workers=options['workers'],
+                )
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+        except DonorOnboardingError as e:
+            for message in e.errors:
+                self.stderr.write(message)
+            raise CommandError(f"Onboarding aborted, nothing was written: {e}")
+
+        for message in report['skipped_rows']:
+            self.stderr.write(f"skipped {message}")
+        verb = 'Validated' if report['dry_run'] else 'Onboarded'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['donors']} donors, skipped {report['skipped']}, {report['emails_queued']} emails queued"
+        ))
+        self.stdout.write(
+            f"validate {report['validate_seconds']}s, hash {report['hash_seconds']}s, write {report['write_seconds']}s, "
+            f"total {report['total_seconds']}s, {report['rows_per_second']} rows/s"
+        )
@@ -0,0 +1,37 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from donations.images import process_pending
+
+
+class Command(BaseCommand):
+    help = "Resize pending campaign images into their thumbnail/card/hero variants in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Resizing processes (default CAMPAIGN_IMAGE_WORKERS)')
+        parser.add_argument('--batch-size', type=int, help='Images claimed per batch (default CAMPAIGN_IMAGE_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new images instead of exiting once none are pending')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        # One pool for the life of the command, so --loop does not pay for process start-up per batch
+        with ProcessPoolExecutor(max_workers=options['workers'] or settings.CAMPAIGN_IMAGE_WORKERS) as executor:
+            while True:
+                try:
+                    ready, failed = process_pending(executor, batch_size=options['batch_size'])
+                except Exception as e:
+                    if not options['loop']:
+                        raise
+                    self.stderr.write(f"Failed to process images: {e}")
+                    ready = failed = 0
+
+                if ready or failed:
+                    self.stdout.write(f"Processed {ready} images, {failed} failed")
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
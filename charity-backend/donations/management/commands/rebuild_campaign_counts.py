@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from donations.counters import COUNT_FIELDS, rebuild_campaign_counts
+
+
+class Command(BaseCommand):
+    help = "Recount every campaign's comments, donations and unique donors from the tables and report any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not overwrite the stored counts')
+
+    def handle(self, *args, **options):
+        drifted = rebuild_campaign_counts(check=options['check'])
+        for campaign_id, (stored, actual) in list(drifted.items())[:20]:
+            self.stdout.write(self.style.WARNING(
+                f"campaign {campaign_id}: stored {dict(zip(COUNT_FIELDS, stored))}, actual {dict(zip(COUNT_FIELDS, actual))}"
+            ))
+        self.stdout.write(f"{len(drifted)} campaigns have drifted")
+
+        if options['check']:
+            return
+        self.stdout.write(self.style.SUCCESS("Campaign counts rebuilt"))
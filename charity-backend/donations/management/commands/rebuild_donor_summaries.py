@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from donations import summaries
+from donations.models import DonorSummary
+
+
+class Command(BaseCommand):
+    help = "Recompute every donor's lifetime summary from the donations table and report any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not overwrite the stored summaries')
+
+    def handle(self, *args, **options):
+        stored = {row.pop('donor_id'): row for row in DonorSummary.objects.values('donor_id', *summaries.SUMMARY_FIELDS)}
+        computed = summaries.compute()
+        drifted = [donor_id for donor_id, totals in computed.items() if stored.get(donor_id) != totals]
+        # Summaries left behind for donors whose donations are all gone
+        drifted += [donor_id for donor_id, row in stored.items() if donor_id not in computed and row['donation_count']]
+
+        for donor_id in drifted[:20]:
+            self.stdout.write(self.style.WARNING(f"donor {donor_id}: stored {stored.get(donor_id)}, actual {computed.get(donor_id)}"))
+        self.stdout.write(f"{len(drifted)} of {len(stored)} summaries have drifted")
+
+        if options['check']:
+            return
+        summaries.refresh()
+        self.stdout.write(self.style.SUCCESS("Donor summaries rebuilt"))
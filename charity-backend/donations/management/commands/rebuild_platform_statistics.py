@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from donations import statistics
+from donations.models import PlatformStatistics
+
+
+class Command(BaseCommand):
+    help = "Recompute the admin dashboard statistics from scratch and report any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not overwrite the stored statistics')
+
+    def handle(self, *args, **options):
+        stored = PlatformStatistics.objects.filter(pk=statistics.STATISTICS_PK).values().first()
+        computed = statistics.compute()
+
+        drift = False
+        for field, value in computed.items():
+            current = stored[field] if stored else None
+            if current != value:
+                drift = True
+                self.stdout.write(self.style.WARNING(f"{field}: stored {current}, actual {value}"))
+            else:
+                self.stdout.write(f"{field}: {value}")
+
+        if options['check']:
+            if drift:
+                self.stdout.write(self.style.WARNING("Statistics have drifted, run without --check to rebuild"))
+            return
+
+        statistics.rebuild()
+        self.stdout.write(self.style.SUCCESS("Platform statistics rebuilt"))
@@ -0,0 +1,30 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from donations.live import serve_broker, split_address
+
+
+class Command(BaseCommand):
+    help = (
+        "Relay live campaign progress between the ASGI workers (LIVE_BROKER_ADDRESS), standing in for a "
+        "pub/sub broker such as Redis when running more than one worker"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bind', default=settings.LIVE_BROKER_ADDRESS or '127.0.0.1:8765',
+            help='host:port to listen on (default: LIVE_BROKER_ADDRESS)',
+        )
+
+    def handle(self, *args, **options):
+        host, port = split_address(options['bind'])
+
+        def ready(server):
+            self.stdout.write(f"Live update broker listening on {host}:{port}")
+
+        try:
+            asyncio.run(serve_broker(host, port, ready))
+        except KeyboardInterrupt:
+            pass
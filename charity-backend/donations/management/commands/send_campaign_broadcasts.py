@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from donations.broadcasts import claim_broadcast, send_broadcast
+
+
+class Command(BaseCommand):
+    help = "Send pending campaign broadcasts to past donors, resuming interrupted ones from their checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Donors emailed per batch/checkpoint')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new broadcasts')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            # Interrupted broadcasts come back once their lease runs out and resume from last_donor_id
+            while (broadcast := claim_broadcast()) is not None:
+                self.stdout.write(f"Broadcast {broadcast.pk} ({broadcast.campaign.title}) resuming after donor {broadcast.last_donor_id}")
+                try:
+                    sent = send_broadcast(broadcast, batch_size=options['batch_size'])
+                except Exception as e:
+                    if not options['loop']:
+                        raise
+                    # Left leased, so the next poll moves on to other broadcasts
+                    self.stderr.write(f"Broadcast {broadcast.pk} interrupted: {e}")
+                    continue
+                self.stdout.write(
+                    f"Broadcast {broadcast.pk}: sent {sent}, {broadcast.sent_count} in total, "
+                    f"{broadcast.failed_count} handed to the outbox"
+                )
+
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from donations.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox in batches over one SMTP connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Emails claimed per batch (default EMAIL_OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting once it is empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent, retried, dead = drain_outbox(batch_size=options['batch_size'])
+            except Exception as e:
+                if not options['loop']:
+                    raise
+                self.stderr.write(f"Failed to drain outbox: {e}")
+                sent = retried = dead = 0
+
+            if sent or retried or dead:
+                self.stdout.write(f"Sent {sent}, will retry {retried}, dead-lettered {dead}")
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
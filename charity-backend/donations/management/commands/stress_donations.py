@@ -0,0 +1,142 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from donations import summaries
+from donations.counters import add_to_comment_count, count_donation
+from donations.db import write_atomic
+from donations.models import Campaign, Comment, Donation, Donor
+
+
+def run(kind, campaign, donor, amount, deferred):
+    """
+    One operation of the given kind, returning (kind, error message or None)
+    """
+    atomic = transaction.atomic if deferred else write_atomic
+    try:
+        if kind == 'donation':
+            with atomic():
+                donation = Donation.objects.create(donor=donor, campaign=campaign, amount=amount)
+                summaries.record_donation(donation, count_donation(donation))
+        elif kind == 'comment':
+            with atomic():
+                Comment.objects.create(donor=donor, campaign=campaign, text='Stress test comment')
+                add_to_comment_count(campaign.pk, 1)
+        else:
+            # What the campaign page reads while others are writing
+            Campaign.objects.get(pk=campaign.pk)
+            list(Comment.objects.filter(campaign=campaign).order_by('-created_at', '-id')[:10])
+            Donation.objects.filter(campaign=campaign).count()
+        return kind, None
+    except Exception as e:
+        return kind, str(e)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire many parallel donations (and optionally comments and reads) at one campaign, check that "
+        "amount_raised and the donation and comment counts match the rows that were written and that no write "
+        "failed. "
+        "Writes real rows to the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign', type=int, help='Campaign id to donate to')
+        parser.add_argument('--donations', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--amount', type=Decimal, default=Decimal('1.00'))
+        parser.add_argument('--shards', type=int, help='Set counter_shards on the campaign before the run')
+        parser.add_argument('--comments', type=int, default=0, help='Comments to post alongside the donations')
+        parser.add_argument('--reads', type=int, default=0, help='Reads of the campaign page to run alongside the writes')
+        parser.add_argument(
+            '--deferred', action='store_true',
+            help='Use plain transaction.atomic() (BEGIN DEFERRED on SQLite) instead of write_atomic(), for comparison',
+        )
+        parser.add_argument('--processes', action='store_true', help='Run the workers as processes, like gunicorn workers, instead of threads')
+
+    def handle(self, *args, **options):
+        try:
+            campaign = Campaign.objects.get(pk=options['campaign'])
+        except Campaign.DoesNotExist:
+            raise CommandError(f"Campaign {options['campaign']} does not exist")
+
+        if options['shards'] is not None:
+            campaign.counter_shards = options['shards']
+            campaign.save(update_fields=['counter_shards'])
+
+        user, _ = User.objects.get_or_create(username='stress-test-donor')
+        donor, _ = Donor.objects.get_or_create(user=user, defaults={'name': 'Stress Test Donor'})
+        amount = options['amount']
+        before = self.totals(campaign.pk)
+        donations = Donation.objects.filter(donor=donor, campaign=campaign)
+        comments = Comment.objects.filter(donor=donor, campaign=campaign)
+        written_before, commented_before = donations.count(), comments.count()
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            self.stdout.write(f"SQLite, journal_mode={journal_mode}, {'BEGIN DEFERRED' if options['deferred'] else 'BEGIN IMMEDIATE'}")
+
+        # Interleave the kinds so they overlap for the whole run
+        tasks = (
+            ['donation'] * options['donations']
+            + ['comment'] * options['comments']
+            + ['read'] * options['reads']
+        )
+        random.Random(0).shuffle(tasks)
+        work = partial(run, campaign=campaign, donor=donor, amount=amount, deferred=options['deferred'])
+        if options['processes']:
+            # Forked workers must not share the parent's connection
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('fork'))
+        else:
+            pool = ThreadPoolExecutor(max_workers=options['workers'])
+        started = time.perf_counter()
+        with pool:
+            results = list(pool.map(work, tasks, chunksize=8 if options['processes'] else 1))
+        elapsed = time.perf_counter() - started
+
+        errors = [error for _, error in results if error is not None]
+        for kind in ('donation', 'comment', 'read'):
+            outcomes = [error for task_kind, error in results if task_kind == kind]
+            if outcomes:
+                failed = sum(1 for error in outcomes if error is not None)
+                self.stdout.write(f"{len(outcomes) - failed} {kind}s ok, {failed} failed")
+        self.stdout.write(f"{len(results)} operations in {elapsed:.2f}s ({len(results) / elapsed:.0f}/s)")
+        for error in sorted(set(errors)):
+            self.stdout.write(f"  {errors.count(error)} x {error}")
+
+        # Count the rows rather than the successes, a write can fail after its commit (in an on_commit hook)
+        written = donations.count() - written_before
+        commented = comments.count() - commented_before
+        after = self.totals(campaign.pk)
+        expected = {
+            'amount raised': before['amount raised'] + amount * written,
+            'donation count': before['donation count'] + written,
+            'comment count': before['comment count'] + commented,
+        }
+        for name, value in expected.items():
+            if after[name] != value:
+                raise CommandError(f"Lost updates: {name} is {after[name]}, expected {value}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Amount raised {before['amount raised']} -> {after['amount raised']} and the counts match the rows written"
+        ))
+        if errors:
+            raise CommandError(f"{len(errors)} of {len(results)} operations failed")
+
+    def totals(self, campaign_id):
+        campaign = Campaign.objects.get(pk=campaign_id)
+        return {
+            'amount raised': campaign.total_amount_raised,
+            'donation count': campaign.total_donation_count,
+            'comment count': campaign.comment_count,
+        }
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+
+from donations.routers import REPLICAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary into every SQLite replica in DATABASE_REPLICA_URLS, standing in for "
+        "replication when trying out read replicas locally"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep copying instead of exiting after one copy')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds between copies with --loop, i.e. the replication lag')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = [alias for alias in REPLICAS if connections[alias].vendor == 'sqlite']
+        if primary.vendor != 'sqlite' or not replicas:
+            raise CommandError("Needs a SQLite default database and at least one SQLite replica in DATABASE_REPLICA_URLS")
+
+        while True:
+            started = time.perf_counter()
+            primary.ensure_connection()
+            for alias in replicas:
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'], timeout=settings.SQLITE_BUSY_TIMEOUT)
+                try:
+                    # Online backup, a consistent snapshot even while the primary is being written
+                    primary.connection.backup(target)
+                finally:
+                    target.close()
+            self.stdout.write(f"Copied the primary to {', '.join(replicas)} in {(time.perf_counter() - started) * 1000:.0f}ms")
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
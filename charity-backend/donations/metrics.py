@@ -0,0 +1,406 @@
+"""
+Per-endpoint request metrics in Prometheus text format.
+
+MetricsMiddleware labels every request with its URL name and viewset action
+(`campaign-list` / `list`, `admin-dashboard` / `get`, ...) and records
+latency in a histogram, SQL query count and time, response size and status
+class. Recording is a handful of arithmetic operations on an in-process
+table under a lock, a few microseconds per request. Queries are counted by
+an execute wrapper installed once per database connection, which only does
+any work while a request is being measured. Other modules add to the plain
+counters in COUNTERS, such as logins refused by donations.login_throttle.
+
+With METRICS_DIR set, a background thread in each process also writes its
+table to METRICS_DIR/<pid>-<start time>.json every METRICS_FLUSH_INTERVAL
+seconds (and on exit), and render() sums every file in the directory, so one
+scrape of /api/admin/metrics/ covers all gunicorn workers. The start time
+keeps a process that reuses a dead worker's pid from overwriting its totals.
+Each scrape folds the files of processes that are gone (no such pid, or a
+newer file for the same pid) into METRICS_DIR/aggregate.json and deletes
+them, so the counters stay monotonic across worker restarts and the
+directory does not grow with every recycled worker.
+"""
+import atexit
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNRESOLVED = '<unresolved>'
+
+# Per (view, action) series, a flat list so recording is plain indexing:
+# request count, latency sum, query count, query seconds, response bytes,
+# then one counter per bucket (the last one is +Inf)
+COUNT, SECONDS, QUERIES, QUERY_SECONDS, BYTES, FIRST_BUCKET = range(6)
+SERIES_LENGTH = FIRST_BUCKET + len(BUCKETS) + 1
+
+# Counters other modules add to with registry.increment(), and their help text
+COUNTERS = {
+    'charity_login_attempts_throttled_total': 'Login attempts refused before checking the password, by the limit they hit.',
+}
+
+AGGREGATE_FILE = 'aggregate.json'
+# <pid>-<start time in ns>.json, or <pid>.json as written before start times
+PROCESS_FILE = re.compile(r'^(\d+)(?:-(\d+))?\.json$')
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.series = {}
+        self.statuses = {}
+        self.counters = {}
+        self._flusher_pid = None
+        self._file_pid = self._file_name = None
+
+    def record(self, view, action, status, seconds, queries, query_seconds, size):
+        bucket = FIRST_BUCKET + bisect_left(BUCKETS, seconds)
+        key = (view, action)
+        status_key = (view, action, status // 100)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * SERIES_LENGTH
+            series[COUNT] += 1
+            series[SECONDS] += seconds
+            series[QUERIES] += queries
+            series[QUERY_SECONDS] += query_seconds
+            series[BYTES] += size
+            series[bucket] += 1
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+
+    def increment(self, name, **labels):
+        """
+        Add one to a counter from COUNTERS
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+        self.start_flusher()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'series': [[view, action, values[:]] for (view, action), values in self.series.items()],
+                'statuses': [[view, action, f'{status}xx', count] for (view, action, status), count in self.statuses.items()],
+                'counters': [[name, dict(labels), count] for (name, labels), count in self.counters.items()],
+            }
+
+    def start_flusher(self):
+        """
+        Start this process's flushing thread, once per process (gunicorn
+        forks workers after the module is imported)
+        """
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+        if settings.METRICS_DIR:
+            threading.Thread(target=self._flush_forever, name='metrics-flusher', daemon=True).start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self, directory=None):
+        """
+        Write this process's table to the shared directory
+        """
+        directory = directory or settings.METRICS_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        pid = os.getpid()
+        if self._file_pid != pid:
+            self._file_pid, self._file_name = pid, f'{pid}-{time.time_ns()}.json'
+        _write(os.path.join(directory, self._file_name), self.snapshot())
+
+
+registry = MetricsRegistry()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        registry.flush()
+    except Exception:
+        pass
+
+
+class QueryTimer:
+    """
+    Queries run by the request being measured, and their time
+    """
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_current_timer = ContextVar('metrics_query_timer', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.seconds += time.perf_counter() - started
+        timer.count += 1
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # Installed for good when a connection opens; adding and removing it per
+    # request costs more than the rest of the middleware together
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+connection_created.connect(install_query_counter)
+
+
+def endpoint_labels(request):
+    """
+    (URL name, action) for a request. Viewset routes map the HTTP method to
+    their action; other views use the method itself.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED, request.method.lower()
+    method = request.method.lower()
+    actions = getattr(match.func, 'actions', None)
+    return match.url_name or match.view_name or UNRESOLVED, (actions or {}).get(method, method)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Connections opened before this module was imported missed the signal
+        for conn in connections.all(initialized_only=True):
+            if conn.connection is not None:
+                install_query_counter(None, conn)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = _current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        # The async ORM runs queries in threads with a copy of this context,
+        # which still holds the same timer
+        timer = QueryTimer()
+        token = _current_timer.set(timer)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    def record(self, request, response, elapsed, timer):
+        view, action = endpoint_labels(request)
+        size = 0 if response.streaming else len(response.content)
+        registry.record(view, action, response.status_code, elapsed, timer.count, timer.seconds, size)
+        registry.start_flusher()
+
+
+def _write(path, data):
+    # Write then rename, so a reader never sees half a file
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Totals:
+    """
+    Tables summed across files
+    """
+
+    def __init__(self):
+        self.series, self.statuses, self.counters = {}, {}, {}
+
+    def add(self, data):
+        for view, action, values in data['series']:
+            total = self.series.setdefault((view, action), [0] * SERIES_LENGTH)
+            for i, value in enumerate(values):
+                total[i] += value
+        for view, action, status, count in data['statuses']:
+            self.statuses[(view, action, status)] = self.statuses.get((view, action, status), 0) + count
+        # Files written before counters existed have none
+        for counter, labels, count in data.get('counters', ()):
+            key = (counter, tuple(sorted(labels.items())))
+            self.counters[key] = self.counters.get(key, 0) + count
+
+    def as_dict(self):
+        return {
+            'series': [[view, action, values] for (view, action), values in self.series.items()],
+            'statuses': [[view, action, status, count] for (view, action, status), count in self.statuses.items()],
+            'counters': [[counter, dict(labels), count] for (counter, labels), count in self.counters.items()],
+        }
+
+
+def fold_exited(directory):
+    """
+    Add the files of processes that are gone to the aggregate file and
+    delete them. Returns how many were folded.
+    """
+    newest = {}
+    for name in os.listdir(directory):
+        match = PROCESS_FILE.match(name)
+        if match:
+            pid, started = int(match[1]), int(match[2] or 0)
+            newest.setdefault(pid, []).append((started, name))
+    exited = []
+    for pid, files in newest.items():
+        files.sort()
+        # A newer file means the pid was reused, the older ones are from processes that are gone
+        exited += [name for _, name in (files if not _running(pid) else files[:-1])]
+    if not exited:
+        return 0
+
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        # One scrape at a time, so no file is folded twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        path = os.path.join(directory, AGGREGATE_FILE)
+        aggregate = _read(path) or {'series': [], 'statuses': [], 'counters': [], 'folded': []}
+        # Names folded by a scrape that stopped before deleting them, and not yet deleted
+        folded = {name for name in aggregate['folded'] if os.path.exists(os.path.join(directory, name))}
+        totals = Totals()
+        totals.add(aggregate)
+        for name in exited:
+            data = None if name in folded else _read(os.path.join(directory, name))
+            if data is not None:
+                totals.add(data)
+                folded.add(name)
+        _write(path, {**totals.as_dict(), 'folded': sorted(folded)})
+        for name in exited:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return len(exited)
+
+
+def collect():
+    """
+    Every process's tables summed, or just this one without METRICS_DIR
+    """
+    directory = settings.METRICS_DIR
+    if not directory:
+        return registry.snapshot()
+    registry.flush(directory)
+    fold_exited(directory)
+    totals = Totals()
+    for name in os.listdir(directory):
+        if name != AGGREGATE_FILE and not PROCESS_FILE.match(name):
+            continue
+        data = _read(os.path.join(directory, name))
+        if data is not None:
+            totals.add(data)
+    return totals.as_dict()
+
+
+def _labels(**labels):
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+def render(data=None):
+    """
+    Metrics in the Prometheus text exposition format (version 0.0.4)
+    """
+    data = data or collect()
+    series = sorted(data['series'])
+    lines = [
+        '# HELP charity_http_request_duration_seconds Time spent handling requests.',
+        '# TYPE charity_http_request_duration_seconds histogram',
+    ]
+    for view, action, values in series:
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float('inf'),), values[FIRST_BUCKET:]):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'charity_http_request_duration_seconds_bucket{_labels(view=view, action=action, le=le)} {cumulative}')
+        lines.append(f'charity_http_request_duration_seconds_sum{_labels(view=view, action=action)} {values[SECONDS]}')
+        lines.append(f'charity_http_request_duration_seconds_count{_labels(view=view, action=action)} {values[COUNT]}')
+
+    lines += [
+        '# HELP charity_http_requests_total Requests by status class.',
+        '# TYPE charity_http_requests_total counter',
+    ]
+    for view, action, status, count in sorted(data['statuses']):
+        lines.append(f'charity_http_requests_total{_labels(view=view, action=action, status=status)} {count}')
+
+    for name, index, help_text in (
+        ('charity_db_queries_total', QUERIES, 'SQL queries run while handling requests.'),
+        ('charity_db_query_seconds_total', QUERY_SECONDS, 'Time spent in SQL queries while handling requests.'),
+        ('charity_http_response_bytes_total', BYTES, 'Response body bytes, streaming responses excluded.'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for view, action, values in series:
+            lines.append(f'{name}{_labels(view=view, action=action)} {values[index]}')
+
+    counters = sorted((name, sorted(labels.items()), count) for name, labels, count in data.get('counters', ()))
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for counter, labels, count in counters:
+            if counter == name:
+                lines.append(f'{name}{_labels(**dict(labels))} {count}')
+    return '\n'.join(lines) + '\n'
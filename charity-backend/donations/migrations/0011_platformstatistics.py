@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0010_campaignbroadcast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_campaigns', models.IntegerField(default=0)),
+                ('active_campaigns', models.IntegerField(default=0)),
+                ('total_donations', models.BigIntegerField(default=0)),
+                ('total_amount_raised', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_donors', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'platform statistics',
+            },
+        ),
+    ]
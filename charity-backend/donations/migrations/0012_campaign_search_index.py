@@ -0,0 +1,83 @@
+from django.db import migrations
+
+# Literal copies of the DDL at the time of this migration, so later changes to
+# donations.search cannot change what it does
+SQLITE_SEARCH_SQL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS donations_campaign_fts USING fts5(
+        title, description, content='donations_campaign', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    # Title matches count ten times as much as description matches
+    "INSERT INTO donations_campaign_fts(donations_campaign_fts, rank) VALUES('rank', 'bm25(10.0, 1.0)')",
+    "INSERT INTO donations_campaign_fts(donations_campaign_fts) VALUES('rebuild')",
+]
+
+SQLITE_TRIGGER_SQL = [
+    """CREATE TRIGGER IF NOT EXISTS donations_campaign_fts_ai AFTER INSERT ON donations_campaign BEGIN
+        INSERT INTO donations_campaign_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS donations_campaign_fts_ad AFTER DELETE ON donations_campaign BEGIN
+        INSERT INTO donations_campaign_fts(donations_campaign_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS donations_campaign_fts_au AFTER UPDATE OF title, description ON donations_campaign BEGIN
+        INSERT INTO donations_campaign_fts(donations_campaign_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO donations_campaign_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+SQLITE_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS donations_campaign_fts_ai",
+    "DROP TRIGGER IF EXISTS donations_campaign_fts_ad",
+    "DROP TRIGGER IF EXISTS donations_campaign_fts_au",
+    "DROP TABLE IF EXISTS donations_campaign_fts",
+]
+
+POSTGRES_SEARCH_SQL = [
+    """ALTER TABLE donations_campaign ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS donations_campaign_search_idx ON donations_campaign USING GIN (search_vector)",
+]
+
+POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS donations_campaign_search_idx",
+    "ALTER TABLE donations_campaign DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run(schema_editor, statements):
+    with schema_editor.connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            exists = 'donations_campaign_fts' in schema_editor.connection.introspection.table_names(cursor)
+        run(schema_editor, ([] if exists else SQLITE_SEARCH_SQL) + SQLITE_TRIGGER_SQL)
+    elif vendor == 'postgresql':
+        run(schema_editor, POSTGRES_SEARCH_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        run(schema_editor, SQLITE_DROP_SQL)
+    elif vendor == 'postgresql':
+        run(schema_editor, POSTGRES_DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0011_platformstatistics'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0012_campaign_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['-created_at', '-id'], name='donations_c_created_9a0674_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['campaign', '-created_at', '-id'], name='donations_c_campaig_983e75_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['-donated_at', '-id'], name='donations_d_donated_86cb30_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['campaign', '-donated_at', '-id'], name='donations_d_campaig_c7c6e4_idx'),
+        ),
+    ]
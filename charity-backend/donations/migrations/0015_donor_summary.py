@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def backfill_summaries(apps, schema_editor):
+    Donation = apps.get_model('donations', 'Donation')
+    DonorSummary = apps.get_model('donations', 'DonorSummary')
+    rows = (
+        Donation.objects.values('donor_id')
+        .annotate(
+            total_amount=Sum('amount'),
+            donation_count=Count('id'),
+            campaign_count=Count('campaign', distinct=True),
+            first_donated_at=Min('donated_at'),
+            last_donated_at=Max('donated_at'),
+        )
+        .order_by()
+    )
+    DonorSummary.objects.bulk_create([DonorSummary(**row) for row in rows.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0014_campaign_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonorSummary',
+            fields=[
+                ('donor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='donations.donor')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('donation_count', models.IntegerField(default=0)),
+                ('campaign_count', models.IntegerField(default=0)),
+                ('first_donated_at', models.DateTimeField(blank=True, null=True)),
+                ('last_donated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'donor summaries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['donor', '-donated_at', '-id'], name='donations_d_donor_i_4f385c_idx'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:51
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# donations.trending's windows when this migration was written
+WINDOWS = {
+    '1h': timedelta(hours=1),
+    '24h': timedelta(days=1),
+    '7d': timedelta(days=7),
+}
+
+
+def backfill_trends(apps, schema_editor):
+    """
+    Fill the trends from the last week's donations, as
+    `manage.py expire_trending --rebuild` does, so an existing deployment
+    does not show an empty trending list until new donations arrive
+    """
+    Donation = apps.get_model('donations', 'Donation')
+    CampaignTrend = apps.get_model('donations', 'CampaignTrend')
+    CampaignTrendBucket = apps.get_model('donations', 'CampaignTrendBucket')
+    TrendingWindow = apps.get_model('donations', 'TrendingWindow')
+    seconds = settings.TRENDING_BUCKET_SECONDS
+
+    def bucket_start(when):
+        timestamp = int(when.timestamp())
+        return datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+
+    now = timezone.now()
+    cutoffs = {window: bucket_start(now) - length + timedelta(seconds=seconds) for window, length in WINDOWS.items()}
+    buckets = defaultdict(lambda: [0, Decimal('0')])
+    recent = Donation.objects.filter(donated_at__gte=cutoffs['7d'])
+    for campaign_id, donated_at, amount in recent.values_list('campaign_id', 'donated_at', 'amount').iterator():
+        bucket = buckets[(campaign_id, bucket_start(donated_at))]
+        bucket[0] += 1
+        bucket[1] += amount
+
+    trends = {}
+    for (campaign_id, start), (donations, amount) in buckets.items():
+        trend = trends.setdefault(campaign_id, CampaignTrend(campaign_id=campaign_id))
+        for window, cutoff in cutoffs.items():
+            if start >= cutoff:
+                setattr(trend, f'donations_{window}', getattr(trend, f'donations_{window}') + donations)
+                setattr(trend, f'amount_{window}', getattr(trend, f'amount_{window}') + amount)
+    CampaignTrendBucket.objects.bulk_create(
+        [CampaignTrendBucket(campaign_id=campaign_id, start=start, donations=donations, amount=amount)
+         for (campaign_id, start), (donations, amount) in buckets.items()],
+        batch_size=500,
+    )
+    CampaignTrend.objects.bulk_create(trends.values(), batch_size=500)
+    TrendingWindow.objects.bulk_create([TrendingWindow(name=window, expired_before=cutoff) for window, cutoff in cutoffs.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0016_campaign_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingWindow',
+            fields=[
+                ('name', models.CharField(max_length=8, primary_key=True, serialize=False)),
+                ('expired_before', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CampaignTrend',
+            fields=[
+                ('campaign', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='donations.campaign')),
+                ('donations_1h', models.IntegerField(default=0)),
+                ('amount_1h', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('donations_24h', models.IntegerField(default=0)),
+                ('amount_24h', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('donations_7d', models.IntegerField(default=0)),
+                ('amount_7d', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-donations_1h', '-amount_1h', '-campaign'], name='donations_c_donatio_c1ba3c_idx'), models.Index(fields=['-donations_24h', '-amount_24h', '-campaign'], name='donations_c_donatio_f31c65_idx'), models.Index(fields=['-donations_7d', '-amount_7d', '-campaign'], name='donations_c_donatio_083819_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CampaignTrendBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('donations', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trend_buckets', to='donations.campaign')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start'], name='donations_c_start_a23f51_idx')],
+                'unique_together': {('campaign', 'start')},
+            },
+        ),
+        migrations.RunPython(backfill_trends, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(model, field, distinct=False):
+    counts = (
+        model.objects.filter(campaign=OuterRef('pk')).order_by().values('campaign')
+        .annotate(count=Count(field, distinct=distinct)).values('count')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def backfill_counts(apps, schema_editor):
+    Campaign = apps.get_model('donations', 'Campaign')
+    Comment = apps.get_model('donations', 'Comment')
+    Donation = apps.get_model('donations', 'Donation')
+    Campaign.objects.update(
+        comment_count=_count(Comment, 'id'),
+        donation_count=_count(Donation, 'id'),
+        unique_donor_count=_count(Donation, 'donor', distinct=True),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0017_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='donation_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='unique_donor_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='campaigncountershard',
+            name='donations',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='campaigncountershard',
+            name='donors',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
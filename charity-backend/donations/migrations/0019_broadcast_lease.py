@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0018_campaign_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignbroadcast',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='campaignbroadcast',
+            name='leased_until',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
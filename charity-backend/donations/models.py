@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Sum
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -13,6 +14,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the comment feeds, see donations/pagination.py
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['campaign', '-created_at', '-id']),
+        ]
 
 class Donor(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -75,13 +81,262 @@ class Campaign(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_campaigns')
     is_active = models.BooleanField(default=True)
     featured = models.BooleanField(default=False)
+    image = models.ForeignKey('CampaignImage', on_delete=models.SET_NULL, null=True, blank=True, related_name='campaigns')
+    # Number of counter shards donations are spread across (0 = update amount_raised directly)
+    counter_shards = models.PositiveSmallIntegerField(default=0)
+    # Bumped on every edit, comment and unsharded donation, used for HTTP validators
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Kept by donations.counters with the writes (donations of sharded
+    # campaigns count in their shards, like the amount), so lists need no
+    # COUNT over comments and donations; `manage.py rebuild_campaign_counts`
+    # repairs them
+    comment_count = models.IntegerField(default=0)
+    donation_count = models.IntegerField(default=0)
+    unique_donor_count = models.IntegerField(default=0)
 
     def __str__(self):
         return self.title
 
+    def _shard_sum(self, annotation, field):
+        # From donations.counters.with_amount_raised() if annotated, else queried.
+        # Even with counter_shards at 0: lowering it leaves the shards' amounts
+        # in place until they are folded.
+        value = getattr(self, annotation, None)
+        if value is None:
+            if self.pk is None:
+                return 0
+            value = self.amount_shards.aggregate(total=Sum(field))['total']
+        return value or 0
+
+    @property
+    def total_amount_raised(self):
+        """
+        amount_raised plus whatever is still sitting in counter shards
+        """
+        return self.amount_raised + self._shard_sum('shard_total', 'amount')
+
+    @property
+    def total_donation_count(self):
+        return self.donation_count + self._shard_sum('shard_donations', 'donations')
+
+    @property
+    def total_unique_donor_count(self):
+        return self.unique_donor_count + self._shard_sum('shard_donors', 'donors')
+
+
+class CampaignCounterShard(models.Model):
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='amount_shards')
+    shard = models.PositiveSmallIntegerField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Changes to the campaign's donation_count and unique_donor_count
+    donations = models.IntegerField(default=0)
+    donors = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('campaign', 'shard')
+
+    def __str__(self):
+        return f"{self.campaign_id}#{self.shard}: {self.amount}"
+
+
+class CampaignImage(models.Model):
+    """
+    An uploaded campaign image, stored once per distinct content under its
+    SHA-256 and resized into variants off-request by donations.images
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    original = models.CharField(max_length=255)  # storage name of the uploaded file
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.status})"
+
 
 class Donation(models.Model):
     donor = models.ForeignKey(Donor, on_delete=models.CASCADE)
     campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     donated_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the admin donation feed, see donations/pagination.py
+            models.Index(fields=['-donated_at', '-id']),
+            models.Index(fields=['campaign', '-donated_at', '-id']),
+            # A donor's own history (my-donations)
+            models.Index(fields=['donor', '-donated_at', '-id']),
+        ]
+
+
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead Letter'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+
+class CampaignBroadcast(models.Model):
+    KIND_CHOICES = [
+        ('update', 'Campaign Update'),
+        ('goal_reached', 'Goal Reached'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('done', 'Done'),
+    ]
+
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='broadcasts')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='update')
+    subject = models.CharField(max_length=255)
+    message = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Checkpoint: donors are walked in id order, everyone up to here has been emailed
+    last_donor_id = models.BigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    # Emails that failed and were handed to the outbox to retry
+    failed_count = models.PositiveIntegerField(default=0)
+    # Claimed by a worker until then (donations.broadcasts.claim_broadcast)
+    leased_until = models.DateTimeField(default=timezone.now)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.campaign.title} ({self.status})"
+
+
+class PlatformStatistics(models.Model):
+    """
+    Single row (pk=1) of running totals for the admin dashboard, kept up to
+    date by donations.statistics
+    """
+    total_campaigns = models.IntegerField(default=0)
+    active_campaigns = models.IntegerField(default=0)
+    total_donations = models.BigIntegerField(default=0)
+    total_amount_raised = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_donors = models.IntegerField(default=0)
+    # Bumped on any campaign or donation write, validator for the public campaign list
+    catalog_version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'platform statistics'
+
+    def __str__(self):
+        return f"{self.total_campaigns} campaigns, {self.total_donations} donations, {self.total_amount_raised} raised"
+
+
+class DonorSummary(models.Model):
+    """
+    Lifetime giving of one donor, kept up to date by donations.summaries
+    """
+    donor = models.OneToOneField(Donor, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    donation_count = models.IntegerField(default=0)
+    campaign_count = models.IntegerField(default=0)
+    first_donated_at = models.DateTimeField(null=True, blank=True)
+    last_donated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'donor summaries'
+
+    def __str__(self):
+        return f"{self.donor}: {self.donation_count} donations, {self.total_amount} total"
+
+
+class CampaignTrend(models.Model):
+    """
+    Donations to one campaign over each trending window, kept up to date by
+    donations.trending
+    """
+    campaign = models.OneToOneField(Campaign, on_delete=models.CASCADE, primary_key=True, related_name='trend')
+    donations_1h = models.IntegerField(default=0)
+    amount_1h = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    donations_24h = models.IntegerField(default=0)
+    amount_24h = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    donations_7d = models.IntegerField(default=0)
+    amount_7d = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # The top k of a window is the first k entries of its index
+            models.Index(fields=['-donations_1h', '-amount_1h', '-campaign']),
+            models.Index(fields=['-donations_24h', '-amount_24h', '-campaign']),
+            models.Index(fields=['-donations_7d', '-amount_7d', '-campaign']),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign_id}: {self.donations_1h}/{self.donations_24h}/{self.donations_7d} donations"
+
+
+class CampaignTrendBucket(models.Model):
+    """
+    Donations to a campaign in one TRENDING_BUCKET_SECONDS slice, subtracted
+    from the CampaignTrend windows as they slide past it
+    """
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='trend_buckets')
+    start = models.DateTimeField()
+    donations = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('campaign', 'start')
+        indexes = [
+            models.Index(fields=['start']),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign_id} @ {self.start}: {self.donations} donations"
+
+
+class TrendingWindow(models.Model):
+    """
+    How far a trending window has been expired: buckets starting before
+    expired_before have been subtracted from it
+    """
+    name = models.CharField(max_length=8, primary_key=True)
+    expired_before = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: expired before {self.expired_before}"
@@ -0,0 +1,272 @@
+"""
+Bulk onboarding of donors from partner organisations.
+
+A file is CSV with a header row, or NDJSON, with the columns username,
+email, name and optionally password. Onboarding goes:
+
+- validate every row; a malformed row aborts the whole file, as with
+  donation imports
+- deduplicate: a username or email that already has an account, or appeared
+  earlier in the file, is skipped and reported. The database is asked with a
+  few set-based queries (one per 500 names or addresses), not two per row.
+- hash the passwords of the remaining rows in a pool, since hashing is slow
+  on purpose (PBKDF2, a third of a second per password); rows without one
+  get an unusable password, and the donor sets theirs through password
+  reset. The management command uses processes; the upload endpoint uses
+  threads, since forking a threaded web worker can copy held locks into the
+  children, and hashlib releases the GIL while it hashes.
+- write users, donors and welcome emails with bulk_create, chunk_size rows
+  at a time, in one transaction, and bump total_donors once, since
+  bulk_create skips the signals
+
+Hashing happens before the transaction is opened, so a large file does not
+hold the write lock while the pool works through it. The usernames and
+emails are therefore looked up again inside the transaction: auth_user.email
+has no unique constraint, so nothing else would stop an account created in
+the meantime from getting a twin. If any were taken, nothing is written and
+running the file again skips them.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError
+from django.db.models.functions import Lower
+
+from . import statistics
+from .db import write_atomic
+from .imports import IMPORT_FORMATS, LOOKUP_CHUNK_SIZE, MAX_REPORTED_ERRORS, _chunks, _clean, read_records
+from .models import Donor
+from .outbox import queue_emails
+from .utils import build_welcome_email
+
+ONBOARDING_FORMATS = IMPORT_FORMATS
+USERNAME_MAX_LENGTH = User._meta.get_field('username').max_length
+NAME_MAX_LENGTH = Donor._meta.get_field('name').max_length
+
+username_validator = UnicodeUsernameValidator()
+
+
+class DonorOnboardingError(Exception):
+    """
+    The file did not validate, or some of its accounts were created while it
+    was being onboarded; `errors` says which lines and why
+    """
+
+    def __init__(self, errors, count=None, message=None):
+        super().__init__(message or f"{count or len(errors)} invalid row(s)")
+        self.errors = errors
+
+
+class OnboardingRow:
+    __slots__ = ('line', 'username', 'email', 'name', 'password')
+
+    def __init__(self, line, username, email, name, password):
+        self.line = line
+        self.username = username
+        self.email = email
+        self.name = name
+        self.password = password
+
+
+def _row_error(record):
+    username = _clean(record.get('username'))
+    email = _clean(record.get('email'))
+    name = _clean(record.get('name'))
+    if not username:
+        return "username is required"
+    if len(username) > USERNAME_MAX_LENGTH:
+        return f"username is longer than {USERNAME_MAX_LENGTH} characters"
+    try:
+        username_validator(username)
+    except ValidationError:
+        return f"invalid username {username!r}"
+    try:
+        validate_email(email)
+    except ValidationError:
+        return f"invalid email {email!r}"
+    if not name:
+        return "name is required"
+    if len(name) > NAME_MAX_LENGTH:
+        return f"name is longer than {NAME_MAX_LENGTH} characters"
+    return None
+
+
+def find_taken(rows):
+    """
+    The usernames and (lowercased) emails of these rows that already have an
+    account, as two sets
+    """
+    taken_usernames = set()
+    for chunk in _chunks({row.username for row in rows}, LOOKUP_CHUNK_SIZE):
+        taken_usernames.update(User.objects.filter(username__in=chunk).values_list('username', flat=True))
+    # Emails compare case-insensitively, as the donation import matches them
+    taken_emails = set()
+    for chunk in _chunks({row.email.lower() for row in rows}, LOOKUP_CHUNK_SIZE):
+        taken_emails.update(
+            User.objects.annotate(lower_email=Lower('email')).filter(lower_email__in=chunk).values_list('lower_email', flat=True)
+        )
+    return taken_usernames, taken_emails
+
+
+def _taken_errors(rows):
+    taken_usernames, taken_emails = find_taken(rows)
+    errors = []
+    for row in rows:
+        if row.username in taken_usernames:
+            errors.append(f"line {row.line}: username {row.username} was taken while onboarding")
+        elif row.email.lower() in taken_emails:
+            errors.append(f"line {row.line}: email {row.email} was taken while onboarding")
+    return errors
+
+
+def validate(records):
+    """
+    Check every record and drop the ones whose username or email is taken.
+    Returns (rows, skipped, errors, error count); rows is only usable when
+    there are no errors, skipped lists the dropped lines and why.
+    """
+    rows = []
+    errors = []
+    error_count = 0
+    for line, record in records:
+        message = "not a JSON object" if record is None else _row_error(record)
+        if message:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"line {line}: {message}")
+            continue
+        rows.append(OnboardingRow(
+            line,
+            _clean(record.get('username')),
+            User.objects.normalize_email(_clean(record.get('email'))),
+            _clean(record.get('name')),
+            # Passwords are taken as given, spaces included
+            '' if record.get('password') is None else str(record['password']),
+        ))
+    if error_count > len(errors):
+        errors.append(f"... and {error_count - len(errors)} more")
+    if errors:
+        return [], [], errors, error_count
+
+    taken_usernames, taken_emails = find_taken(rows)
+    accepted = []
+    skipped = []
+    seen_usernames, seen_emails = set(), set()
+    for row in rows:
+        email = row.email.lower()
+        if row.username in taken_usernames:
+            skipped.append(f"line {row.line}: username {row.username} is taken")
+        elif email in taken_emails:
+            skipped.append(f"line {row.line}: email {row.email} is taken")
+        elif row.username in seen_usernames:
+            skipped.append(f"line {row.line}: username {row.username} appears earlier in the file")
+        elif email in seen_emails:
+            skipped.append(f"line {row.line}: email {row.email} appears earlier in the file")
+        else:
+            accepted.append(row)
+        seen_usernames.add(row.username)
+        seen_emails.add(email)
+    return accepted, skipped, [], 0
+
+
+def hash_passwords(passwords, workers=None, processes=True):
+    """
+    make_password() for every password, in a pool of `workers` processes, or
+    threads with processes=False (default DONOR_ONBOARDING_WORKERS, else one
+    per CPU). Blank passwords become unusable ones, which need no hashing.
+    """
+    hashed = [None if password else make_password(None) for password in passwords]
+    to_hash = [index for index, password in enumerate(passwords) if password]
+    workers = min(workers or settings.DONOR_ONBOARDING_WORKERS or os.cpu_count() or 1, len(to_hash))
+    if workers < 2:
+        for index in to_hash:
+            hashed[index] = make_password(passwords[index])
+        return hashed
+
+    # A few chunks per worker: fewer round trips, still evenly spread
+    chunksize = max(1, len(to_hash) // (workers * 4))
+    if processes:
+        # The initializer is for spawned workers; forked ones inherit the settings
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+    with pool as executor:
+        results = executor.map(make_password, [passwords[index] for index in to_hash], chunksize=chunksize)
+        for index, password in zip(to_hash, results):
+            hashed[index] = password
+    return hashed
+
+
+def onboard_donors(stream, file_format='csv', chunk_size=1000, send_emails=True, dry_run=False, workers=None,
+                   processes=True):
+    """
+    Validate a file of donors and create their accounts. Raises
+    DonorOnboardingError if any row is invalid, otherwise returns a report
+    dict with the counts, skipped rows and timings. `workers` and
+    `processes` are passed to hash_passwords().
+    """
+    if file_format not in ONBOARDING_FORMATS:
+        raise ValueError(f"Unknown onboarding format {file_format!r}")
+    started = time.perf_counter()
+    rows, skipped, errors, error_count = validate(read_records(stream, file_format))
+    if errors:
+        raise DonorOnboardingError(errors, error_count)
+    validated = time.perf_counter()
+
+    emails_queued = 0
+    if not dry_run and rows:
+        for row, password in zip(rows, hash_passwords([row.password for row in rows], workers, processes)):
+            row.password = password
+    hashed = time.perf_counter()
+
+    if not dry_run and rows:
+        try:
+            with write_atomic():
+                errors = _taken_errors(rows)
+                if errors:
+                    count = len(errors)
+                    if count > MAX_REPORTED_ERRORS:
+                        errors = errors[:MAX_REPORTED_ERRORS] + [f"... and {count - MAX_REPORTED_ERRORS} more"]
+                    raise DonorOnboardingError(
+                        errors, count, f"{count} account(s) were created while onboarding; run it again to skip them",
+                    )
+                for chunk in _chunks(rows, chunk_size):
+                    users = User.objects.bulk_create([
+                        User(username=row.username, email=row.email, first_name=row.name, password=row.password)
+                        for row in chunk
+                    ])
+                    donors = Donor.objects.bulk_create([Donor(user=user, name=row.name) for user, row in zip(users, chunk)])
+                    if send_emails:
+                        emails_queued += queue_emails(build_welcome_email(donor.user, donor.name) for donor in donors)
+                statistics.bump(total_donors=len(rows))
+        except IntegrityError:
+            # Only on databases whose write transactions do not exclude each
+            # other: a username was taken after the check above
+            raise DonorOnboardingError(
+                [], message="an account was created while onboarding; run it again to skip it",
+            )
+    finished = time.perf_counter()
+
+    skipped_rows = skipped[:MAX_REPORTED_ERRORS]
+    if len(skipped) > len(skipped_rows):
+        skipped_rows.append(f"... and {len(skipped) - len(skipped_rows)} more")
+    return {
+        'dry_run': dry_run,
+        'donors': len(rows),
+        'skipped': len(skipped),
+        'skipped_rows': skipped_rows,
+        'emails_queued': emails_queued,
+        'validate_seconds': round(validated - started, 3),
+        'hash_seconds': round(hashed - validated, 3),
+        'write_seconds': round(finished - hashed, 3),
+        'total_seconds': round(finished - started, 3),
+        'rows_per_second': round(len(rows) / (finished - started), 1) if rows and finished > started else None,
+    }
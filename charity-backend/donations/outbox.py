@@ -0,0 +1,160 @@
+"""
+Database-backed email outbox.
+
+Request code calls queue_email(), which only inserts an OutboundEmail row in
+the current transaction, so a response never waits on SMTP and an email is
+only sent if the request that produced it commits. The send_queued_emails
+management command drains the outbox in batches over a single connection,
+retrying failures with exponential backoff and dead-lettering messages that
+keep failing.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+def queue_email(subject, message, recipient_list, html_message=None, from_email=None):
+    """
+    Add an email to the outbox. Returns the OutboundEmail, or None if there
+    is nobody to send it to.
+    """
+    if not recipient_list:
+        return None
+    # Savepoint, so callers that swallow a failed insert keep their transaction usable
+    with transaction.atomic():
+        return OutboundEmail.objects.create(
+            subject=subject,
+            body=message,
+            html_body=html_message or '',
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            to=list(recipient_list),
+        )
+
+
+def queue_emails(emails, batch_size=500):
+    """
+    Add many emails to the outbox with bulk_create. `emails` is an iterable of
+    queue_email() keyword arguments; ones without recipients are skipped.
+    Returns how many were queued.
+    """
+    rows = [
+        OutboundEmail(
+            subject=email['subject'],
+            body=email['message'],
+            html_body=email.get('html_message') or '',
+            from_email=email.get('from_email') or settings.DEFAULT_FROM_EMAIL,
+            to=list(email['recipient_list']),
+        )
+        for email in emails
+        if email['recipient_list']
+    ]
+    OutboundEmail.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff with jitter, capped at EMAIL_OUTBOX_MAX_BACKOFF seconds
+    """
+    delay = min(settings.EMAIL_OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1), settings.EMAIL_OUTBOX_MAX_BACKOFF)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(batch_size):
+    """
+    Lease up to batch_size due emails so other workers skip them while they
+    are being sent. A worker that dies mid-batch leaves the rows pending and
+    they become due again once the lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+            )
+    return batch
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def send_batch(batch, connection):
+    """
+    Send a claimed batch over an already opened connection.
+    Returns (sent, retried, dead) counts.
+    """
+    sent, failed = [], []
+    for email in batch:
+        try:
+            build_message(email, connection).send()
+        except Exception as e:
+            email.attempts += 1
+            email.last_error = str(e)
+            if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                email.status = 'dead'
+            else:
+                email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+            failed.append(email)
+            # The connection may be broken, start the next message on a fresh one
+            try:
+                connection.close()
+                connection.open()
+            except Exception:
+                pass
+        else:
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.attempts += 1
+            sent.append(email)
+
+    OutboundEmail.objects.bulk_update(sent, ['status', 'sent_at', 'attempts'])
+    OutboundEmail.objects.bulk_update(failed, ['status', 'attempts', 'last_error', 'next_attempt_at'])
+    dead = sum(1 for email in failed if email.status == 'dead')
+    return len(sent), len(failed) - dead, dead
+
+
+def drain_outbox(batch_size=None, max_batches=None):
+    """
+    Send due emails until the outbox is empty (or max_batches is reached),
+    reusing one connection for every batch. Returns (sent, retried, dead).
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    totals = [0, 0, 0]
+    batches = 0
+    connection = None
+    try:
+        while max_batches is None or batches < max_batches:
+            batch = claim_batch(batch_size)
+            if not batch:
+                break
+            if connection is None:
+                connection = get_connection(fail_silently=False)
+                connection.open()
+            for i, count in enumerate(send_batch(batch, connection)):
+                totals[i] += count
+            batches += 1
+    finally:
+        if connection is not None:
+            connection.close()
+    return tuple(totals)
@@ -0,0 +1,192 @@
+"""
+Opt-in keyset (cursor) pagination for newest-first feeds.
+
+Views list `keyset_fields = ('created_at', 'id')` (timestamp, then unique id)
+and use OptionalKeysetPagination. Plain requests keep page-number pagination;
+`?pagination=cursor` (or following a `next`/`previous` link carrying
+`?cursor=`) switches to seeking past the last (ts, id) seen over a matching
+composite index, so every page costs the same and rows inserted while
+someone scrolls do not shift page boundaries.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    @classmethod
+    def requested(cls, request):
+        return cls.cursor_query_param in request.query_params or request.query_params.get(cls.mode_query_param) == 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset() for async views, fetching with the async ORM
+        """
+        return self.set_page([row async for row in self.page_queryset(queryset, request, view)])
+
+    def page_queryset(self, queryset, request, view):
+        """
+        The (lazy) queryset for the requested page, plus one row to tell
+        whether there is a next page
+        """
+        self.request = request
+        self.time_field, self.id_field = view.keyset_fields
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        self.has_cursor = cursor is not None
+        self.reverse = bool(cursor and cursor[2])
+
+        time_field, id_field = self.time_field, self.id_field
+        if cursor is None:
+            queryset = queryset.order_by(f'-{time_field}', f'-{id_field}')
+        elif self.reverse:
+            # Walking back towards newer rows, fetched oldest first and flipped in set_page()
+            timestamp, pk, _ = cursor
+            queryset = queryset.filter(
+                Q(**{f'{time_field}__gte': timestamp}),
+                Q(**{f'{time_field}__gt': timestamp}) | Q(**{f'{id_field}__gt': pk}),
+            ).order_by(time_field, id_field)
+        else:
+            timestamp, pk, _ = cursor
+            # The redundant ts <= cursor bound lets the database seek into the index
+            queryset = queryset.filter(
+                Q(**{f'{time_field}__lte': timestamp}),
+                Q(**{f'{time_field}__lt': timestamp}) | Q(**{f'{id_field}__lt': pk}),
+            ).order_by(f'-{time_field}', f'-{id_field}')
+
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+        self.page = rows
+        return rows
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            timestamp, pk, reverse = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(timestamp), int(pk), reverse == '1'
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        timestamp = getattr(row, self.time_field).isoformat()
+        position = f"{timestamp}|{getattr(row, self.id_field)}|{int(reverse)}"
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        url = replace_query_param(url, self.mode_query_param, 'cursor')
+        return replace_query_param(url, self.cursor_query_param, urlsafe_b64encode(position.encode('ascii')).decode('ascii'))
+
+    def get_next_link(self):
+        if not self.page:
+            return None
+        if self.has_more or self.reverse:
+            return self.encode_cursor(self.page[-1], reverse=False)
+        return None
+
+    def get_previous_link(self):
+        if not self.page:
+            return None
+        if (self.reverse and self.has_more) or (not self.reverse and self.has_cursor):
+            return self.encode_cursor(self.page[0], reverse=True)
+        return None
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    PageNumberPagination with an async paginate_queryset for async views
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Counted up front, so the paginator never queries on its own
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        self.page.object_list = [row async for row in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+
+class OptionalKeysetPagination(AsyncPageNumberPagination):
+    """
+    Page-number pagination unless the client asks for keyset pagination
+    """
+    keyset = None
+    page_size_query_param = KeysetPagination.page_size_query_param
+    max_page_size = KeysetPagination.max_page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.requested(request):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.requested(request):
+            self.keyset = KeysetPagination()
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+        self.keyset = None
+        return await super().apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
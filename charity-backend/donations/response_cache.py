@@ -0,0 +1,85 @@
+"""
+Server-side cache of serialized campaign list pages.
+
+Entries are keyed by the catalog generation (PlatformStatistics.catalog_version,
+bumped after every campaign or donation write) and the normalized query
+parameters, so a write makes every older entry unreachable instead of having
+to find and delete them; CAMPAIGN_LIST_CACHE_TIMEOUT only bounds how long the
+orphans linger. Because the generation lives in the database, this is
+correct with per-process caches (locmem) as well as shared ones (file-based,
+memcached, redis).
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = 'campaigns:list'
+
+
+class CacheCounters:
+    """
+    Hit/miss counters for this process
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+counters = CacheCounters()
+
+
+def normalized_params(request):
+    return sorted((key, sorted(values)) for key, values in request.query_params.lists())
+
+
+def cache_key(generation, params):
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{generation}:{digest}'
+
+
+def get_page(generation, params):
+    data = caches[settings.CAMPAIGN_LIST_CACHE].get(cache_key(generation, params))
+    if data is None:
+        counters.miss()
+    else:
+        counters.hit()
+    return data
+
+
+def set_page(generation, params, data):
+    caches[settings.CAMPAIGN_LIST_CACHE].set(cache_key(generation, params), data, settings.CAMPAIGN_LIST_CACHE_TIMEOUT)
+
+
+async def aget_page(generation, params):
+    data = await caches[settings.CAMPAIGN_LIST_CACHE].aget(cache_key(generation, params))
+    if data is None:
+        counters.miss()
+    else:
+        counters.hit()
+    return data
+
+
+async def aset_page(generation, params, data):
+    await caches[settings.CAMPAIGN_LIST_CACHE].aset(
+        cache_key(generation, params), data, settings.CAMPAIGN_LIST_CACHE_TIMEOUT,
+    )
@@ -0,0 +1,103 @@
+"""
+Admin role resolution shared by the admin permission classes and views.
+
+A role is looked up at most once per request. Lookups are also kept in a
+small per-process LRU cache with a TTL, and entries are dropped when an Admin
+row is saved or deleted (donations.signals). Other worker processes only see
+such a change once their entry expires, so ADMIN_ROLE_CACHE_TTL bounds how
+long a revoked role can linger.
+
+Access tokens issued by AdminLoginView also carry the role as claims, for
+clients. They are not trusted here: a token outlives a demotion, so the role
+always comes from the cache, which loading the token's identity fills
+(donations.authentication), and still needs no query.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Admin
+
+ADMIN_ID_CLAIM = 'admin_id'
+ADMIN_ROLE_CLAIM = 'admin_role'
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU mapping whose entries expire after `ttl` seconds. get()
+    returns _MISSING for absent or expired keys, so None can be cached.
+    role_cache maps user id -> Admin (or None for non-admins), and
+    donations.authentication keeps identities in another.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+role_cache = TTLCache(settings.ADMIN_ROLE_CACHE_SIZE, settings.ADMIN_ROLE_CACHE_TTL)
+
+
+def add_role_claims(token, admin):
+    # Only on access tokens, a refresh token would copy them into new access
+    # tokens for a day
+    token[ADMIN_ID_CLAIM] = admin.id
+    token[ADMIN_ROLE_CLAIM] = admin.role
+
+
+def lookup_admin(user_id):
+    """
+    Active Admin for a user id, or None, through the process cache
+    """
+    admin = role_cache.get(user_id)
+    if admin is _MISSING:
+        admin = Admin.objects.filter(user_id=user_id, is_active=True).first()
+        role_cache.set(user_id, admin)
+    return admin
+
+
+def get_admin(request):
+    """
+    Active Admin for the request's user, or None. Resolved once per request.
+    """
+    admin = getattr(request, '_cached_admin', _MISSING)
+    if admin is _MISSING:
+        if not request.user or not request.user.is_authenticated:
+            admin = None
+        else:
+            admin = lookup_admin(request.user.id)
+        request._cached_admin = admin
+    return admin
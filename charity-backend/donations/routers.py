@@ -0,0 +1,120 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+ReplicaMiddleware marks safe (GET/HEAD/OPTIONS) requests as allowed to read
+from a replica, and ReplicaRouter then sends their reads to a random one of
+the replica_N aliases built from DATABASE_REPLICA_URLS. Writes, reads in
+any other request, reads inside a transaction on the primary and everything
+outside a request (workers, management commands) use the primary.
+
+Replicas lag behind the primary, so after a successful write the client is
+pinned to the primary for REPLICA_STICKY_SECONDS: a donor who just gave
+never sees amount_raised go backwards on the next page. Clients are told
+apart by their Authorization header, or their address when anonymous, and
+the pins live in the cache, which must be shared between workers (see
+CACHES) for them to hold across processes.
+
+Without replicas configured the middleware removes itself and the router
+always answers the primary.
+"""
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICAS = tuple(alias for alias in settings.DATABASES if alias.startswith('replica_'))
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_reads_from_replica = ContextVar('reads_from_replica', default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not REPLICAS or not _reads_from_replica.get():
+            return DEFAULT_DB_ALIAS
+        # A transaction on the primary must see its own writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        # Also for instances that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication
+        return db not in REPLICAS
+
+
+def pin_key(request):
+    client = request.headers.get('Authorization') or request.META.get('REMOTE_ADDR', '')
+    return 'replica-pin:' + hashlib.sha1(client.encode()).hexdigest()
+
+
+def is_pinned(request):
+    return cache.get(pin_key(request)) is not None
+
+
+async def ais_pinned(request):
+    return await cache.aget(pin_key(request)) is not None
+
+
+def pin_to_primary(request):
+    """
+    Send this client's reads to the primary for the next REPLICA_STICKY_SECONDS
+    """
+    cache.set(pin_key(request), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+async def apin_to_primary(request):
+    await cache.aset(pin_key(request), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if response.status_code < 400:
+                pin_to_primary(request)
+            return response
+
+        token = _reads_from_replica.set(not is_pinned(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _reads_from_replica.reset(token)
+
+    async def __acall__(self, request):
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            if response.status_code < 400:
+                await apin_to_primary(request)
+            return response
+
+        token = _reads_from_replica.set(not await ais_pinned(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _reads_from_replica.reset(token)
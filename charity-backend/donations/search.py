@@ -0,0 +1,140 @@
+"""
+Full-text search for campaigns.
+
+SQLite uses an external-content FTS5 table (donations_campaign_fts) kept in
+sync by triggers on donations_campaign. PostgreSQL uses a stored, generated
+tsvector column (donations_campaign.search_vector) with a GIN index. Both are
+created by migration 0012 and searched through CampaignSearchFilter, which
+keeps the existing `?search=` parameter and orders matches by relevance.
+Other databases fall back to DRF's icontains SearchFilter.
+"""
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from . import trending
+
+FTS_TABLE = 'donations_campaign_fts'
+
+# Migration 0012 creates these. They are re-created after Django remakes the
+# campaign table during a migration (which drops its triggers).
+SQLITE_TRIGGER_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON donations_campaign BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON donations_campaign BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON donations_campaign BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+_available = {}
+
+
+def restore_search_triggers(connection):
+    """
+    Re-create the SQLite sync triggers if the FTS table exists. Run after
+    migrations, since remaking donations_campaign drops its triggers.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if FTS_TABLE in connection.introspection.table_names(cursor):
+            for sql in SQLITE_TRIGGER_SQL:
+                cursor.execute(sql)
+
+
+def search_available(connection):
+    if connection.alias not in _available:
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                _available[connection.alias] = FTS_TABLE in connection.introspection.table_names(cursor)
+        else:
+            _available[connection.alias] = connection.vendor == 'postgresql'
+    return _available[connection.alias]
+
+
+async def asearch_available(alias):
+    # Only the first call per database needs a query, made in a thread with that thread's connection
+    if alias in _available:
+        return _available[alias]
+    return await sync_to_async(lambda: search_available(connections[alias]))()
+
+
+def fts5_query(terms):
+    """
+    Turn user input into a safe FTS5 query: every word must match, and the
+    last one may be a prefix (so results show up while typing)
+    """
+    words = [word for term in terms for word in re.findall(r'\w+', term)]
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_campaigns(queryset, terms):
+    """
+    Filter a Campaign queryset to full-text matches, annotated with
+    `search_rank` (lower is more relevant) and ordered by it
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        query = fts5_query(terms)
+        if query is None:
+            return queryset.none()
+        # A join (rather than pk__in) lets SQLite drive the query from the FTS index
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = donations_campaign.id', f'{FTS_TABLE} MATCH %s'],
+            params=[query],
+            select={'search_rank': f'{FTS_TABLE}.rank'},
+        ).order_by('search_rank', '-id')
+
+    query = ' '.join(terms)
+    tsquery = "websearch_to_tsquery('english', %s)"
+    return queryset.filter(
+        RawSQL(f'donations_campaign.search_vector @@ {tsquery}', [query], output_field=BooleanField())
+    ).annotate(
+        # Negated so that, as with FTS5, lower ranks are better
+        search_rank=RawSQL(f'-ts_rank(donations_campaign.search_vector, {tsquery})', [query], output_field=FloatField())
+    ).order_by('search_rank', '-id')
+
+
+class CampaignSearchFilter(filters.SearchFilter):
+    """
+    `?search=` backed by the full-text index, falling back to icontains
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not search_available(connections[queryset.db]):
+            return super().filter_queryset(request, queryset, view)
+        return search_campaigns(queryset, terms)
+
+
+class CampaignOrderingFilter(filters.OrderingFilter):
+    """
+    Leaves relevance ordering alone for searches without an explicit
+    ?ordering=, and adds ?ordering=trending: most donations in
+    ?trending_window= (1h, 24h or 7d, 24h by default) first
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(self.ordering_param) == 'trending':
+            window = trending.window_param(request, 'trending_window') or trending.DEFAULT_WINDOW
+            return trending.order_by_trending(queryset, window)
+        return super().filter_queryset(request, queryset, view)
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and request.query_params.get(filters.api_settings.SEARCH_PARAM):
+            return None
+        return super().get_ordering(request, queryset, view)
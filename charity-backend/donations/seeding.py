@@ -0,0 +1,82 @@
+"""
+Synthetic data for benchmarks and query budget checks.
+
+Everything is written with bulk_create, so model signals do not fire;
+amount_raised, the campaigns' counts, the platform statistics and the donor
+summaries are recomputed at the end.
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import counters, statistics, summaries, trending
+from .models import Admin, Campaign, Comment, Donation, Donor
+
+SEED_PASSWORD = 'seed-password'
+
+CATEGORIES = [choice for choice, _ in Campaign.CATEGORY_CHOICES]
+LOCATIONS = ['Nairobi', 'Mombasa', 'Kisumu', 'Turkana', 'Nakuru', 'Eldoret']
+WORDS = (
+    'water borehole school meals clinic medicine flood relief drought food shelter girls education '
+    'books uniforms vaccines maternal elderly care orphans solar wells sanitation farming seeds '
+    'livestock fire rebuild emergency nutrition children teachers nurses ambulance community clean'
+).split()
+
+
+def seed(campaigns=50, donors=200, donations=2000, comments=500, random_seed=42, batch_size=5000):
+    """
+    Create a donor user, an admin user and the given number of campaigns,
+    donors, donations and comments. Returns (donor_user, admin_user).
+    """
+    rng = random.Random(random_seed)
+    # Hash once, every seeded account shares the same password
+    password = make_password(SEED_PASSWORD)
+    prefix = f'seed{rng.randrange(10 ** 6)}'
+
+    admin_user = User.objects.create(username=f'{prefix}-admin', email=f'{prefix}-admin@example.com', password=password, is_staff=True)
+    Admin.objects.create(user=admin_user, role='super_admin')
+
+    users = User.objects.bulk_create(
+        [User(username=f'{prefix}-donor{i}', email=f'{prefix}-donor{i}@example.com', password=password) for i in range(max(donors, 1))],
+        batch_size=batch_size,
+    )
+    donor_rows = Donor.objects.bulk_create(
+        [Donor(user=user, name=f'Donor {i}') for i, user in enumerate(users)], batch_size=batch_size,
+    )
+
+    campaign_rows = Campaign.objects.bulk_create([
+        Campaign(
+            title=' '.join(rng.sample(WORDS, 3)).title(),
+            description=' '.join(rng.choices(WORDS, k=40)),
+            goal=Decimal(rng.randrange(10, 1000) * 1000),
+            category=rng.choice(CATEGORIES),
+            location=rng.choice(LOCATIONS),
+            created_by=admin_user,
+        )
+        for _ in range(max(campaigns, 1))
+    ], batch_size=batch_size)
+
+    for start in range(0, donations, batch_size):
+        Donation.objects.bulk_create([
+            Donation(donor=rng.choice(donor_rows), campaign=rng.choice(campaign_rows), amount=Decimal(rng.randrange(1, 500) * 10))
+            for _ in range(min(batch_size, donations - start))
+        ])
+    for start in range(0, comments, batch_size):
+        Comment.objects.bulk_create([
+            Comment(donor=rng.choice(donor_rows), campaign=rng.choice(campaign_rows), text=' '.join(rng.choices(WORDS, k=12)))
+            for _ in range(min(batch_size, comments - start))
+        ])
+
+    totals = Donation.objects.filter(campaign=OuterRef('pk')).values('campaign').annotate(total=Sum('amount')).values('total')
+    Campaign.objects.filter(created_by=admin_user).update(
+        amount_raised=Coalesce(Subquery(totals, output_field=DecimalField(max_digits=12, decimal_places=2)), Value(Decimal('0')))
+    )
+    counters.rebuild_campaign_counts()
+    statistics.rebuild()
+    summaries.refresh()
+    trending.rebuild()
+    return users[0], admin_user
@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Donor, Campaign, Donation, Comment, Admin
+
+from . import images
+from .models import Donor, Campaign, Donation, Comment, Admin, DonorSummary
 from django.contrib.auth.models import User
 
 class UserSerializer(serializers.ModelSerializer):
@@ -46,19 +49,99 @@ class AdminSerializer(serializers.ModelSerializer):
         admin = Admin.objects.create(user=user, **validated_data)
         return admin
 
-class CampaignSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField(required=False)
+class CampaignImageField(serializers.ImageField):
+    """
+    Accepts an image upload, and shows the campaign's image as the URL of one
+    of its resized variants (null until the variants have been generated)
+    """
+
+    def __init__(self, variant='thumbnail', **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if getattr(data, 'size', 0) > settings.CAMPAIGN_IMAGE_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f'Images must be smaller than {settings.CAMPAIGN_IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)} MB.'
+            )
+        return super().to_internal_value(data)
+
+    def to_representation(self, value):
+        url = images.variant_url(value, self.variant)
+        request = self.context.get('request')
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class CampaignImageMixin:
+    """
+    Swap an uploaded image for its stored CampaignImage before saving
+    """
+
+    def _store_image(self, validated_data):
+        upload = validated_data.pop('image', None)
+        if upload is not None:
+            validated_data['image'] = images.store_upload(upload)
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self._store_image(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, self._store_image(validated_data))
+
+
+class CampaignSerializer(CampaignImageMixin, serializers.ModelSerializer):
+    # Lists only need the small variant, CampaignDetailSerializer has the rest
+    image = CampaignImageField(required=False)
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
+    amount_raised = serializers.DecimalField(source='total_amount_raised', max_digits=12, decimal_places=2, read_only=True)
+    donation_count = serializers.IntegerField(source='total_donation_count', read_only=True)
+    unique_donor_count = serializers.IntegerField(source='total_unique_donor_count', read_only=True)
     
     class Meta:
         model = Campaign
         fields = ['id', 'title', 'description', 'goal', 'amount_raised', 
                  'category', 'location', 'image', 'created_at', 'created_by', 
-                 'created_by_username', 'is_active', 'featured']
-        read_only_fields = ['amount_raised', 'created_at', 'created_by']
+                 'created_by_username', 'is_active', 'featured',
+                 'comment_count', 'donation_count', 'unique_donor_count']
+        read_only_fields = ['amount_raised', 'created_at', 'created_by', 'comment_count']
+
+    def update(self, instance, validated_data):
+        validated_data = self._store_image(validated_data)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Only the edited columns, a full save would write the amount_raised
+        # and counts read with the instance over donations made since
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+class TrendingCampaignSerializer(CampaignSerializer):
+    # Annotated by donations.trending.top() for the requested window
+    donations_in_window = serializers.IntegerField(source='trend_donations', read_only=True)
+    amount_in_window = serializers.DecimalField(source='trend_amount', max_digits=14, decimal_places=2, read_only=True)
+
+    class Meta(CampaignSerializer.Meta):
+        fields = CampaignSerializer.Meta.fields + ['donations_in_window', 'amount_in_window']
+
+class CampaignDetailSerializer(CampaignSerializer):
+    images = serializers.SerializerMethodField()
+
+    class Meta(CampaignSerializer.Meta):
+        fields = CampaignSerializer.Meta.fields + ['images']
 
-class CampaignCreateSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField(required=False)
+    def get_images(self, obj):
+        request = self.context.get('request')
+        urls = {}
+        for variant in images.VARIANTS:
+            url = images.variant_url(obj.image, variant)
+            urls[variant] = request.build_absolute_uri(url) if url and request is not None else url
+        return urls
+
+
+class CampaignCreateSerializer(CampaignImageMixin, serializers.ModelSerializer):
+    image = CampaignImageField(required=False)
     
     class Meta:
         model = Campaign
@@ -71,6 +154,12 @@ class DonationSerializer(serializers.ModelSerializer):
         read_only_fields = ['donor']
 
 
+class DonorSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DonorSummary
+        fields = ['total_amount', 'donation_count', 'campaign_count', 'first_donated_at', 'last_donated_at']
+
+
 class CommentSerializer(serializers.ModelSerializer):
     donor_name = serializers.CharField(source='donor.name', read_only=True)
     campaign = serializers.PrimaryKeyRelatedField(queryset=Campaign.objects.all())
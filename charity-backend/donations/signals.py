@@ -0,0 +1,110 @@
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import live, statistics, summaries, trending
+from .authentication import identity_cache
+from .models import Admin, Campaign, Donation, Donor
+from .roles import role_cache
+from .search import restore_search_triggers
+
+
+@receiver(pre_save, sender=Campaign)
+def remember_campaign_totals(sender, instance, update_fields=None, **kwargs):
+    # Keep what is in the database now so post_save can work out the delta
+    instance._stats_previous = None
+    if instance.pk is None:
+        return
+    if update_fields is not None and not {'is_active', 'amount_raised'} & set(update_fields):
+        return
+    instance._stats_previous = Campaign.objects.filter(pk=instance.pk).values('is_active', 'amount_raised').first()
+
+
+@receiver(post_save, sender=Campaign)
+def campaign_saved(sender, instance, created, **kwargs):
+    if created:
+        statistics.bump(
+            total_campaigns=1,
+            active_campaigns=int(instance.is_active),
+            total_amount_raised=instance.amount_raised,
+            catalog_version=1,
+        )
+        return
+    # In the database, so concurrent donations cannot make two versions collide
+    Campaign.objects.filter(pk=instance.pk).update(version=F('version') + 1)
+    # Goal, status or amount edits move the progress bars
+    live.publish([instance.pk])
+    deltas = {'catalog_version': 1}
+    previous = getattr(instance, '_stats_previous', None)
+    if previous:
+        deltas['active_campaigns'] = int(instance.is_active) - int(previous['is_active'])
+        deltas['total_amount_raised'] = instance.amount_raised - previous['amount_raised']
+    statistics.bump(**deltas)
+
+
+@receiver(pre_delete, sender=Campaign)
+def campaign_deleted(sender, instance, **kwargs):
+    # pre_delete, because the counter shards are gone by post_delete
+    statistics.bump(
+        total_campaigns=-1,
+        active_campaigns=-int(instance.is_active),
+        total_amount_raised=-instance.total_amount_raised,
+        catalog_version=1,
+    )
+    # Its donations go with it, so everyone who gave needs their summary redone
+    summaries.schedule_refresh(
+        Donation.objects.filter(campaign=instance).values_list('donor_id', flat=True).distinct()
+    )
+
+
+@receiver(post_save, sender=Donation)
+def donation_saved(sender, instance, created, **kwargs):
+    # amount_raised is tracked by donations.counters, this only counts rows
+    if created:
+        statistics.bump(total_donations=1)
+        trending.record(instance.campaign_id, instance.donated_at, 1, instance.amount)
+        live.publish([instance.campaign_id])
+
+
+@receiver(post_delete, sender=Donation)
+def donation_deleted(sender, instance, origin=None, **kwargs):
+    statistics.bump(total_donations=-1)
+    # Cascades from a campaign are refreshed by campaign_deleted, and a
+    # deleted donor's summary goes with them
+    if isinstance(origin, Donation) or getattr(origin, 'model', None) is Donation:
+        summaries.schedule_refresh([instance.donor_id])
+        trending.record(instance.campaign_id, instance.donated_at, -1, -instance.amount)
+        live.publish([instance.campaign_id])
+
+
+@receiver(post_save, sender=Donor)
+def donor_saved(sender, instance, created, **kwargs):
+    identity_cache.invalidate(instance.user_id)
+    if created:
+        statistics.bump(total_donors=1)
+
+
+@receiver(post_delete, sender=Donor)
+def donor_deleted(sender, instance, **kwargs):
+    identity_cache.invalidate(instance.user_id)
+    statistics.bump(total_donors=-1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    identity_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Admin)
+@receiver(post_delete, sender=Admin)
+def admin_changed(sender, instance, **kwargs):
+    role_cache.invalidate(instance.user_id)
+
+
+@receiver(post_migrate)
+def campaign_table_migrated(sender, using, **kwargs):
+    if sender.name == 'donations':
+        restore_search_triggers(connections[using])
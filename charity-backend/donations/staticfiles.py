@@ -0,0 +1,37 @@
+"""
+WhiteNoise for both WSGI and ASGI.
+
+WhiteNoise's middleware is sync-only, so under ASGI Django would run every
+request through it in a thread and switch back to the event loop for the
+async views behind it. This one is async-capable: it looks the path up in
+WhiteNoise's in-memory index on the event loop and only uses a thread to
+open a file it actually serves (or for the filesystem lookups of
+autorefresh mode, i.e. DEBUG).
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,77 @@
+"""
+Incrementally maintained platform statistics for the admin dashboard.
+
+Signal handlers (donations.signals) and the donation counter call bump() with
+deltas, which are applied with a single F() update on the PlatformStatistics
+row once the surrounding transaction commits. Applying them after commit
+keeps the shared row out of every donation's transaction, at the cost of
+a small window where a crash could lose a delta;
+`manage.py rebuild_platform_statistics` recomputes everything from scratch.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import Campaign, CampaignCounterShard, Donation, Donor, PlatformStatistics
+
+STATISTICS_PK = 1
+
+
+def bump(**deltas):
+    """
+    Add deltas (e.g. total_donations=1) to the statistics row after commit
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def _apply(deltas):
+    updated = PlatformStatistics.objects.filter(pk=STATISTICS_PK).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        # No row yet, computing it from scratch already includes this change,
+        # except for catalog_version which is a plain counter
+        rebuild()
+        if 'catalog_version' in deltas:
+            PlatformStatistics.objects.filter(pk=STATISTICS_PK).update(catalog_version=F('catalog_version') + deltas['catalog_version'])
+
+
+def compute():
+    """
+    Statistics computed from the underlying tables
+    """
+    amount_raised = Campaign.objects.aggregate(total=Sum('amount_raised'))['total'] or Decimal('0')
+    amount_raised += CampaignCounterShard.objects.aggregate(total=Sum('amount'))['total'] or Decimal('0')
+    return {
+        'total_campaigns': Campaign.objects.count(),
+        'active_campaigns': Campaign.objects.filter(is_active=True).count(),
+        'total_donations': Donation.objects.count(),
+        'total_amount_raised': amount_raised,
+        'total_donors': Donor.objects.count(),
+    }
+
+
+def rebuild():
+    stats, _ = PlatformStatistics.objects.update_or_create(pk=STATISTICS_PK, defaults=compute())
+    return stats
+
+
+def get_catalog_version():
+    """
+    Current catalog_version, or None if the statistics row does not exist yet
+    """
+    return PlatformStatistics.objects.filter(pk=STATISTICS_PK).values_list('catalog_version', flat=True).first()
+
+
+async def aget_catalog_version():
+    return await PlatformStatistics.objects.filter(pk=STATISTICS_PK).values_list('catalog_version', flat=True).afirst()
+
+
+def get_statistics():
+    try:
+        return PlatformStatistics.objects.get(pk=STATISTICS_PK)
+    except PlatformStatistics.DoesNotExist:
+        return rebuild()
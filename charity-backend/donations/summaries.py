@@ -0,0 +1,112 @@
+"""
+Per-donor lifetime summaries (DonorSummary) for my-donations.
+
+The donation view calls record_donation() inside the donation's own
+transaction, which folds the gift into the donor's row with one F() update.
+Whether the campaign is new to the donor comes from
+counters.count_donation(), which already answers it under the donor's lock,
+so two first gifts to a campaign at once cannot both count it. Edits and
+deletes are rare and cannot be undone incrementally (first/last gift), so
+they recompute the donor after commit. Bulk writes call refresh() for the
+donors they touched; like the campaign counters, donations created
+anywhere else are only picked up by `manage.py rebuild_donor_summaries`,
+which recomputes everyone.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateTimeField, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+
+from .models import Donation, Donor, DonorSummary
+
+SUMMARY_FIELDS = ['total_amount', 'donation_count', 'campaign_count', 'first_donated_at', 'last_donated_at']
+REFRESH_CHUNK_SIZE = 500
+
+
+def record_donation(donation, new_campaign):
+    """
+    Add a newly created donation to its donor's summary. new_campaign is
+    whether it is the donor's first donation to its campaign, as returned by
+    counters.count_donation().
+    """
+    if _add(donation, new_campaign):
+        return
+    try:
+        with transaction.atomic():
+            # First summary for this donor, counted from the table so older gifts are included
+            totals = compute([donation.donor_id]).get(donation.donor_id, {})
+            DonorSummary.objects.create(donor_id=donation.donor_id, **totals)
+    except IntegrityError:
+        # Someone else created it first, add to theirs
+        _add(donation, new_campaign)
+
+
+def _add(donation, new_campaign):
+    donated_at = Value(donation.donated_at, output_field=DateTimeField())
+    return DonorSummary.objects.filter(donor_id=donation.donor_id).update(
+        total_amount=F('total_amount') + donation.amount,
+        donation_count=F('donation_count') + 1,
+        campaign_count=F('campaign_count') + int(new_campaign),
+        first_donated_at=Least(Coalesce('first_donated_at', donated_at), donated_at),
+        last_donated_at=Greatest(Coalesce('last_donated_at', donated_at), donated_at),
+    )
+
+
+def compute(donor_ids=None):
+    """
+    Summary fields computed from the donations table, keyed by donor id, for
+    the given donors or everyone if None. Donors without donations are left out.
+    """
+    donations = Donation.objects.all() if donor_ids is None else Donation.objects.filter(donor_id__in=donor_ids)
+    rows = (
+        donations
+        .values('donor_id')
+        .annotate(
+            total_amount=Sum('amount'),
+            donation_count=Count('id'),
+            campaign_count=Count('campaign', distinct=True),
+            first_donated_at=Min('donated_at'),
+            last_donated_at=Max('donated_at'),
+        )
+        .order_by()
+    )
+    return {row.pop('donor_id'): row for row in rows}
+
+
+def refresh(donor_ids=None):
+    """
+    Recompute the summaries of the given donors (all donors if None) with
+    one grouped query and one upsert per chunk
+    """
+    if donor_ids is None:
+        donor_ids = Donor.objects.values_list('pk', flat=True)
+    donor_ids = sorted(set(donor_ids))
+    for start in range(0, len(donor_ids), REFRESH_CHUNK_SIZE):
+        # Skip donors deleted since the refresh was scheduled
+        existing = list(Donor.objects.filter(pk__in=donor_ids[start:start + REFRESH_CHUNK_SIZE]).values_list('pk', flat=True))
+        totals = compute(existing)
+        DonorSummary.objects.bulk_create(
+            [DonorSummary(donor_id=pk, **totals.get(pk, {})) for pk in existing],
+            update_conflicts=True,
+            unique_fields=['donor'],
+            update_fields=SUMMARY_FIELDS,
+        )
+
+
+def schedule_refresh(donor_ids):
+    """
+    refresh() the given donors once the surrounding transaction commits
+    """
+    donor_ids = list(donor_ids)
+    if donor_ids:
+        transaction.on_commit(lambda: refresh(donor_ids))
+
+
+def get_summary(donor):
+    """
+    The donor's summary, an unsaved all-zero one if they never gave.
+    Use Donor.objects.select_related('summary') to avoid the extra query.
+    """
+    try:
+        return donor.summary
+    except DonorSummary.DoesNotExist:
+        return DonorSummary(donor=donor)
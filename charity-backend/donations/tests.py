@@ -1,3 +1,1670 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from datetime import datetime, timedelta
+from decimal import Decimal
+from smtplib import SMTPRecipientsRefused
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin as django_admin
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, Sum
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import (
+    authentication, benchmarks, broadcasts, counters, images, imports, live, metrics, onboarding, outbox, response_cache,
+    roles, routers, search, seeding, statistics, trending,
+)
+from . import urls as api_urls
+from .serializers import CampaignSerializer
+from .admin import CampaignAdmin
+from .async_views import async_routes
+from .management.commands.stress_donations import run as run_stress_operation
+from .authentication import identity_cache
+from .models import (
+    Admin, Campaign, CampaignBroadcast, CampaignImage, CampaignTrend, Comment, Donation, Donor, DonorSummary,
+    OutboundEmail,
+)
+from .roles import ADMIN_ROLE_CLAIM, role_cache
+
+
+# (name, url, who is asking, queries). {page_size} and {campaign} are filled
+# in by QueryBudgetTests, which requests each endpoint at several page sizes
+# so an N+1 regression shows up as a count that only holds for small pages.
+ENDPOINT_BUDGETS = [
+    # catalog_version (for the ETag), count, page
+    ('campaigns list', '/api/campaigns/?page_size={page_size}', None, 3),
+    # +1 to look for the full-text index, which each process does once
+    ('campaigns search', '/api/campaigns/?search=water&page_size={page_size}', None, 4),
+    ('campaign detail', '/api/campaigns/{campaign}/', None, 1),
+    # catalog_version, the top k through the window's index
+    ('trending campaigns', '/api/campaigns/trending/?window=24h&limit={page_size}', None, 2),
+    ('campaigns by trending', '/api/campaigns/?ordering=trending&trending_window=1h&page_size={page_size}', None, 3),
+    ('campaigns by supporters', '/api/campaigns/?ordering=-unique_donor_count&page_size={page_size}', None, 3),
+    ('comments list', '/api/comments/?page_size={page_size}', None, 2),
+    # django-filter checks that the campaign exists
+    ('campaign comments', '/api/comments/?campaign={campaign}&page_size={page_size}', None, 3),
+    ('comments keyset', '/api/comments/?pagination=cursor&page_size={page_size}', None, 1),
+    ('donors list', '/api/donors/?page_size={page_size}', 'donor', 3),
+    ('donations list', '/api/donations/?page_size={page_size}', 'donor', 3),
+    # donor with summary, count, page
+    ('my donations', '/api/my-donations/?page_size={page_size}', 'donor', 4),
+    ('my donations keyset', '/api/my-donations/?pagination=cursor&page_size={page_size}', 'donor', 3),
+    # The user's identity, which brings their donor
+    ('my profile', '/api/my-profile/', 'donor', 1),
+    # Identity with the admin role, statistics row
+    ('admin dashboard', '/api/admin/dashboard/', 'admin', 2),
+    ('admin campaigns', '/api/admin/campaigns/?page_size={page_size}', 'admin', 3),
+    ('admin users', '/api/admin/users/?page_size={page_size}', 'admin', 3),
+    ('admin donations', '/api/admin/donations/?page_size={page_size}', 'admin', 3),
+    ('admin donations search', '/api/admin/donations/?search=Donor&page_size={page_size}', 'admin', 3),
+    ('admin comments', '/api/admin/comments/?page_size={page_size}', 'admin', 3),
+]
+
+
+# URLconf for the async read tests (ROOT_URLCONF='donations.tests'): the API
+# with its busiest reads on donations.async_views, as under ASGI
+api_patterns = api_urls.urlpatterns
+if not settings.ASYNC_READ_VIEWS:
+    api_patterns = async_routes(api_urls.router.urls) + async_routes(api_patterns[1:])
+urlpatterns = [path('api/', include(api_patterns))]
+
+
+def clear_caches():
+    # Process-wide, so one test's users and throttle counts do not leak into the next
+    identity_cache.clear()
+    role_cache.clear()
+    cache.clear()
+
+
+def make_donor(name, email=None):
+    user = User.objects.create_user(name, email if email is not None else f'{name}@example.com', 'password-123')
+    return Donor.objects.create(user=user, name=name.title())
+
+
+def make_campaign(title='Clean water', **fields):
+    return Campaign.objects.create(title=title, description=f'{title} for Turkana', **fields)
+
+
+def make_admin(name, role='super_admin'):
+    user = User.objects.create_user(name, f'{name}@example.com', 'password-123')
+    Admin.objects.create(user=user, role=role)
+    return user
+
+
+class QueryBudgetTests(TestCase):
+    page_sizes = (1, 9, 50)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor_user, cls.admin_user = seeding.seed(campaigns=60, donors=200, donations=3000, comments=750)
+        cls.campaign = Campaign.objects.values_list('pk', flat=True).first()
+
+    def test_endpoints_stay_within_their_query_budgets(self):
+        self.check_budgets()
+
+    @override_settings(ROOT_URLCONF='donations.tests')
+    def test_async_reads_stay_within_their_query_budgets(self):
+        self.check_budgets()
+
+    def check_budgets(self):
+        clients = {
+            None: benchmarks.api_client(None),
+            'donor': benchmarks.api_client(self.donor_user),
+            'admin': benchmarks.api_client(self.admin_user),
+        }
+        for name, url, who, budget in ENDPOINT_BUDGETS:
+            for page_size in self.page_sizes if '{page_size}' in url else (None,):
+                with self.subTest(name, page_size=page_size):
+                    # Cold caches, so a budget covers a user and a database this process has not seen
+                    clear_caches()
+                    search._available.clear()
+                    with self.assertNumQueries(budget):
+                        response = clients[who].get(url.format(page_size=page_size, campaign=self.campaign), secure=True)
+                    self.assertEqual(response.status_code, 200)
+
+
+class AdminRoleTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('moderator', 'moderator@example.com', 'password-123')
+        self.admin = Admin.objects.create(user=self.user, role='super_admin')
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(
+            '/api/admin/login/', {'username': 'moderator', 'password': 'password-123'}, format='json', secure=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def dashboard(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get('/api/admin/dashboard/', secure=True)
+
+    def test_role_claims_are_only_on_the_access_token(self):
+        tokens = self.login()
+        self.assertEqual(AccessToken(tokens['access'])[ADMIN_ROLE_CLAIM], 'super_admin')
+        refresh = RefreshToken(tokens['refresh'])
+        self.assertNotIn(ADMIN_ROLE_CLAIM, refresh)
+        self.assertNotIn(ADMIN_ROLE_CLAIM, refresh.access_token)
+
+    def test_deactivated_admin_loses_access_with_a_live_token(self):
+        access = self.login()['access']
+        self.assertEqual(self.dashboard(access).status_code, 200)
+        self.admin.is_active = False
+        self.admin.save()
+        self.assertEqual(self.dashboard(access).status_code, 403)
+
+    def test_deleted_admin_loses_access_with_a_live_token(self):
+        access = self.login()['access']
+        self.assertEqual(self.dashboard(access).status_code, 200)
+        self.admin.delete()
+        self.assertEqual(self.dashboard(access).status_code, 403)
+
+
+class CachedIdentityTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.donor = make_donor('amina')
+        self.user = self.donor.user
+        self.factory = RequestFactory()
+        self.authentication = authentication.CachedJWTAuthentication()
+        self.token = RefreshToken.for_user(self.user).access_token
+
+    def request(self):
+        return Request(self.factory.get('/api/my-profile/', HTTP_AUTHORIZATION=f'Bearer {self.token}'))
+
+    def authenticate(self):
+        request = self.request()
+        user, _ = self.authentication.authenticate(request)
+        request.user = user
+        return request
+
+    def test_seen_users_need_no_query(self):
+        with self.assertNumQueries(1):
+            request = self.authenticate()
+        with self.assertNumQueries(0):
+            request = self.authenticate()
+            donor = authentication.get_donor(request)
+            admin = roles.get_admin(request)
+        self.assertEqual((request.user.pk, request.user.username, request.user.email), (self.user.pk, 'amina', 'amina@example.com'))
+        self.assertEqual((donor.pk, donor.name, donor.user_id), (self.donor.pk, 'Amina', self.user.pk))
+        self.assertIsNone(admin)
+        # Secret fields are not cached, but still load when asked for
+        with self.assertNumQueries(1):
+            self.assertTrue(request.user.check_password('password-123'))
+
+    async def test_async_authentication_shares_the_cache(self):
+        await sync_to_async(self.authenticate)()
+        with mock.patch.object(authentication, 'load_identity', wraps=authentication.load_identity) as load_identity:
+            user, _ = await self.authentication.aauthenticate(await sync_to_async(self.request)())
+        load_identity.assert_not_called()
+        self.assertEqual((user.pk, user.username), (self.user.pk, 'amina'))
+
+    def test_saves_and_deletes_drop_the_entry(self):
+        self.authenticate()
+        self.donor.name = 'Amina W.'
+        self.donor.save()
+        self.assertEqual(authentication.get_donor(self.authenticate()).name, 'Amina W.')
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        self.user.is_active = True
+        self.user.save()
+        self.donor.delete()
+        self.assertIsNone(authentication.get_donor(self.authenticate()))
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_changes_from_other_processes_show_once_the_entry_expires(self):
+        self.authenticate()
+        # No signal reaches this process for another worker's write
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.authenticate()
+        with mock.patch.object(roles.time, 'monotonic', return_value=time.monotonic() + settings.IDENTITY_CACHE_TTL + 1):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate()
+
+    def test_cache_is_bounded(self):
+        bounded = roles.TTLCache(2, 60)
+        for user_id in (1, 2, 1, 3):
+            bounded.set(user_id, user_id)
+        # 2 was the least recently used
+        self.assertIs(bounded.get(2), roles._MISSING)
+        self.assertEqual((bounded.get(1), bounded.get(3)), (1, 3))
+
+
+@override_settings(LOGIN_THROTTLE_IP_LIMIT=3, LOGIN_THROTTLE_USERNAME_LIMIT=100)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+
+    def attempt(self, number, **headers):
+        return self.client.post(
+            '/api/token/', {'username': f'victim{number}', 'password': 'guess'}, format='json', secure=True, **headers,
+        )
+
+    def test_rotated_forwarded_for_is_still_throttled(self):
+        statuses = [self.attempt(n, HTTP_X_FORWARDED_FOR=f'203.0.113.{n}').status_code for n in range(5)]
+        self.assertEqual(statuses, [401, 401, 401, 429, 429])
+
+    def test_behind_a_proxy_only_its_hop_counts(self):
+        rest_framework = {**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}
+        with self.settings(REST_FRAMEWORK=rest_framework):
+            # The client prepends whatever it likes, the proxy appends the address it saw
+            statuses = [
+                self.attempt(n, HTTP_X_FORWARDED_FOR=f'203.0.113.{n}, 198.51.100.7').status_code for n in range(5)
+            ]
+            self.assertEqual(statuses, [401, 401, 401, 429, 429])
+            # Another client behind the same proxy has its own count
+            self.assertEqual(self.attempt(9, HTTP_X_FORWARDED_FOR='198.51.100.8').status_code, 401)
+
+
+class RefusingBackend(EmailBackend):
+    """
+    locmem backend whose server refuses one address
+    """
+    refused = 'refused@example.com'
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.refused in message.to:
+                raise SMTPRecipientsRefused({self.refused: (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='donations.tests.RefusingBackend')
+class BroadcastTests(TestCase):
+    def setUp(self):
+        self.campaign = make_campaign()
+        for name in ('amina', 'brian', 'refused', 'wanjiru'):
+            Donation.objects.create(donor=make_donor(name), campaign=self.campaign, amount=Decimal('100'))
+        self.broadcast = broadcasts.queue_broadcast(self.campaign, 'update', message='Drilling starts Monday')
+
+    def send(self):
+        call_command('send_campaign_broadcasts', batch_size=10, stdout=io.StringIO())
+
+    def test_refused_recipient_does_not_stop_or_repeat_the_batch(self):
+        self.send()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [
+            'amina@example.com', 'brian@example.com', 'wanjiru@example.com',
+        ])
+        self.broadcast.refresh_from_db()
+        self.assertEqual(self.broadcast.status, 'done')
+        self.assertEqual((self.broadcast.sent_count, self.broadcast.failed_count), (3, 1))
+        self.assertEqual(self.broadcast.last_donor_id, Donor.objects.get(name='Wanjiru').pk)
+        retry = OutboundEmail.objects.get()
+        self.assertEqual((retry.to, retry.status, retry.attempts), (['refused@example.com'], 'pending', 1))
+        self.assertIn('No such user', retry.last_error)
+
+        # Nothing left to claim, so nobody is emailed again
+        mail.outbox.clear()
+        self.send()
+        self.assertEqual(mail.outbox, [])
+
+    def test_claimed_broadcast_is_skipped_until_its_lease_runs_out(self):
+        claimed = broadcasts.claim_broadcast()
+        self.assertEqual(claimed.pk, self.broadcast.pk)
+        self.assertIsNone(broadcasts.claim_broadcast())
+
+        CampaignBroadcast.objects.filter(pk=claimed.pk).update(leased_until=timezone.now() - timedelta(seconds=1))
+        taken_over = broadcasts.claim_broadcast()
+        self.assertEqual(taken_over.pk, claimed.pk)
+
+        # The first worker lost its lease, so it stops at its first checkpoint without saving it
+        broadcasts.send_broadcast(claimed, batch_size=2)
+        self.assertEqual(CampaignBroadcast.objects.get(pk=claimed.pk).last_donor_id, 0)
+        broadcasts.send_broadcast(taken_over, batch_size=2)
+        self.broadcast.refresh_from_db()
+        self.assertEqual((self.broadcast.status, self.broadcast.sent_count, self.broadcast.failed_count), ('done', 3, 1))
+
+
+@override_settings(EMAIL_BACKEND='donations.tests.RefusingBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class OutboxTests(TestCase):
+    def queue(self, *recipients):
+        return [outbox.queue_email('Thank you', 'Your gift arrived', [recipient]) for recipient in recipients]
+
+    def make_due(self):
+        OutboundEmail.objects.filter(status='pending').update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    def test_emails_are_only_queued_if_the_request_commits(self):
+        try:
+            with transaction.atomic():
+                self.queue('amina@example.com')
+                raise ValueError('the request failed')
+        except ValueError:
+            pass
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertIsNone(outbox.queue_email('Thank you', 'Your gift arrived', []))
+
+    def test_claimed_emails_are_leased(self):
+        self.queue('amina@example.com', 'brian@example.com', 'wanjiru@example.com')
+        first = outbox.claim_batch(2)
+        second = outbox.claim_batch(2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual([email.to for email in second], [['wanjiru@example.com']])
+        self.assertEqual(outbox.claim_batch(2), [])
+        # A worker that died mid-batch: its emails come back once the lease runs out
+        self.make_due()
+        self.assertEqual(len(outbox.claim_batch(10)), 3)
+        self.assertEqual(mail.outbox, [])
+
+    def test_batches_share_a_connection_and_failures_are_dead_lettered(self):
+        self.queue('amina@example.com', 'refused@example.com', 'brian@example.com', 'wanjiru@example.com')
+        with mock.patch.object(outbox, 'get_connection', wraps=outbox.get_connection) as get_connection:
+            self.assertEqual(outbox.drain_outbox(batch_size=2), (3, 1, 0))
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        refused = OutboundEmail.objects.get(status='pending')
+        self.assertEqual(refused.attempts, 1)
+        self.assertIn('No such user', refused.last_error)
+        self.assertGreater(refused.next_attempt_at, timezone.now())
+        # Backing off: not due yet
+        self.assertEqual(outbox.drain_outbox(), (0, 0, 0))
+
+        self.make_due()
+        self.assertEqual(outbox.drain_outbox(), (0, 1, 0))
+        self.make_due()
+        self.assertEqual(outbox.drain_outbox(), (0, 0, 1))
+        refused.refresh_from_db()
+        self.assertEqual((refused.status, refused.attempts), ('dead', 3))
+        # Dead letters are never claimed again
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(outbox.claim_batch(10), [])
+        self.assertEqual(OutboundEmail.objects.filter(status='sent').count(), 3)
+
+    def test_retry_delay_backs_off_up_to_the_cap(self):
+        with self.settings(EMAIL_OUTBOX_RETRY_BACKOFF=30, EMAIL_OUTBOX_MAX_BACKOFF=3600):
+            for attempts, seconds in ((1, 30), (2, 60), (4, 240), (20, 3600)):
+                delay = outbox.retry_delay(attempts).total_seconds()
+                self.assertTrue(seconds * 0.8 <= delay <= seconds * 1.2, (attempts, delay))
+
+
+class MyDonationsTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.donor = make_donor('amina')
+        self.client = benchmarks.api_client(self.donor.user)
+        self.wells, self.school = make_campaign('Wells'), make_campaign('School')
+
+    def donate(self, campaign, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/donations/', {'campaign': campaign.pk, 'amount': amount}, secure=True)
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def my_donations(self, url='/api/my-donations/?page_size=2'):
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_summary_follows_donations_and_deletes(self):
+        first = self.donate(self.wells, '100')
+        self.donate(self.wells, '20')
+        self.donate(self.school, '5')
+        summary = self.my_donations()['summary']
+        self.assertEqual(
+            (summary['total_amount'], summary['donation_count'], summary['campaign_count']), ('125.00', 3, 2),
+        )
+        self.assertIsNotNone(summary['first_donated_at'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/donations/{first}/', secure=True).status_code, 204)
+        summary = self.my_donations()['summary']
+        self.assertEqual(
+            (summary['total_amount'], summary['donation_count'], summary['campaign_count']), ('25.00', 2, 2),
+        )
+
+    def test_first_gift_to_a_campaign_is_looked_up_once(self):
+        self.donate(self.wells, '100')
+        with CaptureQueriesContext(connection) as queries:
+            self.donate(self.wells, '20')
+        lookups = [query['sql'] for query in queries if query['sql'].startswith('SELECT 1 AS "a" FROM "donations_donation"')]
+        self.assertEqual(len(lookups), 1, lookups)
+        self.assertEqual(DonorSummary.objects.get(donor=self.donor).campaign_count, 1)
+
+    def test_pages_and_cursors_are_newest_first(self):
+        ids = [self.donate(self.wells, str(amount)) for amount in range(1, 6)]
+        page = self.my_donations()
+        self.assertEqual((page['count'], [row['id'] for row in page['results']]), (5, ids[:-3:-1]))
+        self.assertEqual(page['profile']['username'], 'amina')
+
+        seen, url = [], '/api/my-donations/?pagination=cursor&page_size=2'
+        while url:
+            page = self.my_donations(url)
+            seen += [row['id'] for row in page['results']]
+            url = page['next']
+        self.assertEqual(seen, ids[::-1])
+        # Another donor's history is their own
+        other = benchmarks.api_client(make_donor('brian').user).get('/api/my-donations/', secure=True).json()
+        self.assertEqual((other['count'], other['summary']['donation_count']), (0, 0))
+
+
+class ConditionalRequestTests(TestCase):
+    urlconfs = ('charity_website.urls', 'donations.tests')
+
+    def setUp(self):
+        clear_caches()
+        statistics.rebuild()
+        self.wells = make_campaign('Wells')
+        self.solar = make_campaign('Solar', counter_shards=4)
+        self.donor = make_donor('amina')
+
+    def donate(self, campaign):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = benchmarks.api_client(self.donor.user).post(
+                '/api/donations/', {'campaign': campaign.pk, 'amount': '10'}, secure=True,
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def get(self, url, **headers):
+        return self.client.get(url, secure=True, **headers)
+
+    def test_campaign_list_revalidates(self):
+        for urlconf in self.urlconfs:
+            with self.subTest(urlconf), self.settings(ROOT_URLCONF=urlconf):
+                first = self.get('/api/campaigns/?page_size=5')
+                self.assertEqual(first.status_code, 200)
+                self.assertIn('no-cache', first['Cache-Control'])
+                with self.assertNumQueries(1):
+                    not_modified = self.get('/api/campaigns/?page_size=5', HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual((not_modified.status_code, not_modified.content), (304, b''))
+                self.assertEqual(not_modified['ETag'], first['ETag'])
+                # Each query string has its own
+                self.assertNotEqual(self.get('/api/campaigns/?page_size=4')['ETag'], first['ETag'])
+
+                self.donate(self.solar)
+                changed = self.get('/api/campaigns/?page_size=5', HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(changed.status_code, 200)
+                self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_campaign_detail_revalidates(self):
+        for urlconf in self.urlconfs:
+            with self.subTest(urlconf), self.settings(ROOT_URLCONF=urlconf):
+                url = f'/api/campaigns/{self.wells.pk}/'
+                first = self.get(url)
+                self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+                self.assertEqual(self.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+                self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+                self.donate(self.wells)
+                changed = self.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(changed.status_code, 200)
+                raised = Donation.objects.filter(campaign=self.wells).aggregate(total=Sum('amount'))['total']
+                self.assertEqual(Decimal(str(changed.json()['amount_raised'])), raised)
+
+    def test_sharded_donations_change_the_etag(self):
+        for urlconf in self.urlconfs:
+            with self.subTest(urlconf), self.settings(ROOT_URLCONF=urlconf):
+                url = f'/api/campaigns/{self.solar.pk}/'
+                first = self.get(url)
+                # The row is not written for sharded donations, so its updated_at cannot be trusted
+                self.assertNotIn('Last-Modified', first)
+                self.donate(self.solar)
+                self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.campaign = make_campaign()
+        self.donor = make_donor('amina')
+        start = timezone.now() - timedelta(hours=1)
+        # Pairs share a timestamp, so the id has to break the tie
+        self.comments = [
+            Comment.objects.create(
+                campaign=self.campaign, donor=self.donor, text=f'comment {n}', created_at=start + timedelta(minutes=n // 2),
+            )
+            for n in range(9)
+        ]
+        self.newest_first = [comment.pk for comment in reversed(self.comments)]
+
+    def get(self, url, client=None):
+        response = (client or self.client).get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, url, link='next', client=None):
+        pages = []
+        while url:
+            page = self.get(url, client)
+            pages.append([row['id'] for row in page['results']])
+            url = page[link]
+        return pages
+
+    def test_cursors_walk_every_row_once_in_order(self):
+        for page_size in (1, 2, 4, 9, 20):
+            with self.subTest(page_size=page_size):
+                pages = self.walk(f'/api/comments/?campaign={self.campaign.pk}&pagination=cursor&page_size={page_size}')
+                self.assertEqual([pk for page in pages for pk in page], self.newest_first)
+                self.assertTrue(all(len(page) == page_size for page in pages[:-1]))
+
+    def test_previous_links_walk_back_to_the_first_page(self):
+        first = self.get('/api/comments/?pagination=cursor&page_size=2')
+        self.assertIsNone(first['previous'])
+        url = first['next']
+        for _ in range(2):
+            last = self.get(url)
+            url = last['next']
+        pages = self.walk(last['previous'], link='previous')
+        self.assertEqual([pk for page in reversed(pages) for pk in page], self.newest_first[:4])
+
+    def test_new_rows_do_not_shift_the_pages(self):
+        first = self.get('/api/comments/?pagination=cursor&page_size=3')
+        Comment.objects.create(campaign=self.campaign, donor=self.donor, text='late')
+        rest = self.walk(first['next'])
+        self.assertEqual([row['id'] for row in first['results']] + [pk for page in rest for pk in page], self.newest_first)
+
+    def test_page_numbers_stay_the_default(self):
+        page = self.get('/api/comments/?page_size=4&page=2')
+        self.assertEqual(page['count'], 9)
+        self.assertEqual([row['id'] for row in page['results']], self.newest_first[4:8])
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('junk', 'bm90IGEgY3Vyc29y', '%%%'):
+            with self.subTest(cursor):
+                self.assertEqual(self.client.get(f'/api/comments/?cursor={cursor}', secure=True).status_code, 404)
+
+    def test_admin_donation_feed(self):
+        donated_at = timezone.now() - timedelta(days=1)
+        donations = [
+            Donation.objects.create(
+                donor=self.donor, campaign=self.campaign, amount=Decimal('5'), donated_at=donated_at + timedelta(hours=n % 3),
+            )
+            for n in range(7)
+        ]
+        expected = [donation.pk for donation in sorted(donations, key=lambda d: (d.donated_at, d.pk), reverse=True)]
+        client = benchmarks.api_client(make_admin('root'))
+        pages = self.walk('/api/admin/donations/?pagination=cursor&page_size=3', client=client)
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+
+class PlatformStatisticsTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        statistics.rebuild()
+        self.admin = benchmarks.api_client(make_admin('root'))
+
+    def donate(self, donor, campaign, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = benchmarks.api_client(donor.user).post(
+                '/api/donations/', {'campaign': campaign.pk, 'amount': amount}, secure=True,
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def assert_matches_a_rebuild(self):
+        stats = statistics.get_statistics()
+        self.assertEqual({field: getattr(stats, field) for field in statistics.compute()}, statistics.compute())
+
+    def test_incremental_statistics_match_a_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            amina, brian = make_donor('amina'), make_donor('brian')
+            wells = make_campaign('Wells')
+            solar = make_campaign('Solar', counter_shards=4)
+            closed = make_campaign('Closed', is_active=False, amount_raised=Decimal('50'))
+        self.assert_matches_a_rebuild()
+
+        for donor, campaign, amount in ((amina, wells, '25'), (brian, wells, '10.50'), (amina, solar, '40'), (brian, solar, '7')):
+            self.donate(donor, campaign, amount)
+        self.assert_matches_a_rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            closed.is_active = True
+            closed.amount_raised = Decimal('80')
+            closed.save()
+            counters.fold_counter_shards(solar.pk)
+        self.assert_matches_a_rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.admin.delete(f'/api/admin/campaigns/{wells.pk}/', secure=True).status_code, 204)
+            brian.delete()
+        self.assert_matches_a_rebuild()
+
+        response = self.admin.get('/api/admin/dashboard/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['statistics'], {
+            'total_campaigns': 2, 'active_campaigns': 2, 'total_donations': 1,
+            # brian's gift to Solar stays counted, as with the campaign's own total
+            'total_amount_raised': 127.0, 'total_donors': 1,
+        })
+
+    def test_deltas_wait_for_the_commit(self):
+        try:
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                make_campaign()
+                raise ValueError('rolled back')
+        except ValueError:
+            pass
+        self.assertEqual(statistics.get_statistics().total_campaigns, 0)
+
+
+class DonationUpdateTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.donor = make_donor('amina')
+        self.wells, self.school = make_campaign('Wells'), make_campaign('School')
+        self.client = benchmarks.api_client(self.donor.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.moved = self.donate(self.wells, '100')
+            self.donate(self.school, '50')
+
+    def donate(self, campaign, amount):
+        response = self.client.post('/api/donations/', {'campaign': campaign.pk, 'amount': amount}, secure=True)
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_moving_a_donation_updates_summary_trend_and_live_progress(self):
+        with mock.patch.object(live.hub, 'changed') as changed, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/donations/{self.moved}/', {'campaign': self.school.pk, 'amount': '30'}, secure=True,
+            )
+        self.assertEqual(response.status_code, 200)
+
+        summary = DonorSummary.objects.get(donor=self.donor)
+        self.assertEqual((summary.total_amount, summary.donation_count, summary.campaign_count), (Decimal('80'), 2, 1))
+        trends = {trend.campaign_id: trend for trend in CampaignTrend.objects.all()}
+        self.assertEqual((trends[self.wells.pk].donations_24h, trends[self.wells.pk].amount_24h), (0, Decimal('0')))
+        self.assertEqual((trends[self.school.pk].donations_24h, trends[self.school.pk].amount_24h), (2, Decimal('80')))
+        changed.assert_called_once_with(sorted([self.wells.pk, self.school.pk]))
+
+        self.assertEqual(
+            Campaign.objects.filter(pk=self.school.pk).values_list('amount_raised', 'donation_count', 'unique_donor_count').get(),
+            (Decimal('80'), 2, 1),
+        )
+
+
+class CampaignEditTests(TestCase):
+    def test_edit_keeps_counts_changed_since_the_campaign_was_read(self):
+        campaign = make_campaign()
+        edited = Campaign.objects.get(pk=campaign.pk)
+        # A donation and a comment land between the edit's read and its save
+        counters.add_to_amount_raised(campaign, Decimal('250'), donations=1, donors=1)
+        counters.add_to_comment_count(campaign.pk, 1)
+
+        serializer = CampaignSerializer(edited, data={'title': 'Clean water for Lodwar'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertEqual(
+            Campaign.objects.filter(pk=campaign.pk)
+            .values_list('title', 'amount_raised', 'donation_count', 'unique_donor_count', 'comment_count').get(),
+            ('Clean water for Lodwar', Decimal('250'), 1, 1, 1),
+        )
+
+    def test_admin_edit_keeps_counts_changed_since_the_campaign_was_read(self):
+        campaign = make_campaign()
+        model_admin = CampaignAdmin(Campaign, django_admin.site)
+        request = RequestFactory().post('/admin/donations/campaign/')
+        request.user = User.objects.create_superuser('root', 'root@example.com', 'password-123')
+        edited = Campaign.objects.get(pk=campaign.pk)
+        form_class = model_admin.get_form(request, edited, change=True)
+        self.assertNotIn('amount_raised', form_class.base_fields)
+
+        counters.add_to_amount_raised(campaign, Decimal('250'), donations=1, donors=1)
+        data = {
+            'title': 'Clean water for Lodwar', 'category': edited.category, 'location': edited.location,
+            'description': edited.description, 'goal': edited.goal, 'counter_shards': 0,
+        }
+        form = form_class(data, instance=edited)
+        self.assertTrue(form.is_valid(), form.errors)
+        model_admin.save_model(request, form.save(commit=False), form, change=True)
+
+        self.assertEqual(
+            Campaign.objects.filter(pk=campaign.pk).values_list('title', 'amount_raised', 'donation_count').get(),
+            ('Clean water for Lodwar', Decimal('250'), 1),
+        )
+        self.client.force_login(request.user)
+        response = self.client.get(f'/admin/donations/campaign/{campaign.pk}/change/', secure=True)
+        self.assertContains(response, '250')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'FTS5 index')
+class SearchTests(TestCase):
+    def setUp(self):
+        search._available.clear()
+        self.water = make_campaign('Clean water')
+        self.meals = Campaign.objects.create(title='School meals', description='Meals, and water filters for the kitchen')
+        self.flood = Campaign.objects.create(title='Flood relief', description='Tents and blankets')
+
+    def titles(self, terms):
+        response = self.client.get('/api/campaigns/', {'search': terms})
+        self.assertEqual(response.status_code, 200)
+        return [campaign['title'] for campaign in response.json()['results']]
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertTrue(search.search_available(connection))
+        self.assertEqual(self.titles('water'), ['Clean water', 'School meals'])
+        # Every word must match, the last may be a prefix, and words are stemmed
+        self.assertEqual(self.titles('wat'), ['Clean water', 'School meals'])
+        self.assertEqual(self.titles('water filtering'), ['School meals'])
+        # Query syntax is quoted away rather than passed to MATCH
+        self.assertEqual(self.titles('water" OR "tents'), [])
+        self.assertEqual(self.titles('"*'), [])
+
+    def test_triggers_keep_the_index_in_sync(self):
+        self.flood.title = 'Flood water'
+        self.flood.save()
+        self.water.title = 'Clean wells'
+        self.water.save()
+        Campaign.objects.filter(pk=self.meals.pk).update(description='Meals for the kitchen')
+        self.assertEqual(self.titles('water'), ['Flood water', 'Clean wells'])
+        self.water.description = 'Wells for Turkana'
+        self.water.save()
+        self.meals.delete()
+        self.assertEqual(self.titles('water'), ['Flood water'])
+        self.assertEqual(self.titles('meals'), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {search.FTS_TABLE}({search.FTS_TABLE}) VALUES('integrity-check')")
+            cursor.execute(f'SELECT count(*) FROM {search.FTS_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], Campaign.objects.count())
+
+
+class OnboardingTests(TestCase):
+    def setUp(self):
+        make_donor('amina', 'Amina@Example.com')
+        statistics.rebuild()
+
+    def onboard(self, rows):
+        lines = ['username,email,name,password'] + [','.join(row) for row in rows]
+        with self.captureOnCommitCallbacks(execute=True):
+            return onboarding.onboard_donors(io.StringIO('\n'.join(lines) + '\n'), workers=1)
+
+    def test_taken_and_repeated_accounts_are_skipped(self):
+        report = self.onboard([
+            ('amina', 'new@example.com', 'Amina Two', ''),
+            ('amina2', 'amina@example.COM', 'Amina Three', ''),
+            ('brian', 'brian@example.com', 'Brian', 'secret-pass-1'),
+            ('brian', 'brian2@example.com', 'Brian Two', ''),
+            ('brian3', 'BRIAN@example.com', 'Brian Three', ''),
+            ('wanjiru', 'wanjiru@example.com', 'Wanjiru', ''),
+        ])
+        self.assertEqual((report['donors'], report['skipped'], report['emails_queued']), (2, 4, 2))
+        self.assertEqual([message.split(':')[0] for message in report['skipped_rows']], ['line 2', 'line 3', 'line 5', 'line 6'])
+        self.assertEqual(sorted(Donor.objects.values_list('user__username', flat=True)), ['amina', 'brian', 'wanjiru'])
+        self.assertEqual(statistics.get_statistics().total_donors, 3)
+
+    def test_passwords_are_hashed_or_unusable(self):
+        self.onboard([('brian', 'brian@example.com', 'Brian', 'secret-pass-1'), ('wanjiru', 'wanjiru@example.com', 'Wanjiru', '')])
+        self.assertTrue(User.objects.get(username='brian').check_password('secret-pass-1'))
+        self.assertFalse(User.objects.get(username='wanjiru').has_usable_password())
+
+    def test_invalid_row_aborts_the_file(self):
+        with self.assertRaises(onboarding.DonorOnboardingError) as raised:
+            self.onboard([('brian', 'brian@example.com', 'Brian', ''), ('wanjiru', 'not-an-email', 'Wanjiru', '')])
+        self.assertEqual(raised.exception.errors, ["line 3: invalid email 'not-an-email'"])
+        self.assertEqual(Donor.objects.count(), 1)
+        self.assertEqual(statistics.get_statistics().total_donors, 1)
+
+    def test_account_created_while_hashing_aborts_the_write(self):
+        hash_passwords = onboarding.hash_passwords
+
+        def sign_up_meanwhile(passwords, workers=None, processes=True):
+            make_donor('zawadi-web', 'Zawadi@Example.com')
+            return hash_passwords(passwords, workers, processes)
+
+        with mock.patch.object(onboarding, 'hash_passwords', sign_up_meanwhile):
+            with self.assertRaises(onboarding.DonorOnboardingError) as raised:
+                self.onboard([('brian', 'brian@example.com', 'Brian', ''), ('zawadi', 'zawadi@example.com', 'Zawadi', '')])
+        self.assertEqual(raised.exception.errors, ['line 3: email zawadi@example.com was taken while onboarding'])
+        self.assertIn('run it again', str(raised.exception))
+        self.assertFalse(User.objects.filter(username__in=['brian', 'zawadi']).exists())
+        self.assertEqual(User.objects.filter(email__iexact='zawadi@example.com').count(), 1)
+
+
+@override_settings(DONOR_ONBOARDING_WORKERS=4)
+class OnboardingEndpointTests(TestCase):
+    def setUp(self):
+        make_donor('amina', 'Amina@Example.com')
+        statistics.rebuild()
+        self.client = benchmarks.api_client(make_admin('root'))
+        # The upload runs in a web worker, which must not fork
+        patcher = mock.patch.object(onboarding, 'ProcessPoolExecutor', side_effect=AssertionError('forked a web worker'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, rows, **data):
+        content = '\n'.join(['username,email,name,password'] + [','.join(row) for row in rows]) + '\n'
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/admin/donors/import/', {
+                'file': SimpleUploadedFile('donors.csv', content.encode(), content_type='text/csv'), **data,
+            }, format='multipart', secure=True)
+
+    def test_duplicate_accounts_are_skipped(self):
+        response = self.upload([
+            ('amina', 'new@example.com', 'Amina Two', 'secret-pass-1'),
+            ('brian', 'AMINA@example.com', 'Brian', 'secret-pass-2'),
+            ('wanjiru', 'wanjiru@example.com', 'Wanjiru', 'secret-pass-3'),
+            ('wanjiru', 'wanjiru2@example.com', 'Wanjiru Two', 'secret-pass-4'),
+            ('zawadi', 'zawadi@example.com', 'Zawadi', 'secret-pass-5'),
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['donors'], response.data['skipped']), (2, 3))
+        self.assertEqual([message.split(':')[0] for message in response.data['skipped_rows']], ['line 2', 'line 3', 'line 5'])
+        self.assertTrue(User.objects.get(username='zawadi').check_password('secret-pass-5'))
+        self.assertTrue(User.objects.get(username='wanjiru').check_password('secret-pass-3'))
+        self.assertEqual(statistics.get_statistics().total_donors, 3)
+        # Running the file again creates nothing more
+        response = self.upload([('zawadi', 'zawadi@example.com', 'Zawadi', 'secret-pass-5')])
+        self.assertEqual((response.status_code, response.data['donors'], response.data['skipped']), (201, 0, 1))
+
+    def test_dry_run_writes_nothing(self):
+        response = self.upload([('brian', 'brian@example.com', 'Brian', 'secret-pass-1')], dry_run='true')
+        self.assertEqual((response.status_code, response.data['donors']), (200, 1))
+        self.assertFalse(User.objects.filter(username='brian').exists())
+
+    def test_a_bad_row_writes_nothing(self):
+        response = self.upload([
+            ('brian', 'brian@example.com', 'Brian', 'secret-pass-1'),
+            ('wanjiru', 'not-an-email', 'Wanjiru', ''),
+            ('', 'zawadi@example.com', 'Zawadi', ''),
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], ["line 3: invalid email 'not-an-email'", 'line 4: username is required'])
+        self.assertEqual(Donor.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_account_created_while_hashing_writes_nothing(self):
+        hash_passwords = onboarding.hash_passwords
+
+        def sign_up_meanwhile(passwords, workers=None, processes=True):
+            make_donor('brian-web', 'brian@example.com')
+            return hash_passwords(passwords, workers, processes)
+
+        with mock.patch.object(onboarding, 'hash_passwords', sign_up_meanwhile):
+            response = self.upload([
+                ('brian', 'brian@example.com', 'Brian', 'secret-pass-1'),
+                ('wanjiru', 'wanjiru@example.com', 'Wanjiru', 'secret-pass-2'),
+            ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], ['line 2: email brian@example.com was taken while onboarding'])
+        self.assertFalse(User.objects.filter(username__in=['brian', 'wanjiru']).exists())
+        self.assertEqual(statistics.get_statistics().total_donors, 2)
+
+
+class ConcurrentDonationTests(TransactionTestCase):
+    """
+    Donations racing each other through the API, and thousands of them from
+    worker processes through stress_donations, must not lose updates to the
+    campaign's amount or counts
+    """
+    donors = 20
+    donations_per_donor = 20
+    workers = 16
+
+    def setUp(self):
+        clear_caches()
+        self.clients = []
+        for number in range(self.donors):
+            donor = make_donor(f'donor{number}')
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(donor.user).access_token}')
+            self.clients.append(client)
+
+    def donate(self, client, campaign_id, amount):
+        try:
+            response = client.post(
+                '/api/donations/', {'campaign': campaign_id, 'amount': str(amount)}, format='json', secure=True,
+            )
+            return response.status_code
+        finally:
+            connection.close()
+
+    def donate_in_parallel(self, campaign):
+        # Donor by donor in turn, so each donor's donations also race each other
+        tasks = [
+            (client, Decimal(number % 97) + Decimal('0.25'))
+            for number in range(self.donations_per_donor)
+            for client in self.clients
+        ]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            statuses = list(pool.map(lambda task: self.donate(task[0], campaign.pk, task[1]), tasks))
+        self.assertEqual(statuses, [201] * len(tasks))
+        self.assertEqual(Donation.objects.filter(campaign=campaign).count(), len(tasks))
+
+    def assert_totals(self, campaign):
+        donations = Donation.objects.filter(campaign=campaign)
+        table = donations.aggregate(amount=Sum('amount'), count=Count('id'), donors=Count('donor', distinct=True))
+        campaign = Campaign.objects.get(pk=campaign.pk)
+        self.assertEqual(
+            (campaign.total_amount_raised, campaign.total_donation_count, campaign.total_unique_donor_count),
+            (table['amount'], table['count'], table['donors']),
+        )
+        return table
+
+    def test_parallel_donations(self):
+        campaign = make_campaign()
+        self.donate_in_parallel(campaign)
+        table = self.assert_totals(campaign)
+        self.assertEqual(Campaign.objects.get(pk=campaign.pk).amount_raised, table['amount'])
+
+    def test_parallel_donations_to_a_sharded_campaign(self):
+        campaign = make_campaign(counter_shards=4)
+        self.donate_in_parallel(campaign)
+        self.assert_totals(campaign)
+        # Turning sharding off does not hide what the shards still hold
+        Campaign.objects.filter(pk=campaign.pk).update(counter_shards=0)
+        self.assert_totals(campaign)
+        counters.fold_counter_shards(campaign.pk)
+        table = self.assert_totals(campaign)
+        self.assertEqual(Campaign.objects.get(pk=campaign.pk).amount_raised, table['amount'])
+        self.assertFalse(campaign.amount_shards.exists())
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+    def test_stress_donations_from_worker_processes(self):
+        for shards in (None, 8):
+            with self.subTest(shards=shards):
+                campaign = make_campaign(f'Stress {shards}')
+                call_command(
+                    'stress_donations', campaign.pk, donations=2000, workers=16, processes=True,
+                    amount=Decimal('1.25'), shards=shards, stdout=io.StringIO(),
+                )
+                counters.fold_counter_shards(campaign.pk)
+                table = self.assert_totals(campaign)
+                self.assertEqual(table['count'], 2000)
+                self.assertEqual(Campaign.objects.get(pk=campaign.pk).amount_raised, table['amount'])
+
+
+class EventStream:
+    """
+    An ASGI client for LiveUpdatesApp's progress stream
+    """
+
+    def __init__(self, query, method='GET', host=b'testserver'):
+        self.scope = {
+            'type': 'http', 'path': live.PATH, 'method': method, 'query_string': query.encode(),
+            'headers': [(b'host', host)],
+        }
+        self.incoming = asyncio.Queue()
+        self.sent = asyncio.Queue()
+        self.task = asyncio.ensure_future(live.LiveUpdatesApp(None)(self.scope, self.incoming.get, self.sent.put))
+
+    async def next(self):
+        return await asyncio.wait_for(self.sent.get(), 10)
+
+    async def events(self):
+        """
+        The progress events in the next body sent
+        """
+        body = (await self.next())['body'].decode()
+        return [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+
+    async def close(self):
+        await self.incoming.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(self.task, 10)
+
+
+@override_settings(LIVE_UPDATE_INTERVAL=0.5, LIVE_HEARTBEAT_SECONDS=30, LIVE_BROKER_ADDRESS='')
+class LiveProgressTests(TransactionTestCase):
+    """
+    Not a TestCase: the hub reads progress in another thread, which must see
+    the donations committed
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.donor = make_donor('amina')
+        self.wells, self.school = make_campaign('Wells', goal=Decimal('1000')), make_campaign('School')
+
+    def donate(self, campaign, amount):
+        response = benchmarks.api_client(self.donor.user).post(
+            '/api/donations/', {'campaign': campaign.pk, 'amount': amount}, secure=True,
+        )
+        self.assertEqual(response.status_code, 201)
+
+    async def test_stream_sends_progress_then_coalesced_changes(self):
+        stream = EventStream(f'campaigns={self.wells.pk},{self.school.pk},999999')
+        start = await stream.next()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        first = await stream.events()
+        self.assertEqual([(progress['campaign'], progress['amount_raised']) for progress in first], [
+            (self.wells.pk, '0.00'), (self.school.pk, '0.00'),
+        ])
+        self.assertEqual((first[0]['goal'], first[0]['donors'], first[0]['is_active']), ('1000.00', 0, True))
+
+        await sync_to_async(self.donate)(self.wells, '25')
+        self.assertEqual(await stream.events(), [
+            {'campaign': self.wells.pk, 'amount_raised': '25.00', 'goal': '1000.00', 'donors': 1, 'is_active': True},
+        ])
+        # Both land while the hub waits out LIVE_UPDATE_INTERVAL, so they are read and sent once
+        await sync_to_async(self.donate)(self.wells, '10')
+        await sync_to_async(self.donate)(self.wells, '5')
+        self.assertEqual([progress['amount_raised'] for progress in await stream.events()], ['40.00'])
+
+        await stream.close()
+        self.assertEqual(dict(live.hub.subscriptions), {})
+
+    async def test_streams_share_one_read(self):
+        streams = [EventStream(f'campaigns={self.wells.pk}') for _ in range(3)]
+        for stream in streams:
+            await stream.next()
+            await stream.events()
+        with mock.patch.object(live, 'fetch_progress', wraps=live.fetch_progress) as fetch_progress:
+            await sync_to_async(self.donate)(self.wells, '25')
+            bodies = [await stream.next() for stream in streams]
+        fetch_progress.assert_called_once_with([self.wells.pk])
+        self.assertEqual(len({body['body'] for body in bodies}), 1)
+        for stream in streams:
+            await stream.close()
+
+    async def test_idle_streams_get_keepalives(self):
+        with self.settings(LIVE_HEARTBEAT_SECONDS=0):
+            stream = EventStream(f'campaigns={self.wells.pk}')
+            await stream.next()
+            await stream.events()
+            self.assertEqual((await stream.next())['body'], b': keepalive\n\n')
+            await stream.close()
+
+    async def test_bad_requests_are_refused(self):
+        with self.settings(LIVE_MAX_CAMPAIGNS=2):
+            for stream, status in (
+                (EventStream('campaigns=1,two'), 400),
+                (EventStream('campaigns=1,2,3'), 400),
+                (EventStream('campaigns=1', method='POST'), 405),
+                (EventStream('campaigns=1', host=b'evil.example.com'), 400),
+            ):
+                with self.subTest(stream.scope):
+                    self.assertEqual((await stream.next())['status'], status)
+                    await asyncio.wait_for(stream.task, 10)
+        self.assertEqual(dict(live.hub.subscriptions), {})
+
+    def test_changes_are_published_after_commit(self):
+        with mock.patch.object(live.hub, 'changed') as changed:
+            with transaction.atomic():
+                live.publish([self.school.pk, self.wells.pk, self.wells.pk])
+                changed.assert_not_called()
+            changed.assert_called_once_with(sorted([self.wells.pk, self.school.pk]))
+            try:
+                with transaction.atomic():
+                    live.publish([self.wells.pk])
+                    raise ValueError('rolled back')
+            except ValueError:
+                pass
+            changed.assert_called_once()
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite locking')
+@unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+class SqliteContentionTests(TransactionTestCase):
+    """
+    Donations, comments and reads from separate processes, as from gunicorn
+    workers, queue for the write lock instead of failing with "database is
+    locked"
+    """
+
+    def test_mixed_writes_from_many_processes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+        campaign = make_campaign()
+        donor = make_donor('stress')
+        tasks = ['donation'] * 120 + ['comment'] * 40 + ['read'] * 80
+        work = partial(run_stress_operation, campaign=campaign, donor=donor, amount=Decimal('5'), deferred=False)
+
+        # Forked workers must not share this process's connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=12, mp_context=multiprocessing.get_context('fork')) as pool:
+            results = list(pool.map(work, tasks[::3] + tasks[1::3] + tasks[2::3], chunksize=4))
+
+        self.assertEqual([error for _, error in results if error is not None], [])
+        campaign = Campaign.objects.get(pk=campaign.pk)
+        self.assertEqual(campaign.amount_raised, Decimal('600'))
+        self.assertEqual((campaign.donation_count, campaign.unique_donor_count, campaign.comment_count), (120, 1, 40))
+        self.assertEqual(Donation.objects.filter(campaign=campaign).count(), 120)
+
+
+def record_in_worker(directory, requests):
+    # A fresh table, as in a gunicorn worker, not the copy forked from the test
+    worker = metrics.MetricsRegistry()
+    for _ in range(requests):
+        worker.record('metrics-test', 'list', 200, 0.02, 2, 0.001, 100)
+    worker.flush(directory)
+
+
+@unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+class MetricsDirectoryTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def requests(self):
+        with self.settings(METRICS_DIR=self.directory):
+            data = metrics.collect()
+        return sum(values[metrics.COUNT] for view, _, values in data['series'] if view == 'metrics-test')
+
+    def run_workers(self, *requests):
+        context = multiprocessing.get_context('fork')
+        for count in requests:
+            worker = context.Process(target=record_in_worker, args=(self.directory, count))
+            worker.start()
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+    def test_sums_processes_and_folds_exited_ones(self):
+        self.run_workers(3, 5, 7)
+        self.assertEqual(self.requests(), 15)
+        # The exited workers' files are now in the aggregate, next to this process's own
+        names = sorted(os.listdir(self.directory))
+        self.assertIn(metrics.AGGREGATE_FILE, names)
+        self.assertEqual(len([name for name in names if metrics.PROCESS_FILE.match(name)]), 1)
+        self.assertEqual(self.requests(), 15)
+        self.run_workers(2)
+        self.assertEqual(self.requests(), 17)
+
+    def test_reused_pid_does_not_overwrite_totals(self):
+        # An earlier process with this pid, started before this one
+        record_in_worker(self.directory, 4)
+        old = [name for name in os.listdir(self.directory) if metrics.PROCESS_FILE.match(name)][0]
+        os.rename(os.path.join(self.directory, old), os.path.join(self.directory, f'{os.getpid()}-1.json'))
+        self.assertEqual(self.requests(), 4)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, f'{os.getpid()}-1.json')))
+        self.assertEqual(self.requests(), 4)
+
+    def test_file_folded_before_a_crash_is_not_counted_twice(self):
+        self.run_workers(6)
+        exited = [name for name in os.listdir(self.directory) if metrics.PROCESS_FILE.match(name)][0]
+        with open(os.path.join(self.directory, exited)) as f:
+            data = json.load(f)
+        self.assertEqual(self.requests(), 6)
+        # The scrape died between writing the aggregate and deleting the file
+        with open(os.path.join(self.directory, exited), 'w') as f:
+            json.dump(data, f)
+        self.assertEqual(self.requests(), 6)
+
+
+class BenchmarkTests(TestCase):
+    def result(self, p95_ms=10.0, throughput_rps=100.0, queries=3):
+        return {'p50_ms': 5.0, 'p95_ms': p95_ms, 'p99_ms': 20.0, 'throughput_rps': throughput_rps, 'queries': queries, 'errors': 0}
+
+    def test_in_process_run_covers_every_scenario(self):
+        clear_caches()
+        donor_user, admin_user = seeding.seed(campaigns=5, donors=10, donations=50, comments=10)
+        results = benchmarks.run_in_process(donor_user, admin_user, requests=3, warmup=1)
+        self.assertEqual(list(results), [name for name, _, _ in benchmarks.SCENARIOS])
+        for name, result in results.items():
+            with self.subTest(name):
+                self.assertEqual((result['requests'], result['errors']), (3, 0))
+                self.assertGreater(result['queries'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+
+    def test_summarize(self):
+        result = benchmarks.summarize([0.001 * n for n in range(1, 101)], 2.0, [200] * 99 + [500])
+        self.assertEqual(result['requests'], 100)
+        self.assertAlmostEqual(result['p50_ms'], 50.5)
+        self.assertAlmostEqual(result['p95_ms'], 95.05)
+        self.assertEqual((result['throughput_rps'], result['errors']), (50.0, 1))
+
+    def test_compare_flags_regressions_against_the_baseline(self):
+        baseline = {'results': {'in-process': {'campaigns list': self.result(), 'comments': self.result()}}}
+        current = {'results': {'in-process': {
+            'campaigns list': self.result(p95_ms=13.0, throughput_rps=70.0, queries=4),
+            # Within the tolerance
+            'comments': self.result(p95_ms=12.0, throughput_rps=80.0),
+            # Not in the baseline
+            'campaign detail': self.result(p95_ms=500.0),
+        }}}
+        self.assertEqual(benchmarks.compare(current, baseline, tolerance=0.25), [
+            'in-process / campaigns list: p95 10.0ms -> 13.0ms',
+            'in-process / campaigns list: throughput 100.0 -> 70.0 req/s',
+            'in-process / campaigns list: queries 3 -> 4',
+        ])
+        self.assertEqual(benchmarks.compare(baseline, baseline), [])
+
+
+@override_settings(ROOT_URLCONF='donations.tests')
+class AsyncReadTests(TestCase):
+    """
+    The async reads answer exactly as the DRF views they stand in for
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor_user, _ = seeding.seed(campaigns=12, donors=20, donations=200, comments=60)
+        cls.campaign = Campaign.objects.values_list('pk', flat=True).first()
+
+    def test_busiest_reads_are_async(self):
+        for url in ('/api/campaigns/', f'/api/campaigns/{self.campaign}/', '/api/comments/', '/api/my-donations/'):
+            with self.subTest(url):
+                self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func))
+
+    def test_responses_match_the_sync_views(self):
+        token = f'Bearer {RefreshToken.for_user(self.donor_user).access_token}'
+        requests = [
+            ('/api/campaigns/?page_size=3', None),
+            ('/api/campaigns/?search=water&page_size=2', None),
+            ('/api/campaigns/?category=Health&ordering=-goal&page=2&page_size=2', None),
+            ('/api/campaigns/?ordering=-unique_donor_count&page_size=4', None),
+            (f'/api/campaigns/{self.campaign}/', None),
+            ('/api/campaigns/999999/', None),
+            ('/api/campaigns/?page=999', None),
+            (f'/api/comments/?campaign={self.campaign}&page_size=2', None),
+            (f'/api/comments/?campaign={self.campaign}&pagination=cursor&page_size=2', None),
+            ('/api/comments/?campaign=999999', None),
+            ('/api/my-donations/?page_size=2', token),
+            ('/api/my-donations/?page_size=2&pagination=cursor', token),
+            ('/api/my-donations/', None),
+            ('/api/my-donations/', 'Bearer junk'),
+            ('/api/campaigns/trending/?limit=3', None),
+        ]
+        for url, authorization in requests:
+            with self.subTest(url, authorization=authorization):
+                headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+                responses = []
+                for urlconf in ('charity_website.urls', 'donations.tests'):
+                    clear_caches()
+                    with self.settings(ROOT_URLCONF=urlconf):
+                        # Twice, so cached campaign pages are compared too
+                        responses.append([self.client.get(url, secure=True, **headers) for _ in range(2)])
+                for sync, async_ in zip(*responses):
+                    self.assertEqual(async_.status_code, sync.status_code)
+                    self.assertEqual(async_.content, sync.content)
+                    for header in ('Content-Type', 'ETag', 'Last-Modified', 'WWW-Authenticate', 'X-Cache'):
+                        self.assertEqual(async_.get(header), sync.get(header), header)
+
+    async def test_cached_pages_use_the_async_cache(self):
+        await sync_to_async(clear_caches)()
+        refuse = mock.Mock(side_effect=AssertionError('sync cache call on the event loop'))
+        with self.settings(ROOT_URLCONF='donations.tests'), \
+                mock.patch.object(response_cache, 'get_page', refuse), mock.patch.object(response_cache, 'set_page', refuse):
+            responses = [await self.async_client.get('/api/campaigns/?page_size=3', secure=True) for _ in range(2)]
+        self.assertEqual([response['X-Cache'] for response in responses], ['MISS', 'HIT'])
+        self.assertEqual(responses[1].content, responses[0].content)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Two SQLite files: the test database as the primary and a copy of it as
+    replica_1, so what a read finds shows which one it went to
+    """
+    replica = 'replica_1'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        descriptor, cls.replica_file = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(descriptor)
+        connections.settings[cls.replica] = {**connections.settings['default'], 'NAME': cls.replica_file}
+        # Added after the checks in setUpClass, which only know the configured aliases
+        cls.databases = {'default', cls.replica}
+        cls.replicas = mock.patch.object(routers, 'REPLICAS', (cls.replica,))
+        cls.replicas.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.replicas.stop()
+        connections[cls.replica].close()
+        del connections[cls.replica]
+        del connections.settings[cls.replica]
+        cls.databases = {'default'}
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(cls.replica_file + suffix):
+                os.remove(cls.replica_file + suffix)
+        super().tearDownClass()
+
+    def setUp(self):
+        clear_caches()
+        self.donor = make_donor('amina')
+        self.token = str(RefreshToken.for_user(self.donor.user).access_token)
+        self.replicated = make_campaign('Wells')
+        self.replicate()
+        self.not_replicated = make_campaign('School')
+
+    def replicate(self):
+        connections[self.replica].close()
+        primary = connections['default']
+        primary.ensure_connection()
+        target = sqlite3.connect(self.replica_file)
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        donor, anonymous = benchmarks.api_client(self.donor.user), APIClient()
+
+        def status(client, campaign):
+            return client.get(f'/api/campaigns/{campaign.pk}/', secure=True).status_code
+
+        self.assertEqual(status(donor, self.replicated), 200)
+        self.assertEqual(status(donor, self.not_replicated), 404)
+        response = donor.post('/api/donations/', {'campaign': self.replicated.pk, 'amount': '25'}, secure=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(status(donor, self.not_replicated), 200)
+        # Only the client that wrote is pinned
+        self.assertEqual(status(anonymous, self.not_replicated), 404)
+
+    async def test_async_requests_are_routed_the_same_way(self):
+        client = AsyncClient()
+        donor, anonymous = {'Authorization': f'Bearer {self.token}'}, {}
+
+        async def status(headers, campaign):
+            return (await client.get(f'/api/campaigns/{campaign.pk}/', headers=headers, secure=True)).status_code
+
+        # The async path must not fall back to the blocking cache calls
+        with mock.patch.object(routers, 'is_pinned', side_effect=AssertionError), \
+                mock.patch.object(routers, 'pin_to_primary', side_effect=AssertionError):
+            self.assertEqual(await status(donor, self.replicated), 200)
+            self.assertEqual(await status(donor, self.not_replicated), 404)
+            response = await client.post(
+                '/api/donations/', {'campaign': self.replicated.pk, 'amount': '25'},
+                content_type='application/json', headers=donor, secure=True,
+            )
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(await status(donor, self.not_replicated), 200)
+            self.assertEqual(await status(anonymous, self.not_replicated), 404)
+
+
+def png(width, height, color='teal'):
+    buffer = io.BytesIO()
+    PILImage.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class CampaignImageTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = self.settings(MEDIA_ROOT=media, CAMPAIGN_IMAGE_MAX_ATTEMPTS=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = benchmarks.api_client(make_admin('root'))
+
+    def create(self, title, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/admin/campaigns/', {
+                'title': title, 'description': f'{title} for Turkana', 'goal': '1000',
+                'image': SimpleUploadedFile('photo.png', data, content_type='image/png'),
+            }, format='multipart', secure=True)
+        self.assertEqual(response.status_code, 201, response.content)
+        return Campaign.objects.get(title=title)
+
+    def process(self):
+        with ThreadPoolExecutor(max_workers=2) as executor, self.captureOnCommitCallbacks(execute=True):
+            return images.process_pending(executor)
+
+    def detail(self, campaign):
+        return self.client.get(f'/api/campaigns/{campaign.pk}/', secure=True).json()
+
+    def test_variants_are_resized_and_content_addressed(self):
+        wells = self.create('Wells', png(2000, 1000))
+        school = self.create('School', png(2000, 1000))
+        # The same bytes are stored once
+        self.assertEqual(wells.image_id, school.image_id)
+        self.assertEqual(CampaignImage.objects.count(), 1)
+        self.assertEqual(self.detail(wells)['images'], {'thumbnail': None, 'card': None, 'hero': None})
+        self.assertIsNone(self.detail(wells)['image'])
+
+        version = wells.version
+        self.assertEqual(self.process(), (1, 0))
+        image = CampaignImage.objects.get()
+        self.assertEqual((image.status, image.width, image.height), ('ready', 2000, 1000))
+        sizes = {}
+        for variant in images.VARIANTS:
+            name = images.variant_name(image.sha256, variant)
+            self.assertIn(image.sha256, name)
+            with default_storage.open(name, 'rb') as f, PILImage.open(f) as rendered:
+                sizes[variant] = (rendered.format, rendered.size)
+        # Cropped to fill, or shrunk to fit with the aspect ratio kept
+        self.assertEqual(sizes, {
+            'thumbnail': ('JPEG', (320, 180)), 'card': ('JPEG', (640, 360)), 'hero': ('JPEG', (1600, 800)),
+        })
+
+        # The new URLs are served and change the campaign's validators
+        self.assertGreater(Campaign.objects.get(pk=wells.pk).version, version)
+        detail = self.detail(wells)
+        self.assertTrue(detail['images']['hero'].endswith(images.variant_name(image.sha256, 'hero')))
+        self.assertTrue(detail['image'].endswith(images.variant_name(image.sha256, 'thumbnail')))
+        self.assertEqual(self.process(), (0, 0))
+
+    def test_small_originals_are_not_enlarged(self):
+        self.create('Wells', png(800, 300))
+        self.process()
+        image = CampaignImage.objects.get()
+        with default_storage.open(images.variant_name(image.sha256, 'hero'), 'rb') as f, PILImage.open(f) as hero:
+            self.assertEqual(hero.size, (800, 300))
+
+    def test_broken_images_are_retried_then_failed(self):
+        self.create('Wells', png(400, 400))
+        image = CampaignImage.objects.get()
+        with default_storage.open(image.original, 'wb') as f:
+            f.write(b'not an image')
+        self.assertEqual(self.process(), (0, 1))
+        image.refresh_from_db()
+        self.assertEqual((image.status, image.attempts), ('pending', 1))
+        self.assertGreater(image.next_attempt_at, timezone.now())
+        # Backing off, then out of attempts
+        self.assertEqual(self.process(), (0, 0))
+        CampaignImage.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(self.process(), (0, 1))
+        image.refresh_from_db()
+        self.assertEqual((image.status, image.attempts), ('failed', 2))
+        self.assertIsNone(self.detail(Campaign.objects.get())['image'])
+
+
+class DonationImportTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        statistics.rebuild()
+        self.client = benchmarks.api_client(make_admin('finance', role='financial_manager'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wells, self.school = make_campaign('Wells'), make_campaign('School')
+            self.solar = make_campaign('Solar', counter_shards=4)
+            self.amina, self.brian = make_donor('amina', 'Amina@Example.com'), make_donor('brian')
+        with self.captureOnCommitCallbacks(execute=True):
+            benchmarks.api_client(self.amina.user).post('/api/donations/', {'campaign': self.wells.pk, 'amount': '5'}, secure=True)
+
+    def upload(self, lines, **data):
+        content = '\n'.join(['campaign_id,donor_id,donor_email,amount,donated_at'] + lines) + '\n'
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/admin/donations/import/', {
+                'file': SimpleUploadedFile('mpesa.csv', content.encode(), content_type='text/csv'), **data,
+            }, format='multipart', secure=True)
+
+    def test_import_updates_every_total_once(self):
+        lines = [
+            f'{self.wells.pk},{self.amina.pk},,10.50,2024-03-01T09:00:00Z',
+            f'{self.wells.pk},,AMINA@example.com,4,',
+            f'{self.wells.pk},{self.brian.pk},,20,',
+            f'{self.school.pk},,brian@example.com,7.25,2024-03-02 10:00',
+            f'{self.solar.pk},{self.amina.pk},,100,',
+        ]
+        emails = OutboundEmail.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(lines)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['donations'], response.data['campaigns'], response.data['amount']), (5, 3, '141.75'))
+        # Three campaigns, one UPDATE
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "donations_campaign" ')]), 1)
+
+        for campaign in Campaign.objects.filter(pk__in=[self.wells.pk, self.school.pk, self.solar.pk]):
+            raised = Donation.objects.filter(campaign=campaign).aggregate(total=Sum('amount'))['total']
+            self.assertEqual(campaign.total_amount_raised, raised)
+        self.assertEqual(counters.rebuild_campaign_counts(check=True), {})
+        self.assertEqual(Campaign.objects.get(pk=self.wells.pk).unique_donor_count, 2)
+        stats = statistics.get_statistics()
+        self.assertEqual({field: getattr(stats, field) for field in statistics.compute()}, statistics.compute())
+        self.assertEqual(DonorSummary.objects.get(donor=self.amina).donation_count, 4)
+        self.assertEqual(OutboundEmail.objects.count(), emails + 5)
+        self.assertEqual(
+            Donation.objects.get(campaign=self.school).donated_at, datetime(2024, 3, 2, 10, tzinfo=timezone.get_current_timezone()),
+        )
+
+    def test_a_bad_row_writes_nothing(self):
+        Donor.objects.create(user=User.objects.create_user('amina2', 'amina@example.com'), name='Amina Two')
+        response = self.upload([
+            f'{self.wells.pk},{self.brian.pk},,20,',
+            f'{self.wells.pk},,amina@example.com,4,',
+            f'999999,{self.brian.pk},,5,',
+            f'{self.wells.pk},{self.brian.pk},,0,',
+            f'{self.wells.pk},{self.brian.pk},,1.234,',
+            f'{self.wells.pk},{self.brian.pk},,5,2999-01-01',
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [
+            "line 5: invalid amount '0'",
+            "line 6: invalid amount '1.234'",
+            'line 7: donated_at is in the future',
+            'line 3: more than one donor has the email amina@example.com',
+            'line 4: campaign 999999 does not exist',
+        ])
+        self.assertEqual(Donation.objects.count(), 1)
+        self.assertEqual(Campaign.objects.get(pk=self.wells.pk).amount_raised, Decimal('5'))
+
+    def test_dry_run_and_command(self):
+        response = self.upload([f'{self.school.pk},{self.brian.pk},,20,'], dry_run='true')
+        self.assertEqual((response.status_code, response.data['donations']), (200, 1))
+        self.assertFalse(Donation.objects.filter(campaign=self.school).exists())
+
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            f.write(json.dumps({'campaign_id': self.school.pk, 'donor_email': 'brian@example.com', 'amount': '20'}) + '\n')
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        emails = OutboundEmail.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_donations', f.name, '--no-emails', stdout=out)
+        self.assertIn('Imported 1 donations (KES 20.00) across 1 campaigns, 0 emails queued', out.getvalue())
+        self.assertEqual(Campaign.objects.get(pk=self.school.pk).amount_raised, Decimal('20'))
+        self.assertEqual(OutboundEmail.objects.count(), emails)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.finance = make_admin('finance', role='financial_manager')
+        campaign = make_campaign('=HYPERLINK("https://example.com")')
+        donor = make_donor('amina')
+        Donor.objects.filter(pk=donor.pk).update(name='+254 Amina')
+        for days, amount in ((3, '10.00'), (2, '25.50'), (1, '1000.00')):
+            donation = Donation.objects.create(donor=donor, campaign=campaign, amount=Decimal(amount))
+            Donation.objects.filter(pk=donation.pk).update(donated_at=timezone.now() - timedelta(days=days))
+
+    def export(self, export_format):
+        response = benchmarks.api_client(self.finance).get(f'/api/admin/donations/export/{export_format}/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def donations(self):
+        return sorted(Donation.objects.values_list('campaign_id', 'donor_id', 'amount', 'donated_at'))
+
+    def test_exports_import_back_unchanged(self):
+        exported = self.donations()
+        for export_format in ('csv', 'ndjson'):
+            with self.subTest(export_format):
+                content = self.export(export_format)
+                Donation.objects.all().delete()
+                report = imports.import_donations(io.StringIO(content), file_format=export_format, send_emails=False)
+                self.assertEqual(report['donations'], 3)
+                self.assertEqual(self.donations(), exported)
+
+    def test_csv_cells_that_look_like_formulas_are_quoted(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv'))))
+        self.assertEqual({row['campaign_title'] for row in rows}, {'\'=HYPERLINK("https://example.com")'})
+        self.assertEqual({row['donor_name'] for row in rows}, {"'+254 Amina"})
+        self.assertEqual({row['amount'] for row in rows}, {'10.00', '25.50', '1000.00'})
+        # Only CSV is opened in spreadsheets
+        records = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual({record['donor_name'] for record in records}, {'+254 Amina'})
+
+    async def test_asgi_exports_stream_from_an_async_iterator(self):
+        token = str(RefreshToken.for_user(self.finance).access_token)
+        response = await AsyncClient().get(
+            '/api/admin/donations/export/csv/', headers={'Authorization': f'Bearer {token}'}, secure=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(content, await sync_to_async(self.export)('csv'))
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.wells, self.school, self.clinic = make_campaign('Wells'), make_campaign('School'), make_campaign('Clinic')
+        client = benchmarks.api_client(make_donor('amina').user)
+        for campaign, amounts in ((self.wells, ['10']), (self.school, ['10', '10']), (self.clinic, ['500'])):
+            for amount in amounts:
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = client.post('/api/donations/', {'campaign': campaign.pk, 'amount': amount}, secure=True)
+                self.assertEqual(response.status_code, 201)
+
+    def ranking(self, window):
+        response = APIClient().get(f'/api/campaigns/trending/?window={window}', secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [(row['title'], row['donations_in_window']) for row in response.json()['results']]
+
+    def test_campaigns_rank_by_donations_then_amount(self):
+        self.assertEqual(self.ranking('1h'), [('School', 2), ('Clinic', 1), ('Wells', 1)])
+
+    def test_expiry_slides_donations_out_of_the_shorter_windows(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            trending.expire(now=timezone.now() + timedelta(hours=2))
+        self.assertEqual(CampaignTrend.objects.filter(donations_1h__gt=0).count(), 0)
+        self.assertEqual(
+            sorted(CampaignTrend.objects.values_list('campaign__title', 'donations_24h')),
+            [('Clinic', 1), ('School', 2), ('Wells', 1)],
+        )
+
+    def test_rebuild_matches_the_incremental_totals(self):
+        fields = ['campaign_id'] + [f'{kind}_{window}' for window in trending.WINDOWS for kind in ('donations', 'amount')]
+        incremental = sorted(CampaignTrend.objects.values_list(*fields))
+        self.assertEqual(trending.rebuild(), 3)
+        self.assertEqual(sorted(CampaignTrend.objects.values_list(*fields)), incremental)
+
+
+class TrendingMigrationTests(TransactionTestCase):
+    before, after = ('donations', '0016_campaign_image'), ('donations', '0017_trending')
+
+    def test_migration_fills_the_trends_from_recent_donations(self):
+        call_command('migrate', *self.before, verbosity=0)
+        try:
+            apps = MigrationExecutor(connection).loader.project_state(self.before).apps
+            user = apps.get_model('auth', 'User').objects.create(username='amina')
+            donor = apps.get_model('donations', 'Donor').objects.create(user_id=user.pk, name='Amina')
+            Campaign = apps.get_model('donations', 'Campaign')
+            Donation = apps.get_model('donations', 'Donation')
+            recent, old = Campaign.objects.create(title='Recent'), Campaign.objects.create(title='Old')
+            for campaign, age in ((recent, timedelta(minutes=10)), (recent, timedelta(days=2)), (old, timedelta(days=30))):
+                donation = Donation.objects.create(donor_id=donor.pk, campaign_id=campaign.pk, amount=Decimal('10'))
+                Donation.objects.filter(pk=donation.pk).update(donated_at=timezone.now() - age)
+
+            call_command('migrate', *self.after, verbosity=0)
+            self.assertEqual(
+                list(CampaignTrend.objects.values_list('campaign_id', 'donations_1h', 'donations_24h', 'donations_7d')),
+                [(recent.pk, 1, 1, 2)],
+            )
+        finally:
+            call_command('migrate', verbosity=0)
@@ -0,0 +1,234 @@
+"""
+Trending campaigns: donations over the last hour, day and week, kept
+incrementally.
+
+Once its transaction commits, each donation is added to its campaign's
+CampaignTrendBucket for the TRENDING_BUCKET_SECONDS slice it falls in, and to
+the running totals of every window on the campaign's CampaignTrend row (F()
+updates, as for the statistics). `manage.py expire_trending` takes the
+buckets that have slid out of each window since its last run off that
+window's totals. A TrendingWindow row per window remembers how far that has
+gone, so a bucket leaves each window exactly once however often the command
+runs. Buckets older than the longest window are deleted. A window therefore
+covers its length to within one bucket, plus the time since the last
+expiry.
+
+A window's ranking orders CampaignTrend by (donations, amount), which its
+index serves directly, so the top k costs k index entries rather than an
+aggregate over Donation. `manage.py expire_trending --rebuild` recomputes
+everything from the Donation table, for instance after changing
+TRENDING_BUCKET_SECONDS or if a backdated import raced with an expiry.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from . import statistics
+from .db import write_atomic
+from .models import CampaignTrend, CampaignTrendBucket, Donation, TrendingWindow
+
+WINDOWS = {
+    '1h': timedelta(hours=1),
+    '24h': timedelta(days=1),
+    '7d': timedelta(days=7),
+}
+DEFAULT_WINDOW = '24h'
+LONGEST_WINDOW = max(WINDOWS, key=WINDOWS.get)
+# Keep IN (...) lists well under SQLite's bound parameter limit
+CHUNK_SIZE = 500
+
+
+def bucket_start(when):
+    seconds = settings.TRENDING_BUCKET_SECONDS
+    timestamp = int(when.timestamp())
+    return datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+
+
+def cutoff(window, now):
+    """
+    Start of the oldest bucket still inside `window`
+    """
+    return bucket_start(now) - WINDOWS[window] + timedelta(seconds=settings.TRENDING_BUCKET_SECONDS)
+
+
+def record(campaign_id, donated_at, donations=1, amount=Decimal('0')):
+    """
+    Add donations (negative to take them away) to a campaign's trend once the
+    surrounding transaction commits
+    """
+    record_many([(campaign_id, donated_at, donations, amount)])
+
+
+def record_many(entries):
+    """
+    record() for many (campaign id, donated at, donations, amount) tuples,
+    summed per bucket
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for campaign_id, donated_at, donations, amount in entries:
+        delta = deltas[(campaign_id, bucket_start(donated_at))]
+        delta[0] += donations
+        delta[1] += amount
+    if deltas:
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def _windows_for(start, now, watermarks):
+    inside = [window for window in WINDOWS if start >= cutoff(window, now)]
+    if len(inside) == len(WINDOWS):
+        return inside
+    # An older bucket counts in the windows it has not been expired from yet
+    if watermarks is None:
+        watermarks = dict(TrendingWindow.objects.values_list('name', 'expired_before'))
+    return [window for window in WINDOWS if window in inside or start >= watermarks.get(window, start)]
+
+
+def _apply(deltas):
+    now = timezone.now()
+    watermarks = None
+    for (campaign_id, start), (donations, amount) in deltas.items():
+        windows = _windows_for(start, now, watermarks)
+        if not windows:
+            continue
+        _add(CampaignTrendBucket, {'campaign_id': campaign_id, 'start': start}, {'donations': donations, 'amount': amount})
+        changes = {}
+        for window in windows:
+            changes[f'donations_{window}'] = donations
+            changes[f'amount_{window}'] = amount
+        _add(CampaignTrend, {'campaign_id': campaign_id}, changes)
+
+
+def _add(model, key, changes):
+    rows = model.objects.filter(**key)
+    if rows.update(**{field: F(field) + delta for field, delta in changes.items()}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **changes)
+    except IntegrityError:
+        # Created in the meantime, or the campaign is gone
+        rows.update(**{field: F(field) + delta for field, delta in changes.items()})
+
+
+def _subtract(window, totals):
+    """
+    Take {campaign id: (donations, amount)} off a window's totals, one
+    UPDATE per CHUNK_SIZE campaigns
+    """
+    items = list(totals.items())
+    for start in range(0, len(items), CHUNK_SIZE):
+        chunk = items[start:start + CHUNK_SIZE]
+        donations = Case(*[When(pk=pk, then=Value(count)) for pk, (count, _) in chunk], output_field=IntegerField())
+        amount = Case(
+            *[When(pk=pk, then=Value(total)) for pk, (_, total) in chunk],
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+        CampaignTrend.objects.filter(pk__in=[pk for pk, _ in chunk]).update(**{
+            f'donations_{window}': F(f'donations_{window}') - donations,
+            f'amount_{window}': F(f'amount_{window}') - amount,
+        })
+
+
+def expire(now=None):
+    """
+    Take the buckets that slid out of each window off its totals and delete
+    the ones no window covers any more. Returns how many (window, campaign)
+    totals changed.
+    """
+    now = now or timezone.now()
+    changed = 0
+    with write_atomic():
+        watermarks = dict(TrendingWindow.objects.select_for_update().values_list('name', 'expired_before'))
+        for window in WINDOWS:
+            until = cutoff(window, now)
+            since = watermarks.get(window)
+            if since is not None and since >= until:
+                continue
+            buckets = CampaignTrendBucket.objects.filter(start__lt=until)
+            if since is not None:
+                buckets = buckets.filter(start__gte=since)
+            totals = {
+                row['campaign_id']: (row['donations'], row['amount'])
+                for row in buckets.values('campaign_id').annotate(donations=Sum('donations'), amount=Sum('amount'))
+            }
+            _subtract(window, totals)
+            TrendingWindow.objects.update_or_create(name=window, defaults={'expired_before': until})
+            changed += len(totals)
+        CampaignTrendBucket.objects.filter(start__lt=cutoff(LONGEST_WINDOW, now)).delete()
+        if changed:
+            # The trending order of the campaign list moved
+            statistics.bump(catalog_version=1)
+    return changed
+
+
+def rebuild(now=None):
+    """
+    Recompute buckets, window totals and watermarks from the Donation table.
+    Returns how many campaigns have donations in the longest window.
+    """
+    now = now or timezone.now()
+    with write_atomic():
+        buckets = defaultdict(lambda: [0, Decimal('0')])
+        recent = Donation.objects.filter(donated_at__gte=cutoff(LONGEST_WINDOW, now))
+        for campaign_id, donated_at, amount in recent.values_list('campaign_id', 'donated_at', 'amount').iterator():
+            bucket = buckets[(campaign_id, bucket_start(donated_at))]
+            bucket[0] += 1
+            bucket[1] += amount
+
+        trends = {}
+        for (campaign_id, start), (donations, amount) in buckets.items():
+            trend = trends.get(campaign_id)
+            if trend is None:
+                trend = trends[campaign_id] = CampaignTrend(campaign_id=campaign_id)
+            for window in WINDOWS:
+                if start >= cutoff(window, now):
+                    setattr(trend, f'donations_{window}', getattr(trend, f'donations_{window}') + donations)
+                    setattr(trend, f'amount_{window}', getattr(trend, f'amount_{window}') + amount)
+
+        CampaignTrendBucket.objects.all().delete()
+        CampaignTrend.objects.all().delete()
+        CampaignTrendBucket.objects.bulk_create(
+            [CampaignTrendBucket(campaign_id=campaign_id, start=start, donations=donations, amount=amount)
+             for (campaign_id, start), (donations, amount) in buckets.items()],
+            batch_size=CHUNK_SIZE,
+        )
+        CampaignTrend.objects.bulk_create(trends.values(), batch_size=CHUNK_SIZE)
+        for window in WINDOWS:
+            TrendingWindow.objects.update_or_create(name=window, defaults={'expired_before': cutoff(window, now)})
+        statistics.bump(catalog_version=1)
+    return len(trends)
+
+
+def window_param(request, param='window'):
+    window = request.query_params.get(param) or DEFAULT_WINDOW
+    return window if window in WINDOWS else None
+
+
+def order_by_trending(queryset, window):
+    """
+    Campaigns with the most donations in `window` first (then the largest
+    amount), campaigns without any last
+    """
+    return queryset.order_by(
+        F(f'trend__donations_{window}').desc(nulls_last=True),
+        F(f'trend__amount_{window}').desc(nulls_last=True),
+        '-created_at',
+    )
+
+
+def top(queryset, window, limit):
+    """
+    The `limit` campaigns of `queryset` with the most donations in `window`,
+    annotated with trend_donations and trend_amount. Walks the window's
+    index, so it reads about `limit` rows.
+    """
+    return (
+        queryset.filter(**{f'trend__donations_{window}__gt': 0})
+        .annotate(trend_donations=F(f'trend__donations_{window}'), trend_amount=F(f'trend__amount_{window}'))
+        .order_by(f'-trend__donations_{window}', f'-trend__amount_{window}', '-trend__pk')[:limit]
+    )
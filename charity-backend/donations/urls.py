@@ -1,10 +1,12 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     DonorViewSet, CampaignViewSet, DonationViewSet, DonorSignupView, 
-    my_donations, my_profile, CommentViewSet, PasswordResetRequestView, 
+    MyDonationsView, my_profile, CommentViewSet, PasswordResetRequestView, 
     PasswordResetConfirmView, AdminLoginView, AdminDashboardView, 
-    AdminCampaignViewSet, AdminUserViewSet, AdminDonationViewSet, AdminCommentViewSet
+    AdminCampaignViewSet, AdminUserViewSet, AdminDonationViewSet, AdminCommentViewSet,
+    AdminCacheStatsView, AdminMetricsView, AdminDonorOnboardingView
 )
 
 router = DefaultRouter()
@@ -23,7 +25,7 @@ admin_router.register(r'comments', AdminCommentViewSet, basename='admin-comments
 urlpatterns = [
     path('', include(router.urls)),
     path('signup/', DonorSignupView.as_view(), name='donor-signup'),
-    path('my-donations/', my_donations, name='my-donations'),
+    path('my-donations/', MyDonationsView.as_view(), name='my-donations'),
     path('my-profile/', my_profile, name='my-profile'),
     path('password-reset/', PasswordResetRequestView.as_view(), name='password-reset-request'),
     path('password-reset/confirm/', PasswordResetConfirmView.as_view(), name='password-reset-confirm'),
@@ -31,5 +33,13 @@ urlpatterns = [
     # Admin endpoints
     path('admin/login/', AdminLoginView.as_view(), name='admin-login'),
     path('admin/dashboard/', AdminDashboardView.as_view(), name='admin-dashboard'),
+    path('admin/cache/', AdminCacheStatsView.as_view(), name='admin-cache-stats'),
+    path('admin/metrics/', AdminMetricsView.as_view(), name='admin-metrics'),
+    path('admin/donors/import/', AdminDonorOnboardingView.as_view(), name='admin-donor-onboarding'),
     path('admin/', include(admin_router.urls)),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    # JSON reads of the busiest routes go to donations.async_views
+    from .async_views import async_routes
+    urlpatterns = async_routes(router.urls) + async_routes(urlpatterns[1:])
@@ -1,4 +1,3 @@
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
@@ -8,10 +7,12 @@ from django.utils.encoding import force_bytes
 from django.urls import reverse
 import uuid
 
+from .outbox import queue_email
 
-def send_donation_confirmation_email(donation, donor, campaign):
+
+def build_donation_confirmation_email(donation, donor, campaign):
     """
-    Send donation confirmation email to donor
+    Render the donation confirmation email, returns queue_email() kwargs
     """
     subject = f'Thank you for your donation to {campaign.title}'
     
@@ -32,19 +33,25 @@ def send_donation_confirmation_email(donation, donor, campaign):
     # Create plain text version
     plain_message = strip_tags(html_message)
     
-    # Send email
+    return {
+        'subject': subject,
+        'message': plain_message,
+        'from_email': settings.DEFAULT_FROM_EMAIL,
+        'recipient_list': [donor.user.email] if donor.user.email else [],
+        'html_message': html_message,
+    }
+
+
+def send_donation_confirmation_email(donation, donor, campaign):
+    """
+    Send donation confirmation email to donor
+    """
+    # Queue email, it is delivered by the send_queued_emails worker
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[donor.user.email] if donor.user.email else [],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        queue_email(**build_donation_confirmation_email(donation, donor, campaign))
         return True
     except Exception as e:
-        print(f"Failed to send donation confirmation email: {e}")
+        print(f"Failed to queue donation confirmation email: {e}")
         return False
 
 
@@ -64,19 +71,18 @@ def send_password_reset_email(user, reset_url):
     # Create plain text version
     plain_message = strip_tags(html_message)
     
-    # Send email
+    # Queue email, it is delivered by the send_queued_emails worker
     try:
-        send_mail(
+        queue_email(
             subject=subject,
             message=plain_message,
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[user.email] if user.email else [],
             html_message=html_message,
-            fail_silently=False,
         )
         return True
     except Exception as e:
-        print(f"Failed to send password reset email: {e}")
+        print(f"Failed to queue password reset email: {e}")
         return False
 
 
@@ -94,9 +100,9 @@ def generate_password_reset_url(user, request):
     return reset_url 
 
 
-def send_welcome_email(user, donor_name):
+def build_welcome_email(user, donor_name):
     """
-    Send welcome email to new user
+    Render the welcome email, returns queue_email() kwargs
     """
     subject = f'Welcome to CharityConnect, {donor_name}!'
     
@@ -137,16 +143,22 @@ def send_welcome_email(user, donor_name):
     "The best way to find yourself is to lose yourself in the service of others." - Mahatma Gandhi
     """
     
-    # Send email
+    return {
+        'subject': subject,
+        'message': message,
+        'from_email': settings.DEFAULT_FROM_EMAIL,
+        'recipient_list': [user.email] if user.email else [],
+    }
+
+
+def send_welcome_email(user, donor_name):
+    """
+    Send welcome email to new user
+    """
+    # Queue email, it is delivered by the send_queued_emails worker
     try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email] if user.email else [],
-            fail_silently=False,
-        )
+        queue_email(**build_welcome_email(user, donor_name))
         return True
     except Exception as e:
-        print(f"Failed to send welcome email: {e}")
+        print(f"Failed to queue welcome email: {e}")
         return False 
\ No newline at end of file
@@ -1,15 +1,21 @@
+import io
+
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.db import transaction
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.exceptions import ValidationError, PermissionDenied
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, action
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
+from rest_framework_simplejwt.views import TokenObtainPairView
 
-from .models import Donor, Campaign, Donation, Admin
-from .serializers import DonorSerializer, CampaignSerializer, DonationSerializer, AdminSerializer, CampaignCreateSerializer
+from .models import Donor, Campaign, Donation, Admin, CampaignBroadcast
+from .serializers import DonorSerializer, CampaignSerializer, DonationSerializer, AdminSerializer, CampaignCreateSerializer, DonorSummarySerializer, CampaignDetailSerializer, TrendingCampaignSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 
@@ -17,13 +23,28 @@ from rest_framework import viewsets
 from .models import Comment
 from .serializers import CommentSerializer
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
 from donations.models import Campaign
 from donations.serializers import CampaignSerializer
 from rest_framework.filters import SearchFilter
 from rest_framework.pagination import PageNumberPagination
 from .utils import send_donation_confirmation_email, send_password_reset_email, generate_password_reset_url, send_welcome_email
+from .counters import add_to_comment_count, count_donation, with_amount_raised
+from .broadcasts import queue_broadcast
+from .statistics import get_statistics
+from .summaries import get_summary
+from .roles import get_admin, add_role_claims
+from .authentication import get_donor
+from .search import CampaignSearchFilter, CampaignOrderingFilter
+from .pagination import OptionalKeysetPagination
+from .conditional import ConditionalCampaignMixin, finalize, make_etag
+from .statistics import get_catalog_version
+from .db import write_atomic
+from . import live, login_throttle, metrics, response_cache, summaries, trending
+from .exports import export_response
+from .imports import IMPORT_FORMATS, DonationImportError, guess_format, import_donations
+from .onboarding import ONBOARDING_FORMATS, DonorOnboardingError, onboard_donors
 
 class CampaignPagination(PageNumberPagination):
     page_size = 6
@@ -35,73 +56,81 @@ class IsAdminUser(IsAuthenticated):
     def has_permission(self, request, view):
         if not super().has_permission(request, view):
             return False
-        try:
-            admin = Admin.objects.get(user=request.user, is_active=True)
-            return True
-        except Admin.DoesNotExist:
-            return False
+        return get_admin(request) is not None
 
 class CanManageCampaigns(IsAuthenticated):
     def has_permission(self, request, view):
         if not super().has_permission(request, view):
             return False
-        try:
-            admin = Admin.objects.get(user=request.user, is_active=True)
-            return admin.can_manage_campaigns
-        except Admin.DoesNotExist:
-            return False
+        admin = get_admin(request)
+        return admin is not None and admin.can_manage_campaigns
 
 class CanModerateContent(IsAuthenticated):
     def has_permission(self, request, view):
         if not super().has_permission(request, view):
             return False
-        try:
-            admin = Admin.objects.get(user=request.user, is_active=True)
-            return admin.can_moderate_content
-        except Admin.DoesNotExist:
-            return False
+        admin = get_admin(request)
+        return admin is not None and admin.can_moderate_content
 
 class CanManageFinances(IsAuthenticated):
     def has_permission(self, request, view):
         if not super().has_permission(request, view):
             return False
-        try:
-            admin = Admin.objects.get(user=request.user, is_active=True)
-            return admin.can_manage_finances
-        except Admin.DoesNotExist:
-            return False
+        admin = get_admin(request)
+        return admin is not None and admin.can_manage_finances
 
 class IsSuperAdmin(IsAuthenticated):
     def has_permission(self, request, view):
         if not super().has_permission(request, view):
             return False
-        try:
-            admin = Admin.objects.get(user=request.user, is_active=True)
-            return admin.is_super_admin
-        except Admin.DoesNotExist:
-            return False
+        admin = get_admin(request)
+        return admin is not None and admin.is_super_admin
+
+class CommentCountMixin:
+    """
+    Keeps the campaigns' comment_count in step with the comment writes
+    """
+    def perform_create(self, serializer, **kwargs):
+        with write_atomic():
+            comment = serializer.save(**kwargs)
+            add_to_comment_count(comment.campaign_id, 1)
+
+    def perform_update(self, serializer):
+        with write_atomic():
+            previous_campaign_id = serializer.instance.campaign_id
+            comment = serializer.save()
+            if comment.campaign_id != previous_campaign_id:
+                add_to_comment_count(previous_campaign_id, -1)
+                add_to_comment_count(comment.campaign_id, 1)
+
+    def perform_destroy(self, instance):
+        with write_atomic():
+            instance.delete()
+            add_to_comment_count(instance.campaign_id, -1)
 
-class CommentViewSet(viewsets.ModelViewSet):
+
+class CommentViewSet(CommentCountMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()  # <-- Added back for DRF router
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['campaign']
+    pagination_class = OptionalKeysetPagination
+    keyset_fields = ('created_at', 'id')
 
     def get_queryset(self):
-        queryset = Comment.objects.all().order_by('-created_at')
+        queryset = Comment.objects.select_related('donor').order_by('-created_at', '-id')
         campaign_id = self.request.query_params.get('campaign', None)
         if campaign_id is not None:
             queryset = queryset.filter(campaign_id=campaign_id)
         return queryset
 
     def perform_create(self, serializer):
-        try:
-            donor = Donor.objects.get(user=self.request.user)
-            serializer.save(donor=donor)
-        except Donor.DoesNotExist:
+        donor = get_donor(self.request)
+        if donor is None:
             raise ValidationError({'error': 'Donor profile not found'})
-        
+        super().perform_create(serializer, donor=donor)
+
 
     def create(self, request, *args, **kwargs):
         print("Received data:", request.data)  # Add this line
@@ -110,6 +139,9 @@ class CommentViewSet(viewsets.ModelViewSet):
 # Admin Authentication
 class AdminLoginView(APIView):
     permission_classes = [AllowAny]
+    # No token lookup ahead of the throttle, which refuses before any query or hashing
+    authentication_classes = []
+    throttle_classes = [login_throttle.LoginThrottle]
     
     def post(self, request):
         username = request.data.get('username')
@@ -129,9 +161,13 @@ class AdminLoginView(APIView):
                     # Generate JWT token
                     from rest_framework_simplejwt.tokens import RefreshToken
                     refresh = RefreshToken.for_user(user)
+                    access = refresh.access_token
+                    # The role for the client, permission checks look it up
+                    add_role_claims(access, admin)
+                    login_throttle.reset(username)
                     
                     return Response({
-                        'access': str(refresh.access_token),
+                        'access': str(access),
                         'refresh': str(refresh),
                         'admin': {
                             'id': admin.id,
@@ -155,40 +191,62 @@ class AdminLoginView(APIView):
                 'error': 'Invalid credentials'
             }, status=401)
 
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    """
+    simplejwt's login view behind the login throttle
+    """
+    throttle_classes = [login_throttle.LoginThrottle]
+
+    def post(self, request, *args, **kwargs):
+        response = super().post(request, *args, **kwargs)
+        if response.status_code == 200:
+            login_throttle.reset(request.data.get('username'))
+        return response
+
 # Admin Dashboard Views
 class AdminDashboardView(APIView):
     permission_classes = [IsAdminUser]
     
     def get(self, request):
-        try:
-            admin = Admin.objects.get(user=request.user)
-            
-            # Get dashboard statistics
-            total_campaigns = Campaign.objects.count()
-            active_campaigns = Campaign.objects.filter(is_active=True).count()
-            total_donations = Donation.objects.count()
-            total_amount_raised = sum([campaign.amount_raised for campaign in Campaign.objects.all()])
-            total_donors = Donor.objects.count()
-            
-            return Response({
-                'admin': {
-                    'id': admin.id,
-                    'role': admin.role,
-                    'role_display': admin.get_role_display(),
-                    'username': request.user.username,
-                    'email': request.user.email,
-                },
-                'statistics': {
-                    'total_campaigns': total_campaigns,
-                    'active_campaigns': active_campaigns,
-                    'total_donations': total_donations,
-                    'total_amount_raised': float(total_amount_raised),
-                    'total_donors': total_donors,
-                }
-            })
-        except Admin.DoesNotExist:
+        admin = get_admin(request)
+        if admin is None:
             return Response({'error': 'Admin profile not found'}, status=404)
 
+        # Get dashboard statistics, maintained incrementally in one row
+        stats = get_statistics()
+        
+        return Response({
+            'admin': {
+                'id': admin.id,
+                'role': admin.role,
+                'role_display': admin.get_role_display(),
+                'username': request.user.username,
+                'email': request.user.email,
+            },
+            'statistics': {
+                'total_campaigns': stats.total_campaigns,
+                'active_campaigns': stats.active_campaigns,
+                'total_donations': stats.total_donations,
+                'total_amount_raised': float(stats.total_amount_raised),
+                'total_donors': stats.total_donors,
+            }
+        })
+
+class AdminCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'campaign_list': response_cache.counters.as_dict()})
+
+class AdminMetricsView(APIView):
+    """
+    Request metrics of every worker in Prometheus text format
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Admin Campaign Management
 class AdminCampaignViewSet(viewsets.ModelViewSet):
     queryset = Campaign.objects.all()
@@ -199,13 +257,30 @@ class AdminCampaignViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'create':
             return CampaignCreateSerializer
+        if self.action == 'retrieve':
+            return CampaignDetailSerializer
         return CampaignSerializer
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
     
     def get_queryset(self):
-        return Campaign.objects.all().order_by('-created_at')
+        return with_amount_raised(Campaign.objects.select_related('created_by', 'image')).order_by('-created_at')
+
+    @action(detail=True, methods=['post'], parser_classes=[JSONParser, MultiPartParser, FormParser])
+    def broadcast(self, request, pk=None):
+        campaign = self.get_object()
+        kind = request.data.get('kind', 'update')
+        if kind not in dict(CampaignBroadcast.KIND_CHOICES):
+            return Response({'error': 'kind must be "update" or "goal_reached"'}, status=400)
+
+        broadcast = queue_broadcast(campaign, kind, message=request.data.get('message', ''), created_by=request.user)
+        return Response({
+            'id': broadcast.id,
+            'kind': broadcast.kind,
+            'subject': broadcast.subject,
+            'status': broadcast.status,
+        }, status=202)
 
 # Admin User Management (Super Admin only)
 class AdminUserViewSet(viewsets.ModelViewSet):
@@ -214,7 +289,37 @@ class AdminUserViewSet(viewsets.ModelViewSet):
     permission_classes = [IsSuperAdmin]
     
     def get_queryset(self):
-        return Admin.objects.all().order_by('-created_at')
+        return Admin.objects.select_related('user').order_by('-created_at')
+
+class AdminDonorOnboardingView(APIView):
+    """
+    Create donor accounts from an uploaded CSV/NDJSON file
+    """
+    permission_classes = [IsSuperAdmin]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload the donors as "file"'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or guess_format(upload.name)
+        if file_format not in ONBOARDING_FORMATS:
+            return Response({'error': f'file_format must be one of {", ".join(ONBOARDING_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = request.data.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        try:
+            report = onboard_donors(
+                io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''),
+                file_format=file_format,
+                dry_run=dry_run,
+                # Threads, not processes: forking a threaded web worker is unsafe
+                processes=False,
+            )
+        except UnicodeDecodeError:
+            return Response({'error': 'The file must be UTF-8 encoded'}, status=status.HTTP_400_BAD_REQUEST)
+        except DonorOnboardingError as e:
+            return Response({'error': str(e), 'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
 
 # Admin Donation Management
 class AdminDonationViewSet(viewsets.ReadOnlyModelViewSet):
@@ -224,18 +329,53 @@ class AdminDonationViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['campaign', 'donor']
     search_fields = ['donor__name', 'campaign__title']
+    pagination_class = OptionalKeysetPagination
+    keyset_fields = ('donated_at', 'id')
     
     def get_queryset(self):
-        return Donation.objects.all().order_by('-donated_at')
+        return Donation.objects.all().order_by('-donated_at', '-id')
+
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<export_format>csv|ndjson)')
+    def export(self, request, export_format=None):
+        # Same campaign/donor/search filters as the list, streamed without pagination
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(queryset, export_format, request)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        """
+        Import an uploaded CSV/NDJSON file of offline donations
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Upload the donations as "file"'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or guess_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            return Response({'error': f'file_format must be one of {", ".join(IMPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = request.data.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        try:
+            report = import_donations(
+                io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''),
+                file_format=file_format,
+                dry_run=dry_run,
+            )
+        except UnicodeDecodeError:
+            return Response({'error': 'The file must be UTF-8 encoded'}, status=status.HTTP_400_BAD_REQUEST)
+        except DonationImportError as e:
+            return Response({'error': str(e), 'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
 
 # Admin Comment Management
-class AdminCommentViewSet(viewsets.ModelViewSet):
+class AdminCommentViewSet(CommentCountMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [CanModerateContent]
+    pagination_class = OptionalKeysetPagination
+    keyset_fields = ('created_at', 'id')
     
     def get_queryset(self):
-        return Comment.objects.all().order_by('-created_at')
+        return Comment.objects.select_related('donor').order_by('-created_at', '-id')
 
 # Donor Signup Endpoint
 class DonorSignupView(APIView):
@@ -270,97 +410,171 @@ class DonorSignupView(APIView):
         except ValidationError:
             return Response({'error': 'Please enter a valid email address'}, status=400)
 
-        # Create user with email
-        user = User.objects.create_user(username=username, password=password, email=email)
-        user.first_name = name  # Store full name
-        user.save()
+        with transaction.atomic():
+            # Create user with email
+            user = User.objects.create_user(username=username, password=password, email=email)
+            user.first_name = name  # Store full name
+            user.save()
 
-        donor = Donor.objects.create(user=user, name=name.strip())  # Save donor profile
+            donor = Donor.objects.create(user=user, name=name.strip())  # Save donor profile
 
-        # Send welcome email
-        try:
-            send_welcome_email(user, name.strip())
-        except Exception as e:
-            print(f"Failed to send welcome email: {e}")
-            # Don't fail signup if email fails
+            # Queue welcome email, only sent if the signup commits
+            try:
+                send_welcome_email(user, name.strip())
+            except Exception as e:
+                print(f"Failed to queue welcome email: {e}")
+                # Don't fail signup if email fails
 
         return Response({'message': 'Signup successful'}, status=201)
 
 
 # Campaigns (publicly accessible)
-class CampaignViewSet(viewsets.ModelViewSet):
-    queryset = Campaign.objects.all()
+class CampaignViewSet(ConditionalCampaignMixin, viewsets.ModelViewSet):
+    queryset = Campaign.objects.select_related('created_by', 'image')
     serializer_class = CampaignSerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, CampaignSearchFilter, CampaignOrderingFilter]
     filterset_fields = ['category', 'location']
     search_fields = ['title', 'description']
-    ordering_fields = ['goal','amount_raised', 'created_at']
+    ordering_fields = ['goal','amount_raised', 'created_at', 'comment_count', 'donation_count', 'unique_donor_count']
     ordering = ['-created_at']
     parser_classes = [MultiPartParser, FormParser]
     search_fields = ['title', 'description']
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        qs = with_amount_raised(super().get_queryset())
         # apply category, location, search, ordering filters here
         return qs
 
+    def get_serializer_class(self):
+        # Only the detail page gets every image variant
+        if self.action == 'retrieve':
+            return CampaignDetailSerializer
+        if self.action == 'trending_campaigns':
+            return TrendingCampaignSerializer
+        return CampaignSerializer
+
+    @action(detail=False, methods=['get'], url_path='trending', url_name='trending')
+    def trending_campaigns(self, request, *args, **kwargs):
+        """
+        The active campaigns with the most donations in ?window= (1h, 24h or
+        7d), top ?limit= of them, optionally of one ?category= or ?location=
+        """
+        window = trending.window_param(request)
+        if window is None:
+            return Response({'error': f'window must be one of {", ".join(trending.WINDOWS)}'}, status=400)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=400)
+
+        # Validated by the catalog version like the list, which moves with every donation and expiry
+        version = get_catalog_version()
+        etag = make_etag('trending', version, request.accepted_renderer.format, response_cache.normalized_params(request))
+        if version is not None:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return finalize(not_modified, etag)
+
+        queryset = DjangoFilterBackend().filter_queryset(request, self.get_queryset().filter(is_active=True), self)
+        serializer = self.get_serializer(trending.top(queryset, window, limit), many=True)
+        response = Response({'window': window, 'results': serializer.data})
+        return finalize(response, etag) if version is not None else response
+
 
 # Donor management
 class DonorViewSet(viewsets.ModelViewSet):
-    queryset = Donor.objects.all()
+    queryset = Donor.objects.select_related('user').order_by('id')
     serializer_class = DonorSerializer
     permission_classes = [IsAuthenticated]
 
 
 # Donations (only authenticated users)
 class DonationViewSet(viewsets.ModelViewSet):
-    queryset = Donation.objects.all()
+    queryset = Donation.objects.order_by('-donated_at', '-id')
     serializer_class = DonationSerializer
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        try:
-            donor = Donor.objects.get(user=self.request.user)
+        # From the token's cached identity, no query
+        donor = get_donor(self.request)
+        if donor is None:
+            raise ValidationError({'error': 'Donor profile not found for this user'})
+        with write_atomic():
             donation = serializer.save(donor=donor)
-            
-            # Update the campaign's amount_raised field
+
+            # Update the campaign's amount_raised and counts in the database, no read-modify-write
             campaign = donation.campaign
-            campaign.amount_raised += donation.amount
-            campaign.save()
-            
-            # Send confirmation email
+            first_to_campaign = count_donation(donation)
+            summaries.record_donation(donation, first_to_campaign)
+
+            # Queue confirmation email in the same transaction as the donation
             try:
                 send_donation_confirmation_email(donation, donor, campaign)
             except Exception as e:
-                print(f"Failed to send confirmation email: {e}")
+                print(f"Failed to queue confirmation email: {e}")
                 # Don't fail the donation if email fails
-            
-        except Donor.DoesNotExist:
-            raise ValidationError({'error': 'Donor profile not found for this user'})
+
+    def perform_update(self, serializer):
+        # Take the donation off its old campaign's amount, counts and trend and add it to the new ones
+        with write_atomic():
+            previous = Donation(
+                pk=serializer.instance.pk,
+                campaign=serializer.instance.campaign,
+                donor_id=serializer.instance.donor_id,
+                amount=serializer.instance.amount,
+            )
+            donation = serializer.save()
+            if (donation.campaign_id, donation.amount) != (previous.campaign_id, previous.amount):
+                count_donation(previous, -1)
+                count_donation(donation)
+                # The donor's total and campaign count can both move, so recompute their summary
+                summaries.schedule_refresh([donation.donor_id])
+                trending.record_many([
+                    (previous.campaign_id, donation.donated_at, -1, -previous.amount),
+                    (donation.campaign_id, donation.donated_at, 1, donation.amount),
+                ])
+                live.publish([previous.campaign_id, donation.campaign_id])
 
     def perform_destroy(self, instance):
-        # Decrement the campaign's amount_raised field when donation is deleted
-        campaign = instance.campaign
-        campaign.amount_raised -= instance.amount
-        campaign.save()
-        
-        # Delete the donation
-        instance.delete()
+        # Decrement the campaign's amount_raised and counts when donation is deleted
+        with write_atomic():
+            instance.delete()
+            count_donation(instance, -1)
+
+
+def _profile_data(user, donor):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'full_name': donor.name,
+        'first_name': user.first_name,
+    }
 
 
 # Fetch authenticated user's donation history
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def my_donations(request):
-    try:
-        donor = Donor.objects.get(user=request.user)
-        donations = Donation.objects.filter(donor=donor).order_by('-donated_at')  # ✅ fixed field
-        serializer = DonationSerializer(donations, many=True)
-        return Response(serializer.data)
-    except Exception as e:
-        print("🔥 my_donations error:", e)
-        return Response({'error': 'Unable to retrieve donations'}, status=500)
+class MyDonationsView(APIView):
+    """
+    The current donor's donations, newest first and paginated (keyset with
+    ?pagination=cursor), plus their lifetime summary and profile so the
+    profile page needs a single request
+    """
+    permission_classes = [IsAuthenticated]
+    keyset_fields = ('donated_at', 'id')
+
+    def get(self, request):
+        donor = Donor.objects.select_related('summary').filter(user=request.user).first()
+        if donor is None:
+            return Response({'error': 'Donor profile not found'}, status=404)
+
+        paginator = OptionalKeysetPagination()
+        donations = Donation.objects.filter(donor=donor).order_by('-donated_at', '-id')
+        page = paginator.paginate_queryset(donations, request, view=self)
+        response = paginator.get_paginated_response(DonationSerializer(page, many=True).data)
+        response.data['summary'] = DonorSummarySerializer(get_summary(donor)).data
+        response.data['profile'] = _profile_data(request.user, donor)
+        return response
 
 
 # Get current user's profile information
@@ -368,16 +582,10 @@ def my_donations(request):
 @permission_classes([IsAuthenticated])
 def my_profile(request):
     try:
-        donor = Donor.objects.get(user=request.user)
-        return Response({
-            'id': request.user.id,
-            'username': request.user.username,
-            'email': request.user.email,
-            'full_name': donor.name,
-            'first_name': request.user.first_name,
-        })
-    except Donor.DoesNotExist:
-        return Response({'error': 'Donor profile not found'}, status=404)
+        donor = get_donor(request)
+        if donor is None:
+            return Response({'error': 'Donor profile not found'}, status=404)
+        return Response(_profile_data(request.user, donor))
     except Exception as e:
         print("🔥 my_profile error:", e)
         return Response({'error': 'Unable to retrieve profile'}, status=500)
@@ -396,7 +604,7 @@ class PasswordResetRequestView(APIView):
             user = User.objects.get(email=email)
             reset_url = generate_password_reset_url(user, request)
             
-            # Send password reset email
+            # Queue password reset email
             if send_password_reset_email(user, reset_url):
                 return Response({
                     'message': 'Password reset email sent successfully. Please check your email.'
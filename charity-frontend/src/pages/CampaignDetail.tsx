@@ -79,6 +79,23 @@ const CampaignDetail: React.FC = () => {
     fetchData();
   }, [id, shouldRefresh]);
 
+  // Progress pushed by the server instead of polling the campaign
+  useEffect(() => {
+    if (!id) return;
+    return apiService.subscribeToProgress([+id], (progress) => {
+      setCampaign((current) =>
+        current
+          ? {
+              ...current,
+              amount_raised: Number(progress.amount_raised),
+              goal: Number(progress.goal),
+              unique_donor_count: progress.donors,
+            }
+          : current
+      );
+    });
+  }, [id]);
+
   const handleDonation = async (e: React.FormEvent) => {
     e.preventDefault();
 
@@ -155,7 +172,7 @@ const CampaignDetail: React.FC = () => {
         <Card>
           <CardHeader>
             <img
-              src={imageMap[campaign.title] || defaultImg}
+              src={campaign.images?.hero || imageMap[campaign.title] || defaultImg}
               alt={campaign.title}
               loading="lazy"
               className="w-full h-48 object-cover rounded-md"
@@ -169,7 +186,10 @@ const CampaignDetail: React.FC = () => {
               <span>{fmtKES(campaign.amount_raised)} raised</span>
               <span>{progressPercentage.toFixed(1)}% funded</span>
             </div>
-            <p className="text-xs text-muted-foreground">Goal: {fmtKES(campaign.goal)}</p>
+            <p className="text-xs text-muted-foreground">
+              Goal: {fmtKES(campaign.goal)}
+              {` · ${campaign.unique_donor_count} ${campaign.unique_donor_count === 1 ? 'donor' : 'donors'}`}
+            </p>
           </CardContent>
         </Card>
 
@@ -1,24 +1,36 @@
 import React, { useEffect, useState } from 'react';
 import { useAuth } from '@/contexts/AuthContext';
-import { apiService, DonationData } from '@/services/api';
+import { apiService, DonationData, DonorSummary } from '@/services/api';
 import { useNavigate } from 'react-router-dom';
 import { Card, CardHeader, CardTitle, CardContent } from '@/components/ui/card';
 
 const DonationHistory = () => {
   const { user, isLoading } = useAuth();
   const [donations, setDonations] = useState<DonationData[]>([]);
+  const [summary, setSummary] = useState<DonorSummary | null>(null);
+  const [page, setPage] = useState(1);
+  const [hasMore, setHasMore] = useState(false);
   const navigate = useNavigate();
 
   useEffect(() => {
     if (!isLoading && !user) {
       navigate('/login');
     } else if (user) {
-      apiService.getMyDonations().then(setDonations).catch((err) => {
-        console.error("Error loading donations:", err);
-      });
+      loadPage(1);
     }
   }, [user, isLoading]);
 
+  const loadPage = (pageNumber: number) => {
+    apiService.getMyDonationsPage(pageNumber).then((data) => {
+      setDonations((previous) => (pageNumber === 1 ? data.results : [...previous, ...data.results]));
+      setSummary(data.summary);
+      setHasMore(data.next !== null);
+      setPage(pageNumber);
+    }).catch((err) => {
+      console.error("Error loading donations:", err);
+    });
+  };
+
   const formatCurrency = (amount: number) => {
     return new Intl.NumberFormat('en-KE', {
       style: 'currency',
@@ -33,6 +45,12 @@ const DonationHistory = () => {
           <CardTitle>Your Donation History</CardTitle>
         </CardHeader>
         <CardContent>
+          {summary && summary.donation_count > 0 && (
+            <p className="text-sm text-muted-foreground mb-4">
+              {summary.donation_count} donations to {summary.campaign_count} campaigns,{' '}
+              {formatCurrency(Number(summary.total_amount))} in total
+            </p>
+          )}
           {donations.length === 0 ? (
             <p className="text-muted-foreground">You haven't made any donations yet.</p>
           ) : (
@@ -57,6 +75,14 @@ const DonationHistory = () => {
               ))}
             </ul>
           )}
+          {hasMore && (
+            <button
+              className="mt-4 text-sm font-medium text-primary hover:underline"
+              onClick={() => loadPage(page + 1)}
+            >
+              Load more
+            </button>
+          )}
         </CardContent>
       </Card>
     </div>
@@ -88,6 +88,8 @@ const fetchCampaignsDebounced = useCallback(
           'most-funded': '-amount_raised',
           'least-funded': 'amount_raised',
           'newest': '-created_at',
+          'trending': 'trending',
+          'most-supporters': '-unique_donor_count',
         };
         params.ordering = map[sortOrder] || '';
       }
@@ -246,6 +248,8 @@ const fetchCampaignsDebounced = useCallback(
                 <option value="most-funded">Most Funded</option>
                 <option value="least-funded">Least Funded</option>
                 <option value="newest">Newest</option>
+                <option value="trending">Trending</option>
+                <option value="most-supporters">Most Supporters</option>
               </select>
             </div>
           </div>
@@ -280,7 +284,7 @@ const fetchCampaignsDebounced = useCallback(
                   <CardHeader className="pb-4">
                     <div className="relative overflow-hidden rounded-lg mb-4">
                       <img
-                        src={imageMap[campaign.title] ?? defaultImg}
+                        src={campaign.image ?? imageMap[campaign.title] ?? defaultImg}
                         alt={campaign.title}
                         loading="lazy"
                         className="w-full h-48 object-cover group-hover:scale-105 transition-transform duration-300"
@@ -320,6 +324,14 @@ const fetchCampaignsDebounced = useCallback(
                           {campaign.category || 'N/A'} • {campaign.location || 'N/A'}
                         </span>
                       </div>
+                      <div className="flex justify-between text-xs text-muted-foreground">
+                        <span>
+                          {campaign.unique_donor_count} {campaign.unique_donor_count === 1 ? 'supporter' : 'supporters'}
+                        </span>
+                        <span>
+                          {campaign.comment_count} {campaign.comment_count === 1 ? 'comment' : 'comments'}
+                        </span>
+                      </div>
                     </div>
 
                     <Link to={`/campaign/${campaign.id}`}>
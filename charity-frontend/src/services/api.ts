@@ -49,11 +49,28 @@ export interface Campaign {
   amount_raised: number;
   category?: string;
   location?: string;
-  image?: string;
+  image?: string | null;  // thumbnail URL, null until resized
+  images?: {
+    thumbnail: string | null;
+    card: string | null;
+    hero: string | null;
+  };
   created_at: string;
+  comment_count: number;
+  donation_count: number;
+  unique_donor_count: number;
 }
 
 
+// Pushed by /campaigns/progress/ (server-sent events) as donations come in
+export interface CampaignProgress {
+  campaign: number;
+  amount_raised: string;
+  goal: string;
+  donors: number;
+  is_active: boolean;
+}
+
 export interface User {
   id: number;
   username: string;
@@ -161,6 +178,26 @@ export interface PaginatedResponse<T> {
   results: T[];
 }
 
+export interface DonorSummary {
+  total_amount: string;
+  donation_count: number;
+  campaign_count: number;
+  first_donated_at: string | null;
+  last_donated_at: string | null;
+}
+
+// /my-donations/ returns a page of donations plus the donor's summary and profile
+export interface MyDonationsPage extends PaginatedResponse<DonationData> {
+  summary: DonorSummary;
+  profile: {
+    id: number;
+    username: string;
+    email: string;
+    full_name: string;
+    first_name: string;
+  };
+}
+
 
 // Fetch comments for a campaign
 // Fetch comments for a campaign (handles pagination)
@@ -194,6 +231,14 @@ export const apiService = {
     return response.data;
   },
 
+  // Live progress of the given campaigns; returns a function that stops it.
+  // Only served by the ASGI server, elsewhere it fails quietly and nothing updates.
+  subscribeToProgress: (ids: number[], onProgress: (progress: CampaignProgress) => void): (() => void) => {
+    const source = new EventSource(`${API_BASE_URL}/campaigns/progress/?campaigns=${ids.join(',')}`);
+    source.addEventListener('progress', (e) => onProgress(JSON.parse((e as MessageEvent).data)));
+    return () => source.close();
+  },
+
   // Authentication
   signup: async (data: SignupData): Promise<{ message: string }> => {
     const response = await api.post('/signup/', data);
@@ -225,9 +270,14 @@ export const apiService = {
 
   getMyDonations: async (): Promise<DonationData[]> => {
   const response = await api.get('/my-donations/');
-  return response.data;
+  return response.data.results;
 },
 
+  getMyDonationsPage: async (page = 1, pageSize = 20): Promise<MyDonationsPage> => {
+    const response = await api.get('/my-donations/', { params: { page, page_size: pageSize } });
+    return response.data;
+  },
+
   // User Profile
   getMyProfile: async (): Promise<User> => {
     const response = await api.get('/my-profile/');